@@ -1,19 +1,97 @@
+from django.conf.urls import url
 from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.utils.html import format_html
 
-from matches.models import Tournament, Bracket, Round, Match, MatchNotification
+from matches.forms import RoundScoresForm
+from matches.models import Tournament, Bracket, Round, Match, MatchNotification, NotificationOutbox
+from players.models import Pool
+
+
+class PoolListFilter(admin.RelatedFieldListFilter):
+    """
+    List the pools with their tournaments in one query, rather than one query
+    per pool for its name
+    """
+
+    def field_choices(self, field, request, model_admin):
+        return [(pool.id, str(pool)) for pool in Pool.objects.select_related('tournament').order_by('id')]
 
 
 class MatchAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'round', 'player_1_score', 'player_2_score',)
     list_editable = ('player_1_score', 'player_2_score',)
-    list_filter = ('round__pool', 'round__number',)
+    list_filter = (('round__pool', PoolListFilter), 'round__number',)
+    list_select_related = ('round__bracket', 'player_1_resolved', 'player_2_resolved',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """
+        Load what the round and previous match choices are named from with
+        them, rather than a query or two per choice
+        """
+        if db_field.name == 'round':
+            kwargs['queryset'] = Round.objects.select_related('bracket')
+        elif db_field.name in ('previous_match_1', 'previous_match_2'):
+            kwargs['queryset'] = Match.objects.select_related('player_1_resolved', 'player_2_resolved')
+
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
 class RoundAdmin(admin.ModelAdmin):
-    list_display = ('__str__', 'number', 'pool', 'start_datetime', 'end_datetime',)
+    list_display = ('__str__', 'number', 'section', 'pool', 'start_datetime', 'end_datetime', 'scores_link',)
+    list_select_related = ('bracket', 'pool__tournament',)
+
+    def get_urls(self):
+        return [
+            url(r'^(\d+)/scores/$', self.admin_site.admin_view(self.scores_view), name='matches_round_scores'),
+        ] + super().get_urls()
+
+    def scores_link(self, obj):
+        return format_html('<a href="{}">Enter scores</a>', reverse('admin:matches_round_scores', args=[obj.id]))
+    scores_link.short_description = 'Scores'
+
+    def scores_view(self, request, round_id):
+        """
+        Enter the scores of every match in a round on one page, saved together
+        with Round.record_scores
+        """
+        round = get_object_or_404(Round.objects.select_related('bracket', 'pool__tournament'), id=round_id)
+        if not self.has_change_permission(request, round):
+            raise PermissionDenied
+
+        # Only matches with both players known can be scored
+        matches = list(round.match_set.filter(
+            bye=False, player_1_resolved__isnull=False, player_2_resolved__isnull=False
+        ).select_related('player_1_resolved', 'player_2_resolved').order_by('round_index', 'id'))
+
+        form = RoundScoresForm(matches, request.POST or None)
+        if request.method == 'POST' and form.is_valid():
+            changed = round.record_scores(form.scores())
+            self.message_user(request, 'Saved {} changed score(s) for {}'.format(len(changed), round))
+            return redirect('admin:matches_round_scores', round.id)
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title='Enter scores for {}'.format(round),
+            opts=self.model._meta,
+            original=round,
+            form=form,
+        )
+        return TemplateResponse(request, 'admin/matches/round/scores.html', context)
+
+
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'attempts', 'next_attempt', 'sent',)
+    list_filter = ('status',)
+    list_select_related = ('match__round', 'match__player_1_resolved', 'match__player_2_resolved',)
+    readonly_fields = ('claim_token', 'claimed_at', 'last_error',)
 
 admin.site.register(Tournament)
 admin.site.register(Bracket)
 admin.site.register(Round, RoundAdmin)
 admin.site.register(Match, MatchAdmin)
 admin.site.register(MatchNotification)
+admin.site.register(NotificationOutbox, NotificationOutboxAdmin)
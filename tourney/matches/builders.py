@@ -0,0 +1,225 @@
+import math
+from random import shuffle
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+
+class SingleEliminationBuilder(object):
+    """
+    Plan a single elimination bracket in memory, then write it to the database
+    with a bulk_create per round
+    """
+
+    def __init__(self, bracket, players):
+        self.bracket = bracket
+        self.players = list(players)
+
+        if len(self.players) < 2:
+            raise ValidationError('A bracket needs at least two players')
+
+    @property
+    def size(self):
+        """
+        The number of first round slots (the next power of two)
+        """
+        return 2 ** int(math.ceil(math.log(len(self.players), 2)))
+
+    def _bye_slots(self):
+        """
+        Return the first round indexes that hold a bye. Even indexes are used
+        first so two byes only meet in round 2 when there's no other choice
+        """
+        slots = self.size // 2
+        byes = self.size - len(self.players)
+        return set(sorted(range(slots), key=lambda i: (i % 2, i))[:byes])
+
+    def plan(self):
+        """
+        Return a list of rounds, each holding a list of planned matches. First
+        round matches are (player_1, player_2) tuples, where player_2 is None
+        for a bye. Later matches are (previous_index_1, previous_index_2)
+        tuples pointing into the round before.
+        """
+        players = self.players[:]
+        shuffle(players)
+
+        bye_slots = self._bye_slots()
+        first_round = []
+        for index in range(self.size // 2):
+            if index in bye_slots:
+                first_round.append((players.pop(), None))
+            else:
+                first_round.append((players.pop(), players.pop()))
+
+        rounds = [first_round]
+        while len(rounds[-1]) > 1:
+            rounds.append([(i, i + 1) for i in range(0, len(rounds[-1]), 2)])
+
+        return rounds
+
+    def sections(self):
+        """
+        Return the bracket as one graph of PlannedMatches, as a list of
+        (section, rounds) pairs in the order they're written
+        """
+        return [('winners', self._winners_bracket())]
+
+    def _winners_bracket(self):
+        planned_rounds = self.plan()
+
+        rounds = [[PlannedMatch(player_1=player_1, player_2=player_2) for player_1, player_2 in planned_rounds[0]]]
+        for planned_matches in planned_rounds[1:]:
+            rounds.append([PlannedMatch(previous_1=rounds[-1][index_1], previous_2=rounds[-1][index_2])
+                           for index_1, index_2 in planned_matches])
+
+        return rounds
+
+    @transaction.atomic
+    def save(self):
+        """
+        Write the planned rounds and matches. The number of queries grows with
+        the number of rounds, not the number of matches.
+        """
+        from matches.models import Tournament, Bracket, Round, Match
+
+        if Match.objects.filter(round__bracket=self.bracket).exists():
+            raise ValidationError('Matches have already been generated for this bracket')
+
+        sections = self.sections()
+
+        existing = set(Round.objects.filter(bracket=self.bracket).values_list('section', 'number'))
+        Round.objects.bulk_create([
+            Round(bracket=self.bracket, section=section, number=number)
+            for section, planned_rounds in sections
+            for number in range(1, len(planned_rounds) + 1)
+            if (section, number) not in existing
+        ])
+        rounds = {(r.section, r.number): r for r in Round.objects.filter(bracket=self.bracket)}
+
+        for section, planned_rounds in sections:
+            for number, planned_matches in enumerate(planned_rounds, start=1):
+                round = rounds[(section, number)]
+
+                Match.objects.bulk_create([
+                    planned.to_match(round=round, round_index=index)
+                    for index, planned in enumerate(planned_matches)
+                ])
+
+                # bulk_create doesn't set primary keys, so read them back for
+                # the matches that feed later ones
+                if any(planned.winner_to or planned.loser_to for planned in planned_matches):
+                    ids = Match.objects.filter(round=round).order_by('round_index').values_list('id', flat=True)
+                    for planned, match_id in zip(planned_matches, ids):
+                        planned.id = match_id
+
+        # bulk_create doesn't send post_save, so record the change here
+        self.bracket.version = self.bracket.snapshot_version = Bracket.objects.record_change(
+            self.bracket.id, structure=True
+        )
+        Tournament.objects.filter(id=self.bracket.tournament_id).touch()
+
+
+class DoubleEliminationBuilder(SingleEliminationBuilder):
+    """
+    Plan a double elimination bracket: the winners bracket, a losers bracket
+    that each player drops into after their first loss, and a grand final
+    between the two champions, with a rematch if the losers bracket champion
+    wins it. The losers bracket is laid out the way jQuery Bracket draws it.
+    """
+
+    def __init__(self, bracket, players):
+        super().__init__(bracket, players)
+
+        if len(self.players) < 4 or len(self.players) != self.size:
+            raise ValidationError('A double elimination bracket needs a power of two players, and at least four')
+
+    def sections(self):
+        winners = self._winners_bracket()
+
+        # Each pair of losers bracket rounds halves the players left: the
+        # first plays them off against each other (or, to start, pairs the
+        # losers of the first winners round), the second brings in the
+        # losers of the next winners round
+        losers = []
+        count = len(winners[0]) // 2
+        for number in range(len(winners) - 1):
+            if number == 0:
+                losers.append([PlannedMatch(previous_1=winners[0][index * 2], loser_1=True,
+                                            previous_2=winners[0][index * 2 + 1], loser_2=True)
+                               for index in range(count)])
+            else:
+                losers.append([PlannedMatch(previous_1=losers[-1][index * 2], previous_2=losers[-1][index * 2 + 1])
+                               for index in range(count)])
+
+            # Every other round takes them in reverse order, to put off
+            # rematches for as long as possible
+            dropping = winners[number + 1][::-1] if number % 2 == 0 else winners[number + 1]
+            losers.append([PlannedMatch(previous_1=losers[-1][index], previous_2=dropping[index], loser_2=True)
+                           for index in range(count)])
+            count //= 2
+
+        grand_final = PlannedMatch(previous_1=winners[-1][0], previous_2=losers[-1][0])
+        rematch = PlannedMatch(previous_1=grand_final, previous_2=grand_final, reset=True)
+
+        return [('winners', winners), ('losers', losers), ('finals', [[grand_final], [rematch]])]
+
+
+class PlannedMatch(object):
+    """
+    A match planned in memory. First round matches have players; later ones
+    take the winner (or with loser_1/loser_2, the loser) of two earlier
+    planned matches, which point back to them through winner_to and loser_to
+    so the next match for either result is found directly.
+    """
+
+    def __init__(self, player_1=None, player_2=None, previous_1=None, previous_2=None,
+                 loser_1=False, loser_2=False, reset=False):
+        self.id = None
+        self.player_1 = player_1
+        self.player_2 = player_2
+        self.previous_1 = previous_1
+        self.previous_2 = previous_2
+        self.loser_1 = loser_1
+        self.loser_2 = loser_2
+        self.reset = reset
+        self.winner_to = None
+        self.loser_to = None
+
+        for previous, loser in ((previous_1, loser_1), (previous_2, loser_2)):
+            if previous is not None:
+                if loser:
+                    previous.loser_to = self
+                else:
+                    previous.winner_to = self
+
+    @property
+    def bye(self):
+        return self.previous_1 is None and self.player_2 is None
+
+    @property
+    def winner(self):
+        """
+        The player known to come out of the match ahead of play: the player
+        given a bye, or one advanced by a bye before
+        """
+        if self.bye:
+            return self.player_1
+
+    def _advancing(self, previous, loser):
+        if previous is not None and not loser and not self.reset:
+            return previous.winner
+
+    def to_match(self, **kwargs):
+        from matches.models import Match
+
+        if self.previous_1 is None:
+            return Match(player_1_init=self.player_1, player_2_init=self.player_2,
+                         player_1_resolved=self.player_1, player_2_resolved=self.player_2,
+                         winning_player=self.winner, bye=self.bye, **kwargs)
+
+        # Only players advanced by a bye are known ahead of play
+        return Match(previous_match_1_id=self.previous_1.id, previous_match_2_id=self.previous_2.id,
+                     previous_match_1_loser=self.loser_1, previous_match_2_loser=self.loser_2, reset=self.reset,
+                     player_1_resolved=self._advancing(self.previous_1, self.loser_1),
+                     player_2_resolved=self._advancing(self.previous_2, self.loser_2), **kwargs)
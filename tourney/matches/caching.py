@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import caches
+
+
+HITS_KEY = 'tourney:bracket-json:hits'
+MISSES_KEY = 'tourney:bracket-json:misses'
+
+
+def get_cache():
+    return caches[settings.TOURNEY_CACHE_ALIAS]
+
+
+def _json_key(bracket_id, version):
+    return 'tourney:bracket:{}:json:{}'.format(bracket_id, version)
+
+
+def _increment(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_bracket_json(bracket_id, version, build):
+    """
+    Return the cached JSON for a version of a bracket, calling build() to
+    make it on a miss. The version is Bracket.version, which is kept in the
+    database, so every process moves on to the new JSON as soon as a change
+    commits, whichever cache backend they use.
+    """
+    cache = get_cache()
+    key = _json_key(bracket_id, version)
+
+    data = cache.get(key)
+    if data is not None:
+        _increment(HITS_KEY)
+        return data
+
+    _increment(MISSES_KEY)
+    data = build()
+    cache.set(key, data, settings.BRACKET_CACHE_TIMEOUT)
+
+    return data
+
+
+def get_bracket_cache_stats():
+    """
+    Return the hit and miss counts for the bracket JSON cache
+    """
+    counts = get_cache().get_many([HITS_KEY, MISSES_KEY])
+
+    return {
+        'hits': counts.get(HITS_KEY, 0),
+        'misses': counts.get(MISSES_KEY, 0),
+    }
+
+
+def reset_bracket_cache_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,52 @@
+from django import forms
+
+
+class RoundScoresForm(forms.Form):
+    """
+    A pair of score fields for each match in a round, checked without any
+    queries
+    """
+
+    def __init__(self, matches, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.matches = matches
+
+        for match in matches:
+            for number in (1, 2):
+                self.fields[self._field_name(match, number)] = forms.IntegerField(
+                    min_value=0, required=False, initial=getattr(match, 'player_{}_score'.format(number)),
+                    label=getattr(match, 'player_{}'.format(number)).name
+                )
+
+    def _field_name(self, match, number):
+        return 'match_{}_{}'.format(match.id, number)
+
+    def rows(self):
+        """
+        Yield each match with its two bound score fields, for the template
+        """
+        for match in self.matches:
+            yield match, self[self._field_name(match, 1)], self[self._field_name(match, 2)]
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        for match in self.matches:
+            names = [self._field_name(match, number) for number in (1, 2)]
+            scores = [cleaned_data.get(name) for name in names]
+            if (scores[0] is None) != (scores[1] is None):
+                for name in names:
+                    if name not in self.errors:
+                        self.add_error(name, 'Enter both scores for {}, or neither'.format(match))
+
+        return cleaned_data
+
+    def scores(self):
+        """
+        Return the cleaned scores as {match_id: (player_1_score,
+        player_2_score)}
+        """
+        return {
+            match.id: (self.cleaned_data[self._field_name(match, 1)], self.cleaned_data[self._field_name(match, 2)])
+            for match in self.matches
+        }
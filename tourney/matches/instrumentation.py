@@ -0,0 +1,109 @@
+import collections
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger('tourney.performance')
+
+
+def sampled():
+    """
+    Return whether to instrument this request or command run, going by
+    PERFORMANCE_SAMPLE_RATE
+    """
+    rate = settings.PERFORMANCE_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class Measurement(object):
+    """
+    Record the wall time, the number of SQL queries, the time spent in them
+    and how many repeated an earlier query exactly, between start() and
+    stop(). Queries are logged through the debug cursor into a log of our
+    own, capped at the connection's queries_limit like its own, then handed
+    on to the connection's log so anything else watching it (like
+    assertNumQueries) still sees them.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.template_seconds = None
+
+    def start(self):
+        self._force_debug_cursor = connection.force_debug_cursor
+        self._queries_log = connection.queries_log
+        connection.force_debug_cursor = True
+        connection.queries_log = collections.deque(maxlen=connection.queries_limit)
+        self._start = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._start
+
+        queries = list(connection.queries_log)
+        self.queries = len(queries)
+        self.sql_seconds = sum(float(query['time']) for query in queries)
+        self.duplicate_queries = self.queries - len(set(query['sql'] for query in queries))
+
+        connection.force_debug_cursor = self._force_debug_cursor
+        connection.queries_log = self._queries_log
+        connection.queries_log.extend(queries)
+        return self
+
+    def as_dict(self):
+        return collections.OrderedDict([
+            ('name', self.name),
+            ('seconds', round(self.seconds, 4)),
+            ('queries', self.queries),
+            ('sql_seconds', round(self.sql_seconds, 4)),
+            ('duplicate_queries', self.duplicate_queries),
+            ('template_seconds', None if self.template_seconds is None else round(self.template_seconds, 4)),
+        ])
+
+    def server_timing(self):
+        """
+        Return the measurement as a Server-Timing header value, in
+        milliseconds, which browser developer tools show alongside the request
+        """
+        timings = [
+            'total;dur={:.1f}'.format(self.seconds * 1000),
+            'sql;dur={:.1f};desc="{} queries, {} duplicate"'.format(
+                self.sql_seconds * 1000, self.queries, self.duplicate_queries
+            ),
+        ]
+        if self.template_seconds is not None:
+            timings.append('template;dur={:.1f}'.format(self.template_seconds * 1000))
+
+        return ', '.join(timings)
+
+    def log(self):
+        """
+        Log the measurement as a line of JSON, as a warning if any queries
+        were repeated
+        """
+        level = logging.WARNING if self.duplicate_queries else logging.INFO
+        logger.log(level, json.dumps(self.as_dict()))
+
+
+@contextmanager
+def instrument(name, sample=True):
+    """
+    Measure and log a block, such as a management command run. With sample,
+    only the share of runs set by PERFORMANCE_SAMPLE_RATE are measured, and
+    None is yielded for the rest.
+    """
+    if sample and not sampled():
+        yield None
+        return
+
+    measurement = Measurement(name).start()
+    try:
+        yield measurement
+    finally:
+        measurement.stop().log()
@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from matches.caching import get_cache
+
+
+def _latest_key(tournament_id):
+    return 'tourney:tournament:{}:latest-change'.format(tournament_id)
+
+
+def _recent_key(tournament_id, latest_id):
+    return 'tourney:tournament:{}:changes:{}'.format(tournament_id, latest_id)
+
+
+def change_recorded(change):
+    """
+    Let viewers served by this process see a committed change straight away;
+    the rest pick it up within LIVE_POLL_INTERVAL
+    """
+    cache = get_cache()
+    key = _latest_key(change.tournament_id)
+
+    latest = cache.get(key)
+    if latest is None or latest < change.number:
+        cache.set(key, change.number, settings.LIVE_POLL_INTERVAL)
+
+
+def latest_change_number(tournament_id):
+    """
+    Return the number of the tournament's latest change (0 if there are
+    none), read from the database at most once per LIVE_POLL_INTERVAL however
+    many viewers are polling
+    """
+    from matches.models import Tournament
+
+    cache = get_cache()
+    key = _latest_key(tournament_id)
+
+    latest = cache.get(key)
+    if latest is None:
+        latest = Tournament.objects.filter(id=tournament_id).values_list('change_number', flat=True).first() or 0
+        cache.set(key, latest, settings.LIVE_POLL_INTERVAL)
+
+    return latest
+
+
+def changes_since(tournament_id, last_number):
+    """
+    Return the tournament's changes after last_number as (number, data)
+    pairs, oldest first. The latest LIVE_BACKLOG changes are read once and
+    shared between viewers; only ones further behind query for their own.
+    """
+    from matches.models import TournamentChange
+
+    latest = latest_change_number(tournament_id)
+    if latest <= last_number:
+        return []
+
+    cache = get_cache()
+    key = _recent_key(tournament_id, latest)
+
+    recent = cache.get(key)
+    if recent is None:
+        recent = list(TournamentChange.objects.filter(tournament_id=tournament_id, number__lte=latest).order_by(
+            '-number'
+        ).values_list('number', 'data')[:settings.LIVE_BACKLOG])[::-1]
+        cache.set(key, recent, settings.LIVE_STREAM_TIMEOUT)
+
+    if len(recent) < settings.LIVE_BACKLOG or recent[0][0] <= last_number:
+        return [(number, data) for number, data in recent if number > last_number]
+
+    return list(TournamentChange.objects.filter(
+        tournament_id=tournament_id, number__gt=last_number, number__lte=latest
+    ).order_by('number').values_list('number', 'data'))
+
+
+def format_event(number, data):
+    """
+    Return a change as a server-sent event; its number is sent back as
+    Last-Event-ID when the browser reconnects
+    """
+    return 'id: {}\nevent: change\ndata: {}\n\n'.format(number, data)
+
+
+def event_stream(tournament_id, last_number, sleep=time.sleep):
+    """
+    Yield server-sent events for the tournament's changes after last_number,
+    polling every LIVE_POLL_INTERVAL, with a comment every
+    LIVE_HEARTBEAT_INTERVAL to keep idle connections open. The stream ends
+    after LIVE_STREAM_TIMEOUT and the browser reconnects where it left off.
+    The database connection is closed between polls, so viewers waiting for
+    changes don't each hold one.
+    """
+    yield 'retry: {}\n\n'.format(settings.LIVE_RETRY_DELAY * 1000)
+
+    start = heartbeat = time.monotonic()
+    while True:
+        for number, data in changes_since(tournament_id, last_number):
+            last_number = number
+            heartbeat = time.monotonic()
+            yield format_event(number, data)
+
+        if not connection.in_atomic_block:
+            connection.close()
+
+        now = time.monotonic()
+        if now - start >= settings.LIVE_STREAM_TIMEOUT:
+            return
+
+        if now - heartbeat >= settings.LIVE_HEARTBEAT_INTERVAL:
+            heartbeat = now
+            yield ':\n\n'
+
+        sleep(settings.LIVE_POLL_INTERVAL)
@@ -0,0 +1,121 @@
+import collections
+import datetime
+import json
+from contextlib import contextmanager
+from io import StringIO
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from matches.caching import get_cache
+from matches.instrumentation import Measurement
+from matches.models import Round
+from matches.synthetic import create_tournament
+from matches.views import TournamentDetailView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time and count the queries of the main operations on synthetic tournaments, and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, nargs='+', default=[16, 256, 1024],
+                            help='The number of players in each tournament to benchmark')
+        parser.add_argument('--pool-size', type=int, default=8,
+                            help='How many players to put in each pool')
+        parser.add_argument('--label', default='',
+                            help='A label for the run, such as the commit being benchmarked')
+
+    def handle(self, *args, **options):
+        results = {
+            'label': options['label'],
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'runs': [],
+        }
+
+        # Keep synthetic data out of the real cache and mailboxes
+        with override_settings(
+            CACHES={'benchmark': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                  'LOCATION': 'benchmarktourney'}},
+            TOURNEY_CACHE_ALIAS='benchmark',
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            for players in options['players']:
+                results['runs'].append(self.benchmark(players, options['pool_size']))
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def benchmark(self, player_count, pool_size):
+        """
+        Create a tournament with a bracket of every player and pools of
+        pool_size, time each operation, and roll it all back
+        """
+        self.timings = collections.OrderedDict()
+        # The ids rolled back by the last run are handed out again
+        get_cache().clear()
+
+        try:
+            with transaction.atomic():
+                tournament, bracket, pools, players = create_tournament(player_count, pool_size)
+
+                with self.measure('bracket_generate_matches'):
+                    bracket._generate_matches(players=players)
+
+                with self.measure('pool_generate_matches'):
+                    for pool in pools:
+                        pool._generate_matches()
+
+                with self.measure('bracket_to_json'):
+                    bracket.to_json()
+
+                with self.measure('bracket_to_json_cached'):
+                    bracket.to_json()
+
+                with self.measure('pool_get_player_standings'):
+                    for pool in pools:
+                        pool.get_player_standings()
+
+                with self.measure('tournament_detail_view'):
+                    request = RequestFactory().get('/{}/'.format(tournament.slug))
+                    TournamentDetailView.as_view()(request, slug=tournament.slug).render()
+
+                now = timezone.now()
+                Round.objects.filter(number=1, bracket=bracket).update(
+                    start_datetime=now - datetime.timedelta(days=1), end_datetime=now + datetime.timedelta(days=6)
+                )
+                Round.objects.filter(number=1, pool__in=pools).update(
+                    start_datetime=now - datetime.timedelta(days=1), end_datetime=now + datetime.timedelta(days=6)
+                )
+                with self.measure('sendcurrentmatchups'):
+                    call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
+
+                raise Rollback
+        except Rollback:
+            pass
+
+        return collections.OrderedDict([
+            ('players', player_count),
+            ('pools', len(pools)),
+            ('timings', self.timings),
+        ])
+
+    @contextmanager
+    def measure(self, name):
+        measurement = Measurement(name).start()
+        try:
+            yield
+        finally:
+            measurement.stop()
+
+        timing = measurement.as_dict()
+        del timing['name'], timing['template_seconds']
+        self.timings[name] = timing
@@ -0,0 +1,107 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.utils import timezone
+
+from matches.models import Tournament, Round, Match, NotificationOutbox
+from players.models import Player, PoolStanding
+
+
+def hot_queries():
+    """
+    Return (name, queryset) pairs for the queries run most often, with
+    placeholder values. The planner chooses indexes from the shape of a
+    query, so the values don't need to exist.
+    """
+    now = timezone.now()
+
+    return [
+        ('tournament by slug', Tournament.objects.filter(slug='tournament').values_list('id', 'modified')),
+        ('bracket matches in order', Match.objects.filter(round__bracket=1).select_related(
+            'round', 'player_1_resolved', 'player_2_resolved'
+        ).order_by('round__number', 'round_index', 'id')),
+        ('bracket round by number', Round.objects.filter(bracket=1, number=1)),
+        ('pool round by number', Round.objects.filter(pool=1, number=1)),
+        ('round matches in order', Match.objects.filter(round=1).order_by('round_index').values_list('id')),
+        ('pool match by players', Match.objects.filter(player_1_init=1, player_2_init=2)),
+        ('subsequent matches', Match.objects.filter(models.Q(previous_match_1=1) | models.Q(previous_match_2=1))),
+        ('current matches', Match.objects.filter(round__start_datetime__lte=now, round__end_datetime__gte=now,
+                                                 bye=False).values_list('id')),
+        ('pool standings', PoolStanding.objects.filter(pool=1).select_related('player').order_by('rank')),
+        ('players by email', Player.objects.filter(email__in=['player@example.com']).values_list('email', 'id')),
+        ('outbox claim', NotificationOutbox.objects.filter(NotificationOutbox.objects._available(now)).order_by(
+            'id'
+        ).values_list('id')[:100]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot queries and report whether each one uses an index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true',
+                            help='Gather table statistics first, as planners can pick differently without them')
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Print the whole plan for each query')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any query scans a whole table')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError('EXPLAIN is only supported on SQLite and PostgreSQL')
+
+        if options['analyze']:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        scans = []
+        for name, queryset in hot_queries():
+            plan = self.explain(queryset)
+            uses_index, scanned = self.summarize(plan)
+
+            self.stdout.write('{:<28} {}{}'.format(
+                name,
+                'index' if uses_index else 'no index',
+                ', scans {}'.format(', '.join(scanned)) if scanned else ''
+            ))
+            if options['verbose_plans']:
+                for line in plan:
+                    self.stdout.write('    {}'.format(line))
+
+            if scanned:
+                scans.append(name)
+
+        if scans and options['fail_on_scan']:
+            raise CommandError('{} quer(ies) scan a whole table: {}'.format(len(scans), ', '.join(scans)))
+
+    def explain(self, queryset):
+        """
+        Return the lines of the query plan for a queryset
+        """
+        sql, params = queryset.query.sql_with_params()
+        prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+
+        with connection.cursor() as cursor:
+            cursor.execute('{} {}'.format(prefix, sql), params)
+            # SQLite's plan detail is the last column; PostgreSQL's the only one
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def summarize(self, plan):
+        """
+        Return whether a plan uses an index, and the tables it reads in full
+        """
+        uses_index = False
+        scanned = []
+
+        for line in plan:
+            if connection.vendor == 'sqlite':
+                if 'USING' in line and 'INDEX' in line or 'USING INTEGER PRIMARY KEY' in line:
+                    uses_index = True
+                elif line.startswith('SCAN'):
+                    scanned.append(line.split()[2] if line.startswith('SCAN TABLE') else line.split()[1])
+            else:
+                if 'Index' in line:
+                    uses_index = True
+                elif 'Seq Scan on' in line:
+                    scanned.append(line.split('Seq Scan on')[1].split()[0])
+
+        return uses_index, scanned
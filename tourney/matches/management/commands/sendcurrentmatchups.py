@@ -1,15 +1,53 @@
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from matches.models import Match
+from matches.instrumentation import instrument
+from matches.models import Match, NotificationOutbox
+from matches.notifications import NotificationDispatcher, drain_outbox
 
 
 class Command(BaseCommand):
     help = 'Send eamil notifications to the players in the current round of matches'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE,
+                            help='How many notifications to claim from the outbox at a time')
+        parser.add_argument('--workers', type=int, default=settings.NOTIFICATION_WORKERS,
+                            help='How many emails to send at once')
+        parser.add_argument('--rate', type=float, default=settings.NOTIFICATION_RATE_LIMIT,
+                            help='The most emails to send per second')
+        parser.add_argument('--outbox-only', action='store_true',
+                            help="Only send what's already in the outbox, without looking for current matches")
+        parser.add_argument('--digest', action='store_true',
+                            help='Send each player one email covering all of their matches, and the organizer '
+                                 'one summary')
+
     def handle(self, *args, **options):
-        matches = Match.objects.filter(round__start_datetime__lte=timezone.now(),
-                                       round__end_datetime__gte=timezone.now())
+        with instrument('sendcurrentmatchups'):
+            self.send(options)
+
+    def send(self, options):
+        # Bracket matches are added to the outbox as their players become
+        # known, so the scan only matters for matches that were set up ahead
+        if not options['outbox_only']:
+            now = timezone.now()
+            match_ids = Match.objects.filter(round__start_datetime__lte=now,
+                                             round__end_datetime__gte=now,
+                                             bye=False,
+                                             player_1_resolved__isnull=False,
+                                             player_2_resolved__isnull=False,
+                                             notifications__isnull=True,
+                                             outbox__isnull=True).values_list('id', flat=True)
+            NotificationOutbox.objects.enqueue(match_ids)
+
+        dispatcher = NotificationDispatcher(workers=options['workers'], rate=options['rate'],
+                                            batch_size=options['batch_size'])
+        summary = drain_outbox(dispatcher, batch_size=options['batch_size'], digest=options['digest'])
+
+        for match, error in summary.failures:
+            self.stderr.write('Match {}: {}'.format(match.id, error))
+        self.stdout.write(str(summary))
 
-        for match in matches:
-            match.notify_players()
+        if summary.failed:
+            raise CommandError('{} notification(s) could not be sent'.format(summary.failed))
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+
+from matches.instrumentation import Measurement, sampled
+
+
+class PerformanceMiddleware(object):
+    """
+    Measure a sample of requests (PERFORMANCE_SAMPLE_RATE of them), logging
+    the wall time, SQL queries and template render time of each, and adding
+    them as a Server-Timing header when PERFORMANCE_HEADER is on. Put it first
+    in MIDDLEWARE_CLASSES so the time includes the other middleware.
+    """
+
+    def process_request(self, request):
+        if sampled():
+            request._performance = Measurement('{} {}'.format(request.method, request.path)).start()
+
+    def process_template_response(self, request, response):
+        measurement = getattr(request, '_performance', None)
+        if measurement is not None:
+            start = time.perf_counter()
+
+            def record_render_time(response):
+                measurement.template_seconds = time.perf_counter() - start
+
+            response.add_post_render_callback(record_render_time)
+
+        return response
+
+    def process_response(self, request, response):
+        measurement = getattr(request, '_performance', None)
+        if measurement is None:
+            return response
+
+        del request._performance
+        measurement.stop().log()
+
+        if settings.PERFORMANCE_HEADER:
+            response['Server-Timing'] = measurement.server_timing()
+
+        return response
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0009_auto_20160518_2053'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='bye',
+            field=models.BooleanField(default=False, help_text='Set for first round matches where player 1 advances unopposed'),
+        ),
+    ]
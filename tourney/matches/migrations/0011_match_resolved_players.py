@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def resolve_players(apps, schema_editor):
+    """
+    Fill in the resolved players and winner for existing matches
+    """
+    Match = apps.get_model('matches', 'Match')
+
+    matches = {match.id: match for match in Match.objects.all()}
+    resolved = {}
+
+    def winner(match, player_1_id, player_2_id):
+        if match.bye:
+            return player_1_id
+        if match.player_1_score is None or match.player_2_score is None:
+            return None
+        if match.player_1_score > match.player_2_score:
+            return player_1_id
+        if match.player_2_score > match.player_1_score:
+            return player_2_id
+
+    def resolve(match):
+        if match.id not in resolved:
+            if match.previous_match_1_id:
+                player_1_id = resolve(matches[match.previous_match_1_id])[2]
+                player_2_id = resolve(matches[match.previous_match_2_id])[2]
+            else:
+                player_1_id, player_2_id = match.player_1_init_id, match.player_2_init_id
+            resolved[match.id] = (player_1_id, player_2_id, winner(match, player_1_id, player_2_id))
+
+        return resolved[match.id]
+
+    for match in matches.values():
+        player_1_id, player_2_id, winning_player_id = resolve(match)
+        Match.objects.filter(id=match.id).update(player_1_resolved=player_1_id,
+                                                 player_2_resolved=player_2_id,
+                                                 winning_player=winning_player_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0002_pool'),
+        ('matches', '0010_match_bye'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='player_1_resolved',
+            field=models.ForeignKey(blank=True, editable=False, help_text='player_1_init or the winner of previous_match_1', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='players.Player'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='player_2_resolved',
+            field=models.ForeignKey(blank=True, editable=False, help_text='player_2_init or the winner of previous_match_2', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='players.Player'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='winning_player',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='players.Player'),
+        ),
+        migrations.RunPython(resolve_players, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0011_match_resolved_players'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, help_text='When any data shown for the tournament last changed'),
+            preserve_default=False,
+        ),
+    ]
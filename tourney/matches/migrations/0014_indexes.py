@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:59
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def number_duplicate_slugs(apps, schema_editor):
+    """
+    Number the slugs of tournaments that share a name, so slugs can be unique
+    """
+    Tournament = apps.get_model('matches', 'Tournament')
+
+    seen = set(Tournament.objects.values_list('slug', flat=True).distinct())
+    taken = set()
+    for tournament in Tournament.objects.order_by('id'):
+        if tournament.slug not in taken:
+            taken.add(tournament.slug)
+            continue
+
+        number = 2
+        while '{}-{}'.format(tournament.slug[:90], number) in seen | taken:
+            number += 1
+        tournament.slug = '{}-{}'.format(tournament.slug[:90], number)
+        taken.add(tournament.slug)
+        tournament.save(update_fields=['slug'])
+
+
+def merge_duplicate_rounds(apps, schema_editor):
+    """
+    Merge rounds that share a number in the same bracket or pool into the
+    first of them, so round numbers can be unique
+    """
+    Round = apps.get_model('matches', 'Round')
+    Match = apps.get_model('matches', 'Match')
+
+    for field in ('bracket', 'pool'):
+        duplicates = Round.objects.filter(**{'{}__isnull'.format(field): False}).values(field, 'number').annotate(
+            count=models.Count('id')
+        ).filter(count__gt=1)
+
+        for duplicate in duplicates:
+            rounds = list(Round.objects.filter(**{field: duplicate[field], 'number': duplicate['number']}).order_by(
+                'id'
+            ))
+            kept, merged = rounds[0], rounds[1:]
+
+            for round in merged:
+                kept.start_datetime = kept.start_datetime or round.start_datetime
+                kept.end_datetime = kept.end_datetime or round.end_datetime
+            kept.save(update_fields=['start_datetime', 'end_datetime'])
+
+            Match.objects.filter(round__in=merged).update(round=kept)
+            Round.objects.filter(id__in=[round.id for round in merged]).delete()
+
+    if schema_editor.connection.vendor == 'postgresql':
+        # Check the deferred foreign keys now, as PostgreSQL won't alter a
+        # table with checks pending
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0013_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(number_duplicate_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tournament',
+            name='slug',
+            field=models.SlugField(max_length=100, unique=True),
+        ),
+        migrations.RunPython(merge_duplicate_rounds, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='round',
+            unique_together=set([('bracket', 'number'), ('pool', 'number')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='match',
+            index_together=set([('round', 'round_index'), ('player_1_init', 'player_2_init')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='round',
+            index_together=set([('start_datetime', 'end_datetime')]),
+        ),
+    ]
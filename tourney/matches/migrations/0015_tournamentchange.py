@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-17 00:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0014_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('data', models.TextField(help_text='The changed matches and standings, as JSON')),
+                ('tournament', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='matches.Tournament')),
+            ],
+        ),
+        migrations.AlterIndexTogether(
+            name='tournamentchange',
+            index_together=set([('tournament', 'id')]),
+        ),
+    ]
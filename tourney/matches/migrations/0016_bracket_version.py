@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-17 00:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0015_tournamentchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bracket',
+            name='snapshot_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='The version matches were last added or removed at'),
+        ),
+        migrations.AddField(
+            model_name='bracket',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Incremented whenever a result or player in the bracket changes'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='The bracket version the match last changed at'),
+        ),
+        migrations.AlterIndexTogether(
+            name='match',
+            index_together=set([('round', 'round_index'), ('round', 'version'), ('player_1_init', 'player_2_init')]),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-17 00:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0016_bracket_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bracket',
+            name='elimination',
+            field=models.CharField(choices=[('single', 'Single elimination'), ('double', 'Double elimination')], default='single', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='previous_match_1_loser',
+            field=models.BooleanField(default=False, help_text='Take the loser of previous_match_1, not the winner'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='previous_match_2_loser',
+            field=models.BooleanField(default=False, help_text='Take the loser of previous_match_2, not the winner'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='reset',
+            field=models.BooleanField(default=False, help_text='A grand final rematch (with both previous matches set to the grand final), only played if the losers bracket champion wins the first'),
+        ),
+        migrations.AddField(
+            model_name='round',
+            name='section',
+            field=models.CharField(choices=[('winners', 'Winners'), ('losers', 'Losers'), ('finals', 'Finals')], default='winners', help_text='The part of a double elimination bracket the round is in', max_length=10),
+        ),
+        migrations.AlterUniqueTogether(
+            name='round',
+            unique_together=set([('pool', 'number'), ('bracket', 'section', 'number')]),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-17 00:23
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_player_email_index'),
+        ('matches', '0017_double_elimination'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchnotification',
+            name='player',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.Player'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-17 00:25
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_pairings(apps, schema_editor):
+    """
+    Take existing notifications to be about their match's current pairing
+    """
+    Match = apps.get_model('matches', 'Match')
+    MatchNotification = apps.get_model('matches', 'MatchNotification')
+
+    pairings = Match.objects.filter(notifications__isnull=False).values_list(
+        'id', 'player_1_resolved', 'player_2_resolved'
+    ).distinct()
+    for match_id, player_1_id, player_2_id in pairings:
+        MatchNotification.objects.filter(match=match_id).update(player_1=player_1_id, player_2=player_2_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0004_player_email_index'),
+        ('matches', '0018_matchnotification_player'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchnotification',
+            name='player_1',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.Player'),
+        ),
+        migrations.AddField(
+            model_name='matchnotification',
+            name='player_2',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='players.Player'),
+        ),
+        migrations.RunPython(record_pairings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def number_changes(apps, schema_editor):
+    """
+    Number each tournament's existing changes in the order they were made
+    """
+    Tournament = apps.get_model('matches', 'Tournament')
+    TournamentChange = apps.get_model('matches', 'TournamentChange')
+
+    numbers = {}
+    for change_id, tournament_id in TournamentChange.objects.order_by('id').values_list('id', 'tournament_id'):
+        numbers[tournament_id] = numbers.get(tournament_id, 0) + 1
+        TournamentChange.objects.filter(id=change_id).update(number=numbers[tournament_id])
+
+    for tournament_id, number in numbers.items():
+        Tournament.objects.filter(id=tournament_id).update(change_number=number)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matches', '0019_matchnotification_pairing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tournament',
+            name='change_number',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='The number of the latest change recorded for live viewers'),
+        ),
+        migrations.AddField(
+            model_name='tournamentchange',
+            name='number',
+            field=models.PositiveIntegerField(default=0, help_text="The change's place in the tournament's sequence"),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_changes, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='tournamentchange',
+            unique_together=set([('tournament', 'number')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='tournamentchange',
+            index_together=set([]),
+        ),
+    ]
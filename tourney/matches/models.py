@@ -1,122 +1,252 @@
-from random import shuffle
+import datetime
 import json
 
-import pytz
-
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMessage
 from django.template.loader import get_template
 from django.utils import timezone
 from django.utils.text import slugify
 
-from players.models import Player
+from matches.builders import SingleEliminationBuilder, DoubleEliminationBuilder
+from matches.caching import get_bracket_json
+from matches.notifications import format_deadline
+from matches.resolvers import BracketResolver
+from players.models import Player, PoolStanding
+
+
+def _loser(outcome):
+    """
+    Return the loser from a (player_1, player_2, winner) tuple, or None until
+    there's a winner
+    """
+    player_1, player_2, winner = outcome
+
+    if winner is None:
+        return
+    return player_2 if winner == player_1 else player_1
+
+
+def _values_by_id(objects, attname):
+    """
+    Return an expression giving each object's value for attname by id, to
+    write different values to many rows with a single UPDATE
+    """
+    return models.Case(
+        *[models.When(id=obj.id, then=models.Value(getattr(obj, attname))) for obj in objects],
+        output_field=models.IntegerField()
+    )
+
+
+class TournamentQuerySet(models.QuerySet):
+
+    def touch(self):
+        """
+        Record that data shown for these tournaments changed just now
+        """
+        return self.update(modified=timezone.now())
 
 
 class Tournament(models.Model):
     name = models.CharField(max_length=100, help_text='The public name of the tournament')
-    slug = models.SlugField(max_length=100)
+    slug = models.SlugField(max_length=100, unique=True)
     players = models.ManyToManyField(Player)
+    modified = models.DateTimeField(auto_now=True,
+                                    help_text='When any data shown for the tournament last changed')
+    change_number = models.PositiveIntegerField(default=0, editable=False,
+                                                help_text='The number of the latest change recorded for live viewers')
+
+    objects = TournamentQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         """
-        Make a slug from Tournament.name
+        Make a slug from Tournament.name, numbered if another tournament
+        already has it. The change number is only moved on by
+        TournamentChangeManager, so saving an instance loaded earlier doesn't
+        wind it back.
         """
-        self.slug = slugify(self.name)
+        slug = slugify(self.name)[:90]
+        self.slug = slug
+
+        others = Tournament.objects.exclude(id=self.id)
+        number = 1
+        while others.filter(slug=self.slug).exists():
+            number += 1
+            self.slug = '{}-{}'.format(slug, number)
+
+        if self.pk is not None and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'change_number']
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+class BracketManager(models.Manager):
+
+    def bump_versions(self, *bracket_ids):
+        """
+        Move brackets on to their next version without marking any matches,
+        for changes that only show in the whole bracket's JSON
+        """
+        bracket_ids = [bracket_id for bracket_id in bracket_ids if bracket_id is not None]
+        if bracket_ids:
+            self.filter(id__in=bracket_ids).update(version=models.F('version') + 1)
+
+    def record_change(self, bracket_id, match_ids=(), structure=False):
+        """
+        Move a bracket on to its next version, marking match_ids as changed
+        at it, and return the version. Pass structure when matches were added
+        or removed, so clients from before it get a full snapshot.
+        """
+        updates = {'version': models.F('version') + 1}
+        if structure:
+            updates['snapshot_version'] = models.F('version') + 1
+        self.filter(id=bracket_id).update(**updates)
+
+        version = self.filter(id=bracket_id).values_list('version', flat=True).first()
+        if match_ids and version is not None:
+            Match.objects.filter(id__in=match_ids).update(version=version)
+
+        return version
+
+
 class Bracket(models.Model):
+    SINGLE_ELIMINATION = 'single'
+    DOUBLE_ELIMINATION = 'double'
+    ELIMINATION_CHOICES = (
+        (SINGLE_ELIMINATION, 'Single elimination'),
+        (DOUBLE_ELIMINATION, 'Double elimination'),
+    )
+
     name = models.CharField(max_length=100, help_text='The public name for the bracket')
     slug = models.SlugField(max_length=100)
     tournament = models.ForeignKey(Tournament)
+    elimination = models.CharField(max_length=10, choices=ELIMINATION_CHOICES, default=SINGLE_ELIMINATION)
+    version = models.PositiveIntegerField(default=0, editable=False,
+                                          help_text='Incremented whenever a result or player in the bracket changes')
+    snapshot_version = models.PositiveIntegerField(default=0, editable=False,
+                                                   help_text='The version matches were last added or removed at')
+
+    objects = BracketManager()
 
     def save(self, *args, **kwargs):
         """
-        Make a slug from Bracket.name
+        Make a slug from Bracket.name. The versions are only moved on by
+        BracketManager, so saving an instance loaded earlier doesn't wind
+        them back.
         """
         self.slug = slugify(self.name)
+        if self.pk is not None and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in ('version', 'snapshot_version')]
         super().save(*args, **kwargs)
 
     def _generate_matches(self, players):
         """
-        Generate matches for a list of players
+        Generate matches for a list of players. Single elimination brackets
+        add byes when the number of players isn't a power of two; double
+        elimination brackets need a power of two.
         """
-        shuffle(players)
+        if self.elimination == self.DOUBLE_ELIMINATION:
+            builder = DoubleEliminationBuilder
+        else:
+            builder = SingleEliminationBuilder
 
-        initial_matches = []
-        i = 0
-        while i < len(players):
-            round, created = Round.objects.get_or_create(
-                bracket=self,
-                number=1
-            )
-            match = Match(
-                player_1_init=players.pop(),
-                player_2_init=players.pop(),
-                round=round,
-                round_index=int(i/2)
-            )
-            match.save()
-            initial_matches.append(match)
-
-        def recurse(matches, round_number):
-            """
-            Make downstream matches recursively
-            """
-            new_round, created = Round.objects.get_or_create(
-                bracket=self,
-                number=round_number
-            )
-
-            new_matches = []
-            i = 0
-            while i < len(matches):
-                match = Match(
-                    previous_match_1=matches.pop(),
-                    previous_match_2=matches.pop(),
-                    round=new_round,
-                    round_index=int(i/2)
-                )
-                match.save()
-                new_matches.append(match)
-
-            if len(new_matches) > 1:
-                recurse(matches=new_matches, round_number=round_number+1)
-
-        recurse(matches=initial_matches, round_number=2)
+        builder(bracket=self, players=players).save()
 
     def to_json(self):
         """
         Generate JSON for consumption by jQuery Bracket
-        (http://www.aropupu.fi/bracket/)
+        (http://www.aropupu.fi/bracket/), cached under the bracket's version
+        as it was loaded. Double elimination brackets have results for the
+        winners bracket, losers bracket and finals; single elimination ones
+        just the first.
         """
-        data = {'teams':[], 'results':[[]]}
-        matches = Match.objects.filter(round__bracket=self).order_by('round__number', 'round_index', 'id')
+        return get_bracket_json(self.id, self.version, self._build_json)
 
-        for match in matches:
-            if match.round.number == 1:
-                data['teams'].append([match.player_1.name, match.player_2.name])
+    @property
+    def sections(self):
+        """
+        The sections of the bracket, in the order jQuery Bracket expects their
+        results
+        """
+        if self.elimination == self.DOUBLE_ELIMINATION:
+            return [Round.WINNERS, Round.LOSERS, Round.FINALS]
+        return [Round.WINNERS]
 
-            if len(data['results'][0]) < match.round.number:
-                data['results'][0].append([])
+    def _build_json(self):
+        sections = self.sections
+        data = {'teams': [], 'results': [[] for section in sections]}
+        matches = Match.objects.filter(round__bracket=self).select_related(
+            'round', 'player_1_resolved', 'player_2_resolved'
+        ).order_by('round__section', 'round__number', 'round_index', 'id')
 
-            result = []
-            if (match.player_1_score is not None) and (match.player_2_score is not None):
-                result = [match.player_1_score, match.player_2_score]
+        for match in matches:
+            if match.round.section == Round.WINNERS and match.round.number == 1:
+                data['teams'].append([
+                    match.player_1.name,
+                    match.player_2.name if match.player_2 else None  # a bye
+                ])
+
+            results = data['results'][sections.index(match.round.section)]
+            while len(results) < match.round.number:
+                results.append([])
 
-            data['results'][0][match.round.number-1].append(result)
+            results[match.round.number-1].append(match._result_cell())
 
         return json.dumps(data)
 
+    def delta_json(self, since):
+        """
+        Generate JSON with the team names and results changed after version
+        since, as [round_index, player_1, player_2] teams and [round number,
+        round_index, result] results (prefixed by the index of the section in
+        double elimination brackets). Clients from before matches were last
+        added or removed, or further behind than BRACKET_DELTA_MAX_MATCHES
+        changed matches, get a full snapshot in the to_json format instead.
+        Both include the version to ask for changes since next time.
+        """
+        if self.snapshot_version <= since <= self.version:
+            matches = list(Match.objects.filter(round__bracket=self, version__gt=since).select_related(
+                'round', 'player_1_resolved', 'player_2_resolved'
+            ).order_by('round__section', 'round__number', 'round_index', 'id')[:settings.BRACKET_DELTA_MAX_MATCHES + 1])
+
+            if len(matches) <= settings.BRACKET_DELTA_MAX_MATCHES:
+                data = {'version': self.version, 'since': since, 'teams': [], 'results': []}
+                for match in matches:
+                    if match.round.section == Round.WINNERS and match.round.number == 1:
+                        data['teams'].append([match.round_index, match.player_1.name,
+                                              match.player_2.name if match.player_2 else None])
+
+                    cell = [match.round.number, match.round_index, match._result_cell()]
+                    if len(self.sections) > 1:
+                        cell.insert(0, self.sections.index(match.round.section))
+                    data['results'].append(cell)
+
+                return json.dumps(data, separators=(',', ':'))
+
+        data = json.loads(self.to_json())
+        data['version'] = self.version
+        return json.dumps(data, separators=(',', ':'))
+
 
 class Round(models.Model):
+    WINNERS = 'winners'
+    LOSERS = 'losers'
+    FINALS = 'finals'
+    SECTION_CHOICES = (
+        (WINNERS, 'Winners'),
+        (LOSERS, 'Losers'),
+        (FINALS, 'Finals'),
+    )
+
     bracket_pool_help_text = 'Set either the bracket or pool field'
     number = models.PositiveIntegerField()
+    section = models.CharField(max_length=10, choices=SECTION_CHOICES, default=WINNERS,
+                               help_text='The part of a double elimination bracket the round is in')
     bracket = models.ForeignKey(Bracket, blank=True, null=True,
                                 help_text=bracket_pool_help_text)
     pool = models.ForeignKey('players.Pool', blank=True, null=True,
@@ -124,6 +254,10 @@ class Round(models.Model):
     start_datetime = models.DateTimeField(blank=True, null=True)
     end_datetime = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        unique_together = [('bracket', 'section', 'number'), ('pool', 'number')]
+        index_together = [('start_datetime', 'end_datetime')]
+
     def save(self, *args, **kwargs):
         """
         Disallow the bracket and pool fields to be set simultaneously
@@ -139,18 +273,81 @@ class Round(models.Model):
 
     def __str__(self):
         representation = 'Round {}'.format(self.number)
+        if self.section != self.WINNERS:
+            representation = '{} {}'.format(self.get_section_display(), representation)
 
         if self.start_datetime:
             representation = '{} ({} - {})'.format(representation, self.start_datetime.strftime('%b %d'), self.end_datetime.strftime('%b %d'))
 
-        if self.pool:
-            representation = 'Pool {} {}'.format(self.pool.id, representation)
+        if self.pool_id:
+            representation = 'Pool {} {}'.format(self.pool_id, representation)
 
-        if self.bracket:
+        if self.bracket_id:
             representation = '{} {}'.format(self.bracket.name, representation)
 
         return representation
 
+    @transaction.atomic
+    def record_scores(self, scores):
+        """
+        Save the scores of many of the round's matches at once, given as
+        {match_id: (player_1_score, player_2_score)}, and return the matches
+        that changed. Scores and winners are written with one UPDATE, then
+        the pool standings or the later matches of the bracket are worked out
+        once for the round, rather than once per match as Match.save does.
+        """
+        matches = list(self.match_set.filter(id__in=scores))
+        if len(matches) != len(scores) or any(match.bye for match in matches):
+            raise ValidationError('Scores can only be entered for matches in the round that aren\'t byes')
+
+        changed = []
+        for match in matches:
+            if (match.player_1_score, match.player_2_score) != tuple(scores[match.id]):
+                match.player_1_score, match.player_2_score = scores[match.id]
+                match.winning_player_id = match._pick_winner(match.player_1_resolved_id,
+                                                             match.player_2_resolved_id)
+                changed.append(match)
+
+        if not changed:
+            return []
+
+        Match.objects.filter(id__in=[match.id for match in changed]).update(
+            player_1_score=_values_by_id(changed, 'player_1_score'),
+            player_2_score=_values_by_id(changed, 'player_2_score'),
+            winning_player=_values_by_id(changed, 'winning_player_id'),
+        )
+        updated = [match.id for match in changed]
+
+        if self.pool_id is not None:
+            PoolStanding.objects.rebuild(self.pool_id)
+            tournament_id = self.pool.tournament_id
+        else:
+            resolver = BracketResolver.for_bracket(self.bracket_id)
+            stored = {match.id: (match.player_1_resolved_id, match.player_2_resolved_id)
+                      for match in resolver.matches.values()}
+
+            stale = resolver.stale_matches()
+            if stale:
+                Match.objects.filter(id__in=[match.id for match in stale]).update(
+                    player_1_resolved=_values_by_id(stale, 'player_1_resolved_id'),
+                    player_2_resolved=_values_by_id(stale, 'player_2_resolved_id'),
+                    winning_player=_values_by_id(stale, 'winning_player_id'),
+                )
+                NotificationOutbox.objects.requeue([
+                    match.id for match in stale
+                    if match.player_1_resolved_id and match.player_2_resolved_id and
+                    (match.player_1_resolved_id, match.player_2_resolved_id) != stored[match.id]
+                ])
+                updated += [match.id for match in stale]
+
+            Bracket.objects.record_change(self.bracket_id, updated)
+            tournament_id = self.bracket.tournament_id
+
+        Tournament.objects.filter(id=tournament_id).touch()
+        TournamentChange.objects.record_matches(updated)
+
+        return changed
+
 
 class Match(models.Model):
     player_1_init = models.ForeignKey(Player, blank=True, null=True,
@@ -169,11 +366,43 @@ class Match(models.Model):
     round_index = models.PositiveIntegerField(
         help_text='The order of this match in the round (used for positioning).'
     )
+    bye = models.BooleanField(default=False,
+                              help_text='Set for first round matches where player 1 advances unopposed')
+    player_1_resolved = models.ForeignKey(Player, blank=True, null=True, editable=False,
+                                          on_delete=models.SET_NULL, related_name='+',
+                                          help_text='player_1_init or the winner of previous_match_1')
+    player_2_resolved = models.ForeignKey(Player, blank=True, null=True, editable=False,
+                                          on_delete=models.SET_NULL, related_name='+',
+                                          help_text='player_2_init or the winner of previous_match_2')
+    winning_player = models.ForeignKey(Player, blank=True, null=True, editable=False,
+                                       on_delete=models.SET_NULL, related_name='+')
+    previous_match_1_loser = models.BooleanField(default=False,
+                                                 help_text='Take the loser of previous_match_1, not the winner')
+    previous_match_2_loser = models.BooleanField(default=False,
+                                                 help_text='Take the loser of previous_match_2, not the winner')
+    reset = models.BooleanField(default=False,
+                                help_text='A grand final rematch (with both previous matches set to the grand '
+                                          'final), only played if the losers bracket champion wins the first')
+    version = models.PositiveIntegerField(default=0, editable=False,
+                                          help_text='The bracket version the match last changed at')
+
+    # The result as last loaded or saved, to update pool standings by delta
+    _saved_result = None
 
     class Meta:
         verbose_name_plural = 'matches'
+        index_together = [('round', 'round_index'), ('player_1_init', 'player_2_init'), ('round', 'version')]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_result = instance._result()
+        return instance
 
     def __str__(self):
+        if self.bye:
+            return '{} (bye)'.format(self.player_1)
+
         return '{} vs. {}'.format(self.player_1, self.player_2)
 
     @property
@@ -181,69 +410,247 @@ class Match(models.Model):
         """
         Return player_1_init or the winner of previous_match_1
         """
-        return self.player_1_init or self.previous_match_1.winner()
+        if self.pk is None and self.player_1_resolved_id is None:
+            return self.player_1_init or self._from_previous(1, self.previous_match_1._outcome())
+
+        return self.player_1_resolved
 
     @property
     def player_2(self):
         """
-        Return player_2_init or the winner of previous_match_2
+        Return player_2_init or the winner of previous_match_2 (None for a bye)
         """
-        return self.player_2_init or self.previous_match_2.winner()
+        if self.bye:
+            return
+
+        if self.pk is None and self.player_2_resolved_id is None:
+            return self.player_2_init or self._from_previous(2, self.previous_match_2._outcome())
+
+        return self.player_2_resolved
 
     def winner(self):
         """
-        Return the player with the highest score for the match
+        Return the player with the highest score for the match, or player_1
+        for a bye
         """
+        return self._pick_winner(self.player_1, self.player_2)
+
+    def _outcome(self):
+        return self.player_1, self.player_2, self.winner()
+
+    def _from_previous(self, slot, outcome):
+        """
+        Return the player this match takes into slot 1 or 2 from the outcome
+        of the previous match in that slot, given as a (player_1, player_2,
+        winner) tuple of players or ids: its winner, or its loser if the slot
+        takes the loser. A grand final rematch takes the same players as the
+        grand final, once the losers bracket champion (player 2) has won it.
+        """
+        player_1, player_2, winner = outcome
+
+        if self.reset:
+            if winner is not None and winner == player_2:
+                return outcome[slot - 1]
+            return
+
+        if getattr(self, 'previous_match_{}_loser'.format(slot)):
+            return _loser(outcome)
+
+        return winner
+
+    def _result_cell(self):
+        """
+        Return the match's result as jQuery Bracket shows it
+        """
+        if (self.player_1_score is not None) and (self.player_2_score is not None):
+            return [self.player_1_score, self.player_2_score]
+
+        return []
+
+    def _pick_winner(self, player_1, player_2):
+        """
+        Return whichever of player_1 and player_2 (players or their ids) won
+        """
+        if self.bye:
+            return player_1
+
         if self.player_1_score is None or self.player_2_score is None:
             return
 
         if self.player_1_score > self.player_2_score:
-            return self.player_1
+            return player_1
         if self.player_2_score > self.player_1_score:
-            return self.player_2
+            return player_2
 
     def save(self, *args, **kwargs):
         """
-        Confirm that either both player fields or both match fields are set
+        Confirm that either both player fields or both match fields are set,
+        or that only player_1_init is set for a bye. Then store the resolved
+        players and winner, and carry the winner forward to later matches.
         """
-        player_error = False
+        if self.bye:
+            if not self.player_1_init or self.player_2_init or self.previous_match_1 or self.previous_match_2:
+                raise ValidationError('A bye must only set the player_1_init field.')
+        else:
+            player_error = False
 
-        if (self.player_1_init and not self.player_2_init) or (self.player_2_init and not self.player_1_init):
-            player_error = True
+            if (self.player_1_init and not self.player_2_init) or (self.player_2_init and not self.player_1_init):
+                player_error = True
 
-        if (self.previous_match_1 and not self.previous_match_2) or (self.previous_match_2 and not self.previous_match_1):
-            player_error = True
+            if (self.previous_match_1 and not self.previous_match_2) or (self.previous_match_2 and not self.previous_match_1):
+                player_error = True
 
-        if (not self.player_1_init and not self.player_2_init) and (not self.previous_match_1 and not self.previous_match_2):
-            player_error = True
+            if (not self.player_1_init and not self.player_2_init) and (not self.previous_match_1 and not self.previous_match_2):
+                player_error = True
 
-        if (self.player_1_init or self.player_2_init) and (self.previous_match_1 or self.previous_match_2):
-            player_error = True
+            if (self.player_1_init or self.player_2_init) and (self.previous_match_1 or self.previous_match_2):
+                player_error = True
 
-        if player_error:
-            raise ValidationError('Either both player fields or both match fields must be set.')
+            if player_error:
+                raise ValidationError('Either both player fields or both match fields must be set.')
 
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            created = self.pk is None
+            self._resolve_players()
+            super().save(*args, **kwargs)
+            advanced = self._propagate_winner()
 
-    def notify_players(self):
+            result = self._result()
+            result_changed = result != self._saved_result
+            if result_changed:
+                PoolStanding.objects.record_result_change(self._saved_result, result)
+                self._saved_result = result
+
+            if self.round_id and (created or result_changed or advanced):
+                bracket_id = Round.objects.filter(id=self.round_id).values_list('bracket_id', flat=True).first()
+                if bracket_id is not None:
+                    Bracket.objects.record_change(bracket_id, [self.id] + advanced, structure=created)
+
+            if not created and (result_changed or advanced):
+                TournamentChange.objects.record_matches([self.id] + advanced)
+
+    def _result(self):
         """
-        Send an email to the players in a match, notifying of their partner and
-        when they need to complete their match
+        Return the (round_id, player_1_id, player_2_id, player_1_score,
+        player_2_score) tuple the pool standings are counted from
         """
-        if self.notifications.count():
-            return 'The players in match {} have already been notified'.format(self.id)
+        fields = ('round_id', 'player_1_init_id', 'player_2_init_id', 'player_1_score', 'player_2_score')
+        if any(field not in self.__dict__ for field in fields):
+            # Deferred fields; don't load them just to track the result
+            return
 
-        user_time_zone = pytz.timezone(settings.DEFAULT_USER_TIME_ZONE)
+        return tuple(self.__dict__[field] for field in fields)
 
-        template = get_template('matches/notify_players.txt')
+    def _resolve_players(self):
+        """
+        Set the resolved player fields from the init players or the stored
+        winners of the previous matches, and the winner from the scores
+        """
+        if self.previous_match_1_id:
+            previous_matches = Match.objects.select_related(
+                'player_1_resolved', 'player_2_resolved', 'winning_player'
+            ).in_bulk([self.previous_match_1_id, self.previous_match_2_id])
+            self.player_1_resolved = self._from_previous(1, previous_matches[self.previous_match_1_id]._stored_outcome())
+            self.player_2_resolved = self._from_previous(2, previous_matches[self.previous_match_2_id]._stored_outcome())
+        else:
+            self.player_1_resolved = self.player_1_init
+            self.player_2_resolved = self.player_2_init
+
+        self.winning_player = self._pick_winner(self.player_1_resolved, self.player_2_resolved)
+
+    def _stored_outcome(self, ids=False):
+        """
+        Return the stored (player_1, player_2, winner), as players or ids
+        """
+        if ids:
+            return self.player_1_resolved_id, self.player_2_resolved_id, self.winning_player_id
+
+        return self.player_1_resolved, self.player_2_resolved, self.winning_player
+
+    def _propagate_winner(self):
+        """
+        Copy the winner (and loser) of this match into the matches it feeds,
+        continuing towards the final for as long as the results downstream
+        change. A corrected score replaces (or clears) the players it had
+        advanced.
+        Matches that end up with both players known are added to the
+        notification outbox. Returns the ids of the matches updated.
+        """
+        updated = []
+        ready = []
+        changed = [self]
+        while changed:
+            match = changed.pop()
+            subsequent_matches = Match.objects.filter(
+                models.Q(previous_match_1=match.id) | models.Q(previous_match_2=match.id)
+            )
+
+            for subsequent in subsequent_matches:
+                stored = subsequent._stored_outcome(ids=True)
+
+                outcome = match._stored_outcome(ids=True)
+                if subsequent.previous_match_1_id == match.id:
+                    subsequent.player_1_resolved_id = subsequent._from_previous(1, outcome)
+                if subsequent.previous_match_2_id == match.id:
+                    subsequent.player_2_resolved_id = subsequent._from_previous(2, outcome)
+                subsequent.winning_player_id = subsequent._pick_winner(subsequent.player_1_resolved_id,
+                                                                       subsequent.player_2_resolved_id)
+
+                resolved = subsequent._stored_outcome(ids=True)
+                if resolved == stored:
+                    continue
+
+                Match.objects.filter(id=subsequent.id).update(player_1_resolved=resolved[0],
+                                                              player_2_resolved=resolved[1],
+                                                              winning_player=resolved[2])
+                updated.append(subsequent.id)
+                if resolved[2] != stored[2] or _loser(resolved) != _loser(stored):
+                    changed.append(subsequent)
+                if resolved[0] and resolved[1] and resolved[:2] != stored[:2]:
+                    ready.append(subsequent.id)
+
+        if ready:
+            NotificationOutbox.objects.requeue(ready)
+
+        return updated
+
+    def live_state(self):
+        """
+        Return what live viewers need to show the match: its place in the
+        bracket or pool, players, scores and winner
+        """
+        def player(player):
+            return {'id': player.id, 'name': player.name} if player else None
+
+        return {
+            'id': self.id,
+            'bracket': self.round.bracket_id,
+            'section': self.round.section,
+            'pool': self.round.pool_id,
+            'round': self.round.number,
+            'round_index': self.round_index,
+            'player_1': player(self.player_1_resolved),
+            'player_2': player(self.player_2_resolved),
+            'player_1_score': self.player_1_score,
+            'player_2_score': self.player_2_score,
+            'winner': self.winning_player_id,
+        }
+
+    def notification_email(self, template=None):
+        """
+        Return the email notifying the players in the match of their partner
+        and when they need to complete their match. Pass a loaded template to
+        reuse it across matches.
+        """
+        template = template or get_template('matches/notify_players.txt')
         message = template.render({
             'player_1_name': self.player_1.name,
             'player_2_name': self.player_2.name,
-            'round_end_datetime': self.round.end_datetime.astimezone(user_time_zone).strftime('%A, %B %d at %I:%M %p %Z'),
+            'round_end_datetime': format_deadline(self.round.end_datetime),
             'organizer_email': settings.DEFAULT_ORGANIZER_EMAIL
         })
 
-        email = EmailMessage(
+        return EmailMessage(
             to=[self.player_1.email, self.player_2.email],
             from_email=settings.DEFAULT_FROM_EMAIL,
             bcc=[settings.DEFAULT_ORGANIZER_EMAIL],
@@ -251,12 +658,269 @@ class Match(models.Model):
             reply_to=[self.player_1.email, self.player_2.email],
             body=message
         )
-        email.send()
 
-        notification = MatchNotification(match=self, sent=timezone.now())
+    def notify_players(self):
+        """
+        Send an email to the players in a match, notifying of their partner and
+        when they need to complete their match
+        """
+        if any(notification.is_current(self) for notification in self.notifications.filter(player=None)):
+            return 'The players in match {} have already been notified'.format(self.id)
+
+        self.notification_email().send()
+
+        notification = MatchNotification(match=self, player_1=self.player_1, player_2=self.player_2,
+                                         sent=timezone.now())
         notification.save()
 
 
 class MatchNotification(models.Model):
+    """
+    A record that a match was sent to one of its players, when player is
+    set, or to everyone in it, when it isn't. Digests are recorded per
+    player, then for the whole match once the organizer summary listing it
+    has gone out. The pairing that was sent is kept, so players are told
+    again if a corrected result changes it.
+    """
     match = models.ForeignKey(Match, related_name='notifications')
+    player = models.ForeignKey(Player, null=True, blank=True, related_name='+')
+    player_1 = models.ForeignKey(Player, null=True, blank=True, related_name='+')
+    player_2 = models.ForeignKey(Player, null=True, blank=True, related_name='+')
     sent = models.DateTimeField()
+
+    def is_current(self, match):
+        """
+        Return whether the notification was about the match's current
+        pairing, rather than one a corrected result has since replaced
+        """
+        return (self.player_1_id, self.player_2_id) == (match.player_1_resolved_id, match.player_2_resolved_id)
+
+
+class NotificationOutboxManager(models.Manager):
+
+    def enqueue(self, match_ids):
+        """
+        Add an outbox entry for each match that doesn't have one yet, and
+        return how many were added. Safe to run from several processes at
+        once.
+        """
+        match_ids = set(match_ids)
+        match_ids -= set(self.filter(match__in=match_ids).values_list('match_id', flat=True))
+        entries = [self.model(match_id=match_id) for match_id in sorted(match_ids)]
+        if not entries:
+            return 0
+
+        try:
+            with transaction.atomic():
+                self.bulk_create(entries)
+        except IntegrityError:
+            # Another process enqueued some of the same matches first
+            added = 0
+            for entry in entries:
+                try:
+                    with transaction.atomic():
+                        entry.save()
+                    added += 1
+                except IntegrityError:
+                    pass
+            return added
+
+        return len(entries)
+
+    def requeue(self, match_ids):
+        """
+        Notify the players of matches whose pairing just changed: add entries
+        for the matches without one, and put the rest back to pending with
+        their attempts reset, whether they were sent, skipped or given up on.
+        Claimed entries are released too, so the worker sending the old
+        pairing can't mark the new one sent.
+        """
+        match_ids = set(match_ids)
+        if not match_ids:
+            return 0
+
+        self.filter(match__in=match_ids).update(
+            status=NotificationOutbox.PENDING, next_attempt=timezone.now(), claim_token='', claimed_at=None,
+            attempts=0, last_error=''
+        )
+
+        return self.enqueue(match_ids)
+
+    def _available(self, now):
+        """
+        Entries that are due to be sent, and ones whose claim has expired
+        because the worker holding them went away
+        """
+        expired = now - datetime.timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+        return (
+            models.Q(status=NotificationOutbox.PENDING, next_attempt__lte=now) |
+            models.Q(status=NotificationOutbox.CLAIMED, claimed_at__lt=expired)
+        )
+
+    def claim(self, limit, token):
+        """
+        Claim up to limit available entries for the worker identified by
+        token, and return them with their matches. Each entry is claimed with
+        a conditional UPDATE, so an entry another worker claimed first is left
+        out rather than sent twice.
+        """
+        now = timezone.now()
+        available = self._available(now)
+
+        ids = list(self.filter(available).order_by('id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+
+        self.filter(available, id__in=ids).update(
+            status=NotificationOutbox.CLAIMED, claim_token=token, claimed_at=now, attempts=models.F('attempts') + 1
+        )
+
+        return list(self.filter(status=NotificationOutbox.CLAIMED, claim_token=token, claimed_at=now).select_related(
+            'match__round', 'match__player_1_resolved', 'match__player_2_resolved'
+        ).order_by('id'))
+
+    def _claimed(self, entries):
+        """
+        The given entries, as long as they're still held by the claim they
+        were handed out with
+        """
+        return self.filter(id__in=[entry.id for entry in entries],
+                           claim_token__in=set(entry.claim_token for entry in entries))
+
+    def mark_sent(self, entries):
+        self._claimed(entries).update(status=NotificationOutbox.SENT, sent=timezone.now(), last_error='')
+
+    def mark_skipped(self, entries):
+        self._claimed(entries).update(status=NotificationOutbox.SKIPPED)
+
+    def mark_failed(self, entry, error):
+        """
+        Put an entry back to be retried later, with a delay that doubles each
+        attempt, or give up on it once it's out of attempts
+        """
+        entry.last_error = str(error) or error.__class__.__name__
+        if entry.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            entry.status = NotificationOutbox.FAILED
+        else:
+            entry.status = NotificationOutbox.PENDING
+            entry.next_attempt = timezone.now() + datetime.timedelta(
+                seconds=settings.NOTIFICATION_OUTBOX_RETRY_DELAY * 2 ** (entry.attempts - 1)
+            )
+        self._claimed([entry]).update(status=entry.status, next_attempt=entry.next_attempt,
+                                      last_error=entry.last_error)
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting to be sent for a match. Workers claim pending
+    entries in bulk, so several can drain the outbox at once, and entries
+    claimed by a worker that died are picked up again once the claim expires.
+    """
+    PENDING = 'pending'
+    CLAIMED = 'claimed'
+    SENT = 'sent'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (CLAIMED, 'Claimed'),
+        (SENT, 'Sent'),
+        (SKIPPED, 'Skipped'),
+        (FAILED, 'Failed'),
+    )
+
+    match = models.OneToOneField(Match, related_name='outbox')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    objects = NotificationOutboxManager()
+
+    class Meta:
+        verbose_name_plural = 'notification outbox'
+        index_together = [('status', 'next_attempt')]
+
+    def __str__(self):
+        return '{} ({})'.format(self.match, self.get_status_display())
+
+
+class TournamentChangeManager(models.Manager):
+
+    @transaction.atomic(savepoint=False)
+    def record(self, tournament_id, data):
+        """
+        Record a change to a tournament, numbered after its last one. The
+        number is taken by updating the tournament, which holds its row lock
+        until the transaction commits, so a tournament's changes become
+        visible in the order they're numbered and viewers resuming after one
+        can't miss another.
+        """
+        Tournament.objects.filter(id=tournament_id).update(change_number=models.F('change_number') + 1)
+        number = Tournament.objects.filter(id=tournament_id).values_list('change_number', flat=True).first()
+        change = self.create(tournament_id=tournament_id, number=number, data=data)
+
+        from matches.live import change_recorded
+        transaction.on_commit(lambda: change_recorded(change))
+
+        return change
+
+    def record_matches(self, match_ids):
+        """
+        Record the current state of some matches in one tournament, and the
+        standings of any pools they're in, as a change for live viewers.
+        Returns the change, or None if the matches aren't in a tournament.
+        """
+        matches = list(Match.objects.filter(id__in=match_ids).select_related(
+            'round__bracket', 'round__pool', 'player_1_resolved', 'player_2_resolved'
+        ).order_by('id'))
+
+        tournament_ids = set()
+        pool_ids = set()
+        for match in matches:
+            if match.round is None:
+                continue
+            if match.round.bracket_id is not None:
+                tournament_ids.add(match.round.bracket.tournament_id)
+            else:
+                tournament_ids.add(match.round.pool.tournament_id)
+                pool_ids.add(match.round.pool_id)
+
+        if len(tournament_ids) != 1:
+            return
+
+        standings = {}
+        for standing in PoolStanding.objects.filter(pool__in=pool_ids).select_related('player').order_by('rank'):
+            row = standing.to_dict()
+            row.update(player=standing.player_id, rank=standing.rank)
+            standings.setdefault(str(standing.pool_id), []).append(row)
+
+        data = json.dumps({
+            'matches': [match.live_state() for match in matches if match.round is not None],
+            'standings': standings,
+        }, separators=(',', ':'))
+
+        return self.record(tournament_ids.pop(), data)
+
+
+class TournamentChange(models.Model):
+    """
+    A change to match results, kept in order for clients following a
+    tournament live. The number is the cursor clients resume from.
+    """
+    tournament = models.ForeignKey(Tournament, related_name='changes')
+    number = models.PositiveIntegerField(help_text="The change's place in the tournament's sequence")
+    created = models.DateTimeField(auto_now_add=True)
+    data = models.TextField(help_text='The changed matches and standings, as JSON')
+
+    objects = TournamentChangeManager()
+
+    class Meta:
+        unique_together = ('tournament', 'number')
+
+    def __str__(self):
+        return '{} change {}'.format(self.tournament, self.number)
@@ -0,0 +1,364 @@
+import smtplib
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pytz
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import get_template
+from django.utils import timezone
+
+
+def is_transient(error):
+    """
+    Return whether a failed send is worth retrying: dropped connections,
+    timeouts and 4xx replies from the server
+    """
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+                              socket.timeout, ConnectionError))
+
+
+class RateLimiter(object):
+    """
+    Space calls to wait() so no more than rate of them return per second,
+    across all threads. A rate of None means no limit.
+    """
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0
+        self.clock = clock
+        self.sleep = sleep
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = self.clock()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+
+        if slot > now:
+            self.sleep(slot - now)
+
+
+class DispatchSummary(object):
+    """
+    What happened to each match handed to a dispatcher
+    """
+
+    def __init__(self):
+        self.sent_matches = []
+        self.skipped_matches = []
+        self.failures = []
+
+    @property
+    def sent(self):
+        return len(self.sent_matches)
+
+    @property
+    def skipped(self):
+        return len(self.skipped_matches)
+
+    @property
+    def failed(self):
+        return len(self.failures)
+
+    def update(self, other):
+        self.sent_matches += other.sent_matches
+        self.skipped_matches += other.skipped_matches
+        self.failures += other.failures
+
+    def __str__(self):
+        return 'Sent {}, skipped {}, failed {}'.format(self.sent, self.skipped, self.failed)
+
+
+class NotificationDispatcher(object):
+    """
+    Send match notification emails from a bounded pool of threads, each with
+    its own mail connection, no faster than rate messages per second.
+    Transient failures are retried with exponential backoff.
+
+    Emails are rendered and MatchNotifications written (batch_size rows per
+    insert) on the calling thread, so the workers never touch the database.
+    """
+
+    def __init__(self, workers=None, rate=None, retries=None, backoff=None, batch_size=None,
+                 connection_factory=get_connection, sleep=time.sleep):
+        self.workers = workers or settings.NOTIFICATION_WORKERS
+        self.retries = settings.NOTIFICATION_RETRIES if retries is None else retries
+        self.backoff = settings.NOTIFICATION_RETRY_BACKOFF if backoff is None else backoff
+        self.batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+        self.connection_factory = connection_factory
+        self.sleep = sleep
+        self.rate_limiter = RateLimiter(settings.NOTIFICATION_RATE_LIMIT if rate is None else rate, sleep=sleep)
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """
+        Return this thread's connection, opening it on first use
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self.connection_factory(fail_silently=False)
+            connection.open()
+            with self._lock:
+                self._connections.append(connection)
+            self._local.connection = connection
+
+        return connection
+
+    def _reset_connection(self):
+        """
+        Drop this thread's connection after an error, so the next attempt
+        starts with a fresh one
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+            self._local.connection = None
+
+    def _send(self, message):
+        for attempt in range(self.retries + 1):
+            self.rate_limiter.wait()
+            try:
+                self._connection().send_messages([message])
+                return
+            except Exception as error:
+                self._reset_connection()
+                if attempt == self.retries or not is_transient(error):
+                    raise
+                self.sleep(self.backoff * 2 ** attempt)
+
+    def _deliver(self, messages):
+        """
+        Send each (item, message) pair from the thread pool, and return the
+        items that were sent and a list of (item, error) for the ones that
+        weren't
+        """
+        sent = []
+        failures = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self._send, message): item for item, message in messages}
+
+                for future in as_completed(futures):
+                    if future.exception() is None:
+                        sent.append(futures[future])
+                    else:
+                        failures.append((futures[future], future.exception()))
+        finally:
+            for connection in self._connections:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+            self._connections = []
+
+        return sent, failures
+
+    def _pending(self, matches, summary):
+        """
+        Return (match, told) pairs for the matches that still need notifying,
+        where told is the set of ids of the players already sent a digest for
+        it. Only notifications about the match's current pairing count. The
+        rest (those already notified, or whose players aren't known yet) are
+        added to the summary as skipped.
+        """
+        from matches.models import MatchNotification
+
+        told = {}
+        for match_id, player_id, player_1_id, player_2_id in MatchNotification.objects.filter(
+            match__in=[match.id for match in matches]
+        ).values_list('match_id', 'player_id', 'player_1_id', 'player_2_id'):
+            told.setdefault((match_id, player_1_id, player_2_id), set()).add(player_id)
+
+        pending = []
+        for match in matches:
+            if match.player_1 is None or match.player_2 is None:
+                summary.skipped_matches.append(match)
+                continue
+
+            match_told = told.get((match.id, match.player_1.id, match.player_2.id), set())
+            if None in match_told:
+                summary.skipped_matches.append(match)
+            else:
+                pending.append((match, match_told))
+
+        return pending
+
+    def _record(self, notifications):
+        """
+        Write a MatchNotification for each (match, player) pair, with a player
+        of None for a match everyone was told about
+        """
+        from matches.models import MatchNotification
+
+        now = timezone.now()
+        MatchNotification.objects.bulk_create([
+            MatchNotification(match=match, player=player, player_1=match.player_1, player_2=match.player_2, sent=now)
+            for match, player in notifications
+        ], batch_size=self.batch_size)
+
+    def dispatch(self, matches):
+        """
+        Notify the players in each match that hasn't been notified already,
+        with an email per match, and return a DispatchSummary
+        """
+        summary = DispatchSummary()
+        template = get_template('matches/notify_players.txt')
+
+        pending = [match for match, told in self._pending(list(matches), summary)]
+        summary.sent_matches, summary.failures = self._deliver(
+            [(match, match.notification_email(template)) for match in pending]
+        )
+        self._record([(match, None) for match in summary.sent_matches])
+
+        return summary
+
+    def dispatch_digests(self, matches):
+        """
+        Notify the players in each match that hasn't been notified already,
+        with one email per player listing all of their matches, and send the
+        organizer a single summary instead of a copy of each. Each player's
+        delivery is recorded, so retrying a match only emails the players who
+        didn't get it. The summary lists the matches both players have now
+        been told about, and a match counts as sent once it has gone out.
+        Returns a DispatchSummary.
+        """
+        summary = DispatchSummary()
+        pending = self._pending(list(matches), summary)
+        if not pending:
+            return summary
+
+        players = {}
+        for match, told in pending:
+            for player, opponent in ((match.player_1, match.player_2), (match.player_2, match.player_1)):
+                if player.id not in told:
+                    players.setdefault(player.id, (player, []))[1].append((match, opponent))
+
+        template = get_template('matches/notify_player_digest.txt')
+        sent, failures = self._deliver([
+            (player_id, digest_email(template, player, player_matches))
+            for player_id, (player, player_matches) in sorted(players.items())
+        ])
+        self._record([(match, players[player_id][0])
+                      for player_id in sent for match, opponent in players[player_id][1]])
+        errors = dict(failures)
+
+        delivered = []
+        for match, told in pending:
+            failed = [errors[player.id] for player in (match.player_1, match.player_2) if player.id in errors]
+            if failed:
+                summary.failures.append((match, failed[0]))
+            else:
+                delivered.append(match)
+
+        if delivered:
+            sent, failures = self._deliver([(None, organizer_summary_email(delivered))])
+            if failures:
+                summary.failures += [(match, failures[0][1]) for match in delivered]
+            else:
+                summary.sent_matches = delivered
+                self._record([(match, None) for match in delivered])
+
+        return summary
+
+
+def format_deadline(end_datetime):
+    """
+    Format a round's end in the users' time zone, or return None for a round
+    without one
+    """
+    if end_datetime is None:
+        return None
+
+    user_time_zone = pytz.timezone(settings.DEFAULT_USER_TIME_ZONE)
+    return end_datetime.astimezone(user_time_zone).strftime('%A, %B %d at %I:%M %p %Z')
+
+
+def digest_email(template, player, player_matches):
+    """
+    Return the email telling a player about all of their current matches,
+    given as (match, opponent) pairs
+    """
+    return EmailMessage(
+        to=[player.email],
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        subject='Your Next Matchups',
+        body=template.render({
+            'player_name': player.name,
+            'matches': [
+                {'opponent_name': opponent.name, 'opponent_email': opponent.email,
+                 'round_end_datetime': format_deadline(match.round.end_datetime)}
+                for match, opponent in player_matches
+            ],
+            'organizer_email': settings.DEFAULT_ORGANIZER_EMAIL
+        })
+    )
+
+
+def organizer_summary_email(matches):
+    """
+    Return the email telling the organizer which matchups were sent
+    """
+    template = get_template('matches/notify_organizer_summary.txt')
+
+    return EmailMessage(
+        to=[settings.DEFAULT_ORGANIZER_EMAIL],
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        subject='Matchup Notifications Sent',
+        body=template.render({
+            'matches': [
+                {'player_1_name': match.player_1.name, 'player_2_name': match.player_2.name,
+                 'round_end_datetime': format_deadline(match.round.end_datetime)}
+                for match in matches
+            ]
+        })
+    )
+
+
+def drain_outbox(dispatcher, batch_size=None, digest=False):
+    """
+    Claim and send outbox entries a batch at a time until there are none left
+    to claim, and return a DispatchSummary for the whole run. Any number of
+    processes can drain the outbox at once. In digest mode everything
+    available is claimed at once, so each player gets a single email.
+    """
+    from matches.models import NotificationOutbox
+
+    batch_size = None if digest else batch_size or settings.NOTIFICATION_BATCH_SIZE
+    dispatch = dispatcher.dispatch_digests if digest else dispatcher.dispatch
+    token = uuid.uuid4().hex
+    total = DispatchSummary()
+
+    while True:
+        entries = NotificationOutbox.objects.claim(batch_size, token)
+        if not entries:
+            break
+
+        summary = dispatch([entry.match for entry in entries])
+
+        entries = {entry.match_id: entry for entry in entries}
+        NotificationOutbox.objects.mark_sent([entries[match.id] for match in summary.sent_matches])
+        NotificationOutbox.objects.mark_skipped([entries[match.id] for match in summary.skipped_matches])
+        for match, error in summary.failures:
+            NotificationOutbox.objects.mark_failed(entries[match.id], error)
+
+        total.update(summary)
+
+    return total
@@ -0,0 +1,69 @@
+class BracketResolver(object):
+    """
+    Work out player_1, player_2 and the winner of every match in a set of
+    brackets in memory, from the init players and scores alone. The stored
+    resolved fields on Match are ignored, so this can be used to check or
+    rebuild them.
+    """
+
+    def __init__(self, matches):
+        self.matches = {match.id: match for match in matches}
+        self._players = {}
+
+    @classmethod
+    def for_bracket(cls, bracket):
+        """
+        Load every match in a bracket, with its round and players, in a single
+        query
+        """
+        from matches.models import Match
+
+        return cls(Match.objects.filter(round__bracket=bracket).select_related(
+            'round', 'player_1_init', 'player_2_init'
+        ))
+
+    def _resolve(self, match):
+        """
+        Return a (player_1, player_2) tuple for a match
+        """
+        if match.id not in self._players:
+            if match.player_1_init_id or match.bye:
+                players = (match.player_1_init, match.player_2_init)
+            else:
+                players = (match._from_previous(1, self.outcome(self.matches[match.previous_match_1_id])),
+                           match._from_previous(2, self.outcome(self.matches[match.previous_match_2_id])))
+            self._players[match.id] = players
+
+        return self._players[match.id]
+
+    def player_1(self, match):
+        return self._resolve(match)[0]
+
+    def player_2(self, match):
+        return self._resolve(match)[1]
+
+    def winner(self, match):
+        return match._pick_winner(*self._resolve(match))
+
+    def outcome(self, match):
+        """
+        Return a (player_1, player_2, winner) tuple for a match
+        """
+        return self._resolve(match) + (self.winner(match),)
+
+    def stale_matches(self):
+        """
+        Return the matches whose stored resolved fields don't agree with the
+        scores, with those fields updated in memory
+        """
+        stale = []
+        for match in self.matches.values():
+            player_1, player_2 = self._resolve(match)
+            winner = self.winner(match)
+            resolved = (getattr(player_1, 'id', None), getattr(player_2, 'id', None), getattr(winner, 'id', None))
+
+            if resolved != (match.player_1_resolved_id, match.player_2_resolved_id, match.winning_player_id):
+                match.player_1_resolved, match.player_2_resolved, match.winning_player = player_1, player_2, winner
+                stale.append(match)
+
+        return stale
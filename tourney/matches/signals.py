@@ -0,0 +1,108 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from matches.models import Tournament, Bracket, Round, Match
+from players.models import Player, Pool, PoolStanding
+
+
+def touch_round_tournament(bracket_id, pool_id):
+    """
+    Touch the tournament a round belongs to through its bracket or pool
+    """
+    if bracket_id is not None:
+        Tournament.objects.filter(bracket__id=bracket_id).touch()
+    elif pool_id is not None:
+        Tournament.objects.filter(pool__id=pool_id).touch()
+
+
+@receiver(post_save, sender=Bracket)
+@receiver(post_delete, sender=Bracket)
+def bracket_changed(sender, instance, **kwargs):
+    # A new bracket has no JSON cached under its version yet
+    if kwargs['signal'] is post_save and not kwargs['created']:
+        Bracket.objects.bump_versions(instance.id)
+    Tournament.objects.filter(id=instance.tournament_id).touch()
+
+
+@receiver(post_save, sender=Pool)
+@receiver(post_delete, sender=Pool)
+def pool_changed(sender, instance, **kwargs):
+    Tournament.objects.filter(id=instance.tournament_id).touch()
+
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+def round_changed(sender, instance, **kwargs):
+    if kwargs['signal'] is post_save:
+        # A new round has no matches to show yet
+        if not kwargs['created']:
+            Bracket.objects.bump_versions(instance.bracket_id)
+    elif instance.bracket_id is not None:
+        Bracket.objects.record_change(instance.bracket_id, structure=True)
+    elif instance.pool_id is not None:
+        # The round's matches may have gone before it did, so work the
+        # standings out again from the matches that are left
+        PoolStanding.objects.rebuild(instance.pool_id)
+    touch_round_tournament(instance.bracket_id, instance.pool_id)
+
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+def match_changed(sender, instance, **kwargs):
+    """
+    Touch the tournament the match is in. Match.save moves its bracket on to
+    a new version, and deleting it is recorded by match_deleted.
+    """
+    if instance.round_id is None:
+        return
+
+    round = Round.objects.filter(id=instance.round_id).values('bracket_id', 'pool_id').first()
+    if round is None:
+        return
+
+    touch_round_tournament(round['bracket_id'], round['pool_id'])
+
+
+@receiver(post_delete, sender=Match)
+def match_deleted(sender, instance, **kwargs):
+    """
+    Take a deleted match's result back out of the pool standings, and have
+    clients of its bracket start again from a snapshot
+    """
+    if instance._saved_result is not None:
+        PoolStanding.objects.record_result_change(instance._saved_result, None)
+
+    if instance.round_id is not None:
+        bracket_id = Round.objects.filter(id=instance.round_id).values_list('bracket_id', flat=True).first()
+        if bracket_id is not None:
+            Bracket.objects.record_change(bracket_id, structure=True)
+
+
+@receiver(post_save, sender=Player)
+def player_changed(sender, instance, created, **kwargs):
+    """
+    Move on the brackets the player has a first round match in, and touch
+    the tournaments they play in, so name changes are picked up (including
+    by bracket deltas)
+    """
+    if created:
+        return
+
+    bracket_ids = Round.objects.filter(
+        Q(match__player_1_resolved=instance) | Q(match__player_2_resolved=instance),
+        bracket__isnull=False
+    ).values_list('bracket_id', flat=True).distinct()
+
+    # Only first round matches carry player names, in deltas and snapshots
+    first_round_matches = {}
+    for bracket_id, match_id in Match.objects.filter(
+        Q(player_1_init=instance) | Q(player_2_init=instance), round__bracket__isnull=False
+    ).values_list('round__bracket_id', 'id'):
+        first_round_matches.setdefault(bracket_id, []).append(match_id)
+    for bracket_id, match_ids in first_round_matches.items():
+        Bracket.objects.record_change(bracket_id, match_ids)
+
+    Tournament.objects.filter(
+        Q(players=instance) | Q(pool__players=instance) | Q(bracket__id__in=list(bracket_ids))
+    ).touch()
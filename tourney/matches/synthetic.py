@@ -0,0 +1,34 @@
+import uuid
+
+from matches.models import Tournament, Bracket
+from players.models import Player, Pool
+
+
+def create_tournament(player_count, pool_size=8):
+    """
+    Create a tournament with player_count made-up players, a bracket and
+    pools of pool_size, using a handful of bulk inserts, for benchmarks and
+    query budget tests. No matches are generated. Returns (tournament,
+    bracket, pools, players).
+    """
+    key = uuid.uuid4().hex[:8]
+    tournament = Tournament.objects.create(name='Synthetic {} {}'.format(player_count, key))
+
+    Player.objects.bulk_create([
+        Player(name='Player {} {}'.format(key, i), email='player-{}-{}@example.com'.format(key, i))
+        for i in range(player_count)
+    ])
+    players = list(Player.objects.filter(name__startswith='Player {} '.format(key)).order_by('id'))
+    tournament.players.add(*players)
+
+    bracket = Bracket.objects.create(tournament=tournament)
+
+    Pool.objects.bulk_create([Pool(tournament=tournament) for i in range(0, player_count, pool_size)])
+    pools = list(Pool.objects.filter(tournament=tournament).select_related('tournament').order_by('id'))
+    Pool.players.through.objects.bulk_create([
+        Pool.players.through(pool=pool, player=player)
+        for index, pool in enumerate(pools)
+        for player in players[index * pool_size:(index + 1) * pool_size]
+    ])
+
+    return tournament, bracket, pools, players
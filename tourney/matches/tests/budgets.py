@@ -0,0 +1,56 @@
+import math
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from matches.synthetic import create_tournament
+
+
+def rounds(players):
+    """
+    The number of rounds in a single elimination bracket
+    """
+    return int(math.ceil(math.log(players, 2)))
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Base for tests that run an operation on a tournament of each of the sizes
+    and check it stays within a query budget worked out from the size
+    """
+    sizes = (16, 64, 256)
+    pool_size = 8
+
+    def setUp(self):
+        cache.clear()
+
+    def tournament(self, size, generate=True):
+        """
+        Return a (tournament, bracket, pools, players) tuple for a tournament
+        of size players, with its bracket and pool matches generated
+        """
+        tournament, bracket, pools, players = create_tournament(size, self.pool_size)
+        if generate:
+            bracket._generate_matches(players=players)
+            for pool in pools:
+                pool._generate_matches()
+
+        return tournament, bracket, pools, players
+
+    @contextmanager
+    def assertMaxQueries(self, budget):
+        """
+        Fail if the block runs more than budget queries, listing the ones it
+        ran
+        """
+        with CaptureQueriesContext(connection) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > budget:
+            self.fail('{} queries executed, at most {} expected\n{}'.format(
+                executed, budget, '\n'.join(query['sql'] for query in context.captured_queries)
+            ))
@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from model_mommy import mommy
+
+from matches.models import Bracket, Round, Match
+from players.models import Player
+
+
+class MatchAdminTestCase(TestCase):
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def _final_changelist_queries(self, number_of_players):
+        """
+        Generate and score a bracket, then return the number of queries used
+        to show its final on the changelist
+        """
+        bracket = mommy.make(Bracket)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=number_of_players))
+        Match.objects.filter(round__bracket=bracket).update(player_1_score=1, player_2_score=0)
+        final = Match.objects.filter(round__bracket=bracket).order_by('-round__number').first()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/admin/matches/match/', {'round__number': final.round.number})
+
+        self.assertContains(response, str(final.player_1))
+        return len(context.captured_queries)
+
+    def test_changelist_query_count(self):
+        """
+        Test that the changelist doesn't run more queries for a deeper bracket
+        """
+        self.assertEqual(self._final_changelist_queries(4), self._final_changelist_queries(16))
+
+
+class RoundAdminTestCase(TestCase):
+
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+        self.bracket = mommy.make(Bracket)
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        self.round = Round.objects.get(bracket=self.bracket, number=1)
+        self.matches = list(self.round.match_set.order_by('round_index'))
+        self.url = '/admin/matches/round/{}/scores/'.format(self.round.id)
+
+    def test_scores_view(self):
+        """
+        Test that the scores page lists the round's matches and saves their
+        scores together
+        """
+        response = self.client.get(self.url)
+        self.assertContains(response, self.matches[0].player_1.name)
+
+        response = self.client.post(self.url, {
+            'match_{}_1'.format(self.matches[0].id): 2, 'match_{}_2'.format(self.matches[0].id): 1,
+            'match_{}_1'.format(self.matches[1].id): '', 'match_{}_2'.format(self.matches[1].id): '',
+        })
+
+        self.assertRedirects(response, self.url)
+        self.matches[0].refresh_from_db()
+        self.assertEqual((self.matches[0].player_1_score, self.matches[0].player_2_score), (2, 1))
+        self.assertEqual(self.matches[0].winning_player_id, self.matches[0].player_1_init_id)
+
+    def test_scores_view_missing_score(self):
+        """
+        Test that a match with only one score is sent back with an error, and
+        nothing is saved
+        """
+        response = self.client.post(self.url, {
+            'match_{}_1'.format(self.matches[0].id): 2, 'match_{}_2'.format(self.matches[0].id): 1,
+            'match_{}_1'.format(self.matches[1].id): 2,
+        })
+
+        self.assertContains(response, 'Enter both scores')
+        self.assertFalse(Match.objects.filter(player_1_score__isnull=False).exists())
@@ -0,0 +1,114 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from model_mommy import mommy
+
+from matches.caching import get_bracket_json, get_bracket_cache_stats, reset_bracket_cache_stats
+from matches.models import Bracket, Round, Match
+from players.models import Player
+
+
+class BracketCacheTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.bracket = mommy.make(Bracket)
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+    def version(self, bracket):
+        return Bracket.objects.values_list('version', flat=True).get(id=bracket.id)
+
+    def test_bump_versions(self):
+        """
+        Test that bumping a bracket moves it on to a new version in the database
+        """
+        version = self.version(self.bracket)
+
+        Bracket.objects.bump_versions(self.bracket.id)
+
+        self.assertGreater(self.version(self.bracket), version)
+
+    def test_get_bracket_json(self):
+        """
+        Test that we only build the JSON once per version, and count hits and
+        misses
+        """
+        reset_bracket_cache_stats()
+        calls = []
+
+        def build():
+            calls.append(1)
+            return 'data'
+
+        self.assertEqual(get_bracket_json(self.bracket.id, 1, build), 'data')
+        self.assertEqual(get_bracket_json(self.bracket.id, 1, build), 'data')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(get_bracket_cache_stats(), {'hits': 1, 'misses': 1})
+
+        get_bracket_json(self.bracket.id, 2, build)
+        self.assertEqual(len(calls), 2)
+
+    def test_to_json_is_cached(self):
+        """
+        Test that Bracket.to_json doesn't query the database on a hit
+        """
+        data = self.bracket.to_json()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.bracket.to_json(), data)
+
+    def test_match_save_invalidates(self):
+        """
+        Test that saving a score is reflected in the next to_json
+        """
+        self.bracket.to_json()
+        match = Match.objects.filter(round__bracket=self.bracket, round__number=1).first()
+        match.player_1_score = 3
+        match.player_2_score = 1
+        match.save()
+
+        self.bracket.refresh_from_db()
+        data = json.loads(self.bracket.to_json())
+
+        self.assertIn([3, 1], data['results'][0][0])
+
+    def test_round_save_invalidates(self):
+        """
+        Test that saving a round bumps its bracket
+        """
+        version = self.version(self.bracket)
+
+        Round.objects.filter(bracket=self.bracket).first().save()
+
+        self.assertGreater(self.version(self.bracket), version)
+
+    def test_player_save_invalidates(self):
+        """
+        Test that renaming a player is reflected in the next to_json
+        """
+        self.bracket.to_json()
+        player = Match.objects.filter(round__bracket=self.bracket, round__number=1).first().player_1
+        player.name = 'Renamed'
+        player.save()
+
+        self.bracket.refresh_from_db()
+        data = json.loads(self.bracket.to_json())
+
+        self.assertIn('Renamed', [name for team in data['teams'] for name in team])
+
+    def test_other_bracket_is_not_invalidated(self):
+        """
+        Test that saving a match in one bracket leaves another bracket cached
+        """
+        other_bracket = mommy.make(Bracket)
+        version = self.version(other_bracket)
+
+        match = Match.objects.filter(round__bracket=self.bracket, round__number=1).first()
+        match.player_1_score = 3
+        match.player_2_score = 1
+        match.save()
+
+        self.assertEqual(self.version(other_bracket), version)
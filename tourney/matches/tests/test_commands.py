@@ -1,22 +1,23 @@
-from unittest import mock
 import datetime
+import json
+from io import StringIO
 
+from django.core import mail
 from django.test import TestCase
 from django.utils import timezone
 from django.core.management import call_command
 
 from model_mommy import mommy
 
-from matches.models import Bracket, Round, Match, MatchNotification
+from matches.models import Tournament, Bracket, Round, Match, MatchNotification, NotificationOutbox
 from players.models import Player
 
 
 class SendCurrentMatchupsTestCase(TestCase):
 
-    @mock.patch('matches.models.Match.notify_players')
-    def test_sendcurrentmatchups(self, mock_notify_players):
+    def test_sendcurrentmatchups(self):
         """
-        Test that we call notify_players for any current matchups
+        Test that we notify the players in any current matchups
         """
         bracket = mommy.make(Bracket)
         round_1 = mommy.make(Round, bracket=bracket,
@@ -41,6 +42,126 @@ class SendCurrentMatchupsTestCase(TestCase):
                              player_2_init=mommy.make(Player),
                              round=round_3)
 
-        call_command('sendcurrentmatchups')
+        call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
 
-        self.assertEqual(mock_notify_players.call_count, 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(set(MatchNotification.objects.values_list('match', flat=True)), {match_2.id, match_3.id})
+
+    def current_matches(self, quantity):
+        round = mommy.make(Round, bracket=mommy.make(Bracket),
+                           start_datetime=timezone.now()-datetime.timedelta(days=1),
+                           end_datetime=timezone.now()+datetime.timedelta(days=6))
+        return [mommy.make(Match, player_1_init=mommy.make(Player), player_2_init=mommy.make(Player), round=round)
+                for i in range(quantity)]
+
+    def test_already_notified(self):
+        """
+        Test that players who've already been notified aren't sent another
+        email
+        """
+        match_1, match_2 = self.current_matches(2)
+        mommy.make(MatchNotification, match=match_1)
+
+        call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
+        call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [match_2.player_1.email, match_2.player_2.email])
+
+    def test_batches(self):
+        """
+        Test that notifications are claimed from the outbox a batch at a time
+        and marked as sent
+        """
+        self.current_matches(5)
+
+        call_command('sendcurrentmatchups', batch_size=2, rate=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(MatchNotification.objects.count(), 5)
+        self.assertEqual(set(NotificationOutbox.objects.values_list('status', 'attempts')),
+                         {(NotificationOutbox.SENT, 1)})
+
+    def test_resumes(self):
+        """
+        Test that entries left claimed by a run that died are sent once their
+        claim expires, and ones claimed by a live run are left alone
+        """
+        match_1, match_2 = self.current_matches(2)
+        NotificationOutbox.objects.enqueue([match_1.id, match_2.id])
+        NotificationOutbox.objects.filter(match=match_1).update(
+            status=NotificationOutbox.CLAIMED, claimed_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        NotificationOutbox.objects.filter(match=match_2).update(
+            status=NotificationOutbox.CLAIMED, claimed_at=timezone.now()
+        )
+
+        call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(NotificationOutbox.objects.get(match=match_1).status, NotificationOutbox.SENT)
+        self.assertEqual(NotificationOutbox.objects.get(match=match_2).status, NotificationOutbox.CLAIMED)
+
+    def test_digest(self):
+        """
+        Test that digest mode sends one email per player and an organizer
+        summary
+        """
+        match_1, match_2 = self.current_matches(2)
+
+        call_command('sendcurrentmatchups', digest=True, rate=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(set(NotificationOutbox.objects.values_list('status', flat=True)), {NotificationOutbox.SENT})
+
+    def test_outbox_only(self):
+        """
+        Test that --outbox-only sends what's been enqueued without picking up
+        other current matches
+        """
+        match_1, match_2 = self.current_matches(2)
+        NotificationOutbox.objects.enqueue([match_1.id])
+
+        call_command('sendcurrentmatchups', outbox_only=True, rate=0, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(NotificationOutbox.objects.filter(match=match_2).exists())
+
+
+class BenchmarkTourneyTestCase(TestCase):
+
+    def test_benchmarktourney(self):
+        """
+        Test that we report timings and query counts for each size, and leave
+        no synthetic data behind
+        """
+        stdout = StringIO()
+
+        call_command('benchmarktourney', players=[8], pool_size=4, label='test', stdout=stdout)
+
+        results = json.loads(stdout.getvalue())
+        self.assertEqual(results['label'], 'test')
+        self.assertEqual(results['runs'][0]['players'], 8)
+        self.assertEqual(results['runs'][0]['pools'], 2)
+        self.assertEqual(results['runs'][0]['timings']['bracket_to_json']['queries'], 1)
+        self.assertEqual(results['runs'][0]['timings']['bracket_to_json_cached']['queries'], 0)
+        self.assertFalse(Tournament.objects.exists())
+        self.assertFalse(Player.objects.exists())
+
+
+class ExplainQueriesTestCase(TestCase):
+
+    def test_explainqueries(self):
+        """
+        Test that we report a plan for each hot query, and that lookups by
+        indexed columns use the index
+        """
+        stdout = StringIO()
+
+        call_command('explainqueries', analyze=True, stdout=stdout)
+
+        lines = dict(line.split('  ', 1) for line in stdout.getvalue().splitlines())
+        self.assertEqual(len(lines), 11)
+        self.assertTrue(lines['tournament by slug'].strip().startswith('index'))
+        self.assertTrue(lines['players by email'].strip().startswith('index'))
+        self.assertTrue(lines['pool round by number'].strip().startswith('index'))
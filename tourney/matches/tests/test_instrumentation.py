@@ -0,0 +1,96 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from model_mommy import mommy
+
+from matches.instrumentation import Measurement, instrument
+from matches.models import Tournament
+from players.models import Player
+
+
+class MeasurementTestCase(TestCase):
+
+    def test_measurement(self):
+        """
+        Test that we count queries and repeats of the same query
+        """
+        player = mommy.make(Player)
+
+        measurement = Measurement('test').start()
+        Player.objects.get(id=player.id)
+        Player.objects.get(id=player.id)
+        Tournament.objects.count()
+        measurement.stop()
+
+        self.assertEqual(measurement.queries, 3)
+        self.assertEqual(measurement.duplicate_queries, 1)
+        self.assertGreaterEqual(measurement.seconds, measurement.sql_seconds)
+
+    def test_nested_query_counts(self):
+        """
+        Test that queries made while measuring still count towards
+        assertNumQueries
+        """
+        with self.assertNumQueries(2), self.assertLogs('tourney.performance', 'INFO'):
+            Tournament.objects.count()
+            with instrument('test', sample=False):
+                Tournament.objects.count()
+
+    def test_log(self):
+        """
+        Test that a measurement is logged as JSON, as a warning when queries
+        are repeated
+        """
+        with self.assertLogs('tourney.performance', 'INFO') as logs:
+            with instrument('test', sample=False):
+                Tournament.objects.count()
+                Tournament.objects.count()
+
+        self.assertEqual(logs.records[0].levelname, 'WARNING')
+        self.assertEqual(json.loads(logs.records[0].getMessage())['duplicate_queries'], 1)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1)
+    def test_command(self):
+        """
+        Test that sendcurrentmatchups runs are measured
+        """
+        with self.assertLogs('tourney.performance', 'INFO') as logs:
+            call_command('sendcurrentmatchups', rate=0, stdout=StringIO())
+
+        self.assertEqual(json.loads(logs.records[0].getMessage())['name'], 'sendcurrentmatchups')
+
+
+class PerformanceMiddlewareTestCase(TestCase):
+
+    def setUp(self):
+        self.tournament = mommy.make(Tournament)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=1, PERFORMANCE_HEADER=True)
+    def test_header_and_log(self):
+        """
+        Test that a sampled request gets a Server-Timing header and a log line
+        with its queries and template time
+        """
+        with self.assertLogs('tourney.performance', 'INFO') as logs:
+            response = self.client.get('/{}/'.format(self.tournament.slug))
+
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+
+        measurement = json.loads(logs.records[0].getMessage())
+        self.assertEqual(measurement['name'], 'GET /{}/'.format(self.tournament.slug))
+        self.assertGreater(measurement['queries'], 0)
+        self.assertIsNotNone(measurement['template_seconds'])
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0, PERFORMANCE_HEADER=True)
+    def test_not_sampled(self):
+        """
+        Test that requests that aren't sampled aren't measured
+        """
+        response = self.client.get('/{}/'.format(self.tournament.slug))
+
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,176 @@
+import itertools
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from model_mommy import mommy
+
+from matches.live import changes_since, event_stream, latest_change_number
+from matches.models import Tournament, Bracket, Round, Match, TournamentChange
+from players.models import Player, Pool
+
+
+class TournamentChangeTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tournament = mommy.make(Tournament)
+
+    def test_pool_result(self):
+        """
+        Test that scoring a pool match records the match and the pool's
+        standings, but creating it doesn't
+        """
+        pool = mommy.make(Pool, tournament=self.tournament)
+        player_1, player_2 = mommy.make(Player, _quantity=2)
+        match = mommy.make(Match, player_1_init=player_1, player_2_init=player_2,
+                           round=mommy.make(Round, pool=pool, number=1))
+        self.assertFalse(TournamentChange.objects.exists())
+
+        match.player_1_score = 2
+        match.player_2_score = 1
+        match.save()
+
+        change = TournamentChange.objects.get()
+        data = json.loads(change.data)
+        self.assertEqual(change.tournament, self.tournament)
+        self.assertEqual(data['matches'], [{
+            'id': match.id,
+            'bracket': None,
+            'section': 'winners',
+            'pool': pool.id,
+            'round': 1,
+            'round_index': match.round_index,
+            'player_1': {'id': player_1.id, 'name': player_1.name},
+            'player_2': {'id': player_2.id, 'name': player_2.name},
+            'player_1_score': 2,
+            'player_2_score': 1,
+            'winner': player_1.id,
+        }])
+        self.assertEqual(data['standings'], {str(pool.id): [
+            {'player': player_1.id, 'name': player_1.name, 'wins': 1, 'losses': 0, 'rank': 1},
+            {'player': player_2.id, 'name': player_2.name, 'wins': 0, 'losses': 1, 'rank': 2},
+        ]})
+
+    def test_bracket_result(self):
+        """
+        Test that scoring a bracket match also records the match its winner
+        advanced to
+        """
+        bracket = mommy.make(Bracket, tournament=self.tournament)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        match = Match.objects.get(round__bracket=bracket, round__number=1, round_index=0)
+        final = Match.objects.get(round__bracket=bracket, round__number=2)
+
+        match.player_1_score = 2
+        match.player_2_score = 1
+        match.save()
+
+        data = json.loads(TournamentChange.objects.get().data)
+        self.assertEqual([state['id'] for state in data['matches']], sorted([match.id, final.id]))
+        self.assertEqual(data['standings'], {})
+        final_state = [state for state in data['matches'] if state['id'] == final.id][0]
+        self.assertEqual(final_state['player_1']['id'], match.player_1_init_id)
+
+    def test_unchanged_save(self):
+        """
+        Test that saving a match without changing its result records nothing
+        """
+        bracket = mommy.make(Bracket, tournament=self.tournament)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+        Match.objects.filter(round__bracket=bracket).first().save()
+
+        self.assertFalse(TournamentChange.objects.exists())
+
+
+class LiveTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tournament = mommy.make(Tournament)
+        self.changes = [TournamentChange.objects.record(self.tournament.id, '{"n":%d}' % n) for n in range(3)]
+
+    def test_record(self):
+        """
+        Test that each tournament's changes are numbered in their own
+        sequence
+        """
+        other = TournamentChange.objects.record(mommy.make(Tournament).id, '{}')
+
+        self.assertEqual([change.number for change in self.changes], [1, 2, 3])
+        self.assertEqual(other.number, 1)
+        self.assertEqual(Tournament.objects.get(id=self.tournament.id).change_number, 3)
+
+    def test_save_keeps_change_number(self):
+        """
+        Test that saving a tournament loaded before its latest changes doesn't
+        wind its change number back
+        """
+        tournament = Tournament.objects.get(id=self.tournament.id)
+        TournamentChange.objects.record(tournament.id, '{}')
+
+        tournament.name = 'Renamed'
+        tournament.save()
+
+        self.assertEqual(Tournament.objects.get(id=tournament.id).change_number, 4)
+        self.assertEqual(TournamentChange.objects.record(tournament.id, '{}').number, 5)
+
+    def test_latest_change_number(self):
+        """
+        Test that the latest change number is read from the database once,
+        until it expires from the cache
+        """
+        self.assertEqual(latest_change_number(self.tournament.id), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(latest_change_number(self.tournament.id), 3)
+
+        self.assertEqual(latest_change_number(mommy.make(Tournament).id), 0)
+
+    def test_changes_since(self):
+        """
+        Test that we return the changes after a cursor, sharing the cached
+        backlog
+        """
+        expected = [(change.number, change.data) for change in self.changes[1:]]
+
+        self.assertEqual(changes_since(self.tournament.id, 1), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(changes_since(self.tournament.id, 1), expected)
+            self.assertEqual(changes_since(self.tournament.id, 3), [])
+
+    @override_settings(LIVE_BACKLOG=1)
+    def test_changes_since_behind_backlog(self):
+        """
+        Test that viewers further behind than the backlog still get every
+        change
+        """
+        self.assertEqual(changes_since(self.tournament.id, 0),
+                         [(change.number, change.data) for change in self.changes])
+
+    @override_settings(LIVE_STREAM_TIMEOUT=0, LIVE_RETRY_DELAY=3)
+    def test_event_stream(self):
+        """
+        Test that the stream sets the reconnect delay, then sends each change
+        as an event
+        """
+        events = list(event_stream(self.tournament.id, 1))
+
+        self.assertEqual(events, [
+            'retry: 3000\n\n',
+            'id: 2\nevent: change\ndata: {"n":1}\n\n',
+            'id: 3\nevent: change\ndata: {"n":2}\n\n',
+        ])
+
+    @override_settings(LIVE_HEARTBEAT_INTERVAL=0)
+    def test_heartbeat(self):
+        """
+        Test that idle streams get comments to keep them open
+        """
+        sleeps = []
+        stream = event_stream(self.tournament.id, 3, sleep=sleeps.append)
+
+        self.assertEqual(list(itertools.islice(stream, 3)), ['retry: 3000\n\n', ':\n\n', ':\n\n'])
+        self.assertEqual(sleeps, [2])
@@ -1,15 +1,20 @@
 import json
 import datetime
 
+from django.db import models
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.core import mail
+from django.core.cache import cache
 from django.conf import settings
 
 from model_mommy import mommy
 
-from matches.models import Tournament, Bracket, Round, Match, MatchNotification
+from matches.models import (Tournament, Bracket, Round, Match, MatchNotification, NotificationOutbox,
+                            TournamentChange)
+from matches.notifications import NotificationDispatcher, drain_outbox
+from matches.resolvers import BracketResolver
 from players.models import Player, Pool
 
 
@@ -27,10 +32,24 @@ class TournamentTestCase(TestCase):
         self.assertEqual(tournament.slug, 'my-test-tournament')
         self.assertEqual(tournament.players.count(), 2)
 
+    def test_slug_numbering(self):
+        """
+        Test that tournaments with the same name get numbered slugs
+        """
+        tournaments = [mommy.make(Tournament, name='My Test Tournament') for i in range(3)]
+
+        self.assertEqual([tournament.slug for tournament in tournaments],
+                         ['my-test-tournament', 'my-test-tournament-2', 'my-test-tournament-3'])
+
+        tournaments[0].save()
+        self.assertEqual(tournaments[0].slug, 'my-test-tournament')
+
 
 class BracketTestCase(TestCase):
 
     def setUp(self):
+        cache.clear()
+
         self.bracket = mommy.make(Bracket, name='My Test Bracket')
 
     def test_basics(self):
@@ -53,6 +72,83 @@ class BracketTestCase(TestCase):
         self.assertEqual(Match.objects.filter(round__number=3).count(), 2)
         self.assertEqual(Match.objects.filter(round__number=4).count(), 1)
 
+    def test__generate_matches_links_rounds(self):
+        """
+        Test that each later round match follows two matches from the round
+        before, ending in a single final
+        """
+        players = mommy.make(Player, _quantity=8)
+
+        self.bracket._generate_matches(players=players)
+
+        final = Match.objects.get(round__number=3)
+        semifinals = [final.previous_match_1, final.previous_match_2]
+        self.assertEqual([m.round.number for m in semifinals], [2, 2])
+        self.assertEqual([m.round_index for m in semifinals], [0, 1])
+        self.assertEqual(Match.objects.filter(previous_match_1__isnull=False).count(), 3)
+        self.assertEqual(Round.objects.filter(bracket=self.bracket).count(), 3)
+
+    def test__generate_matches_with_byes(self):
+        """
+        Test that we add byes when the number of players isn't a power of two
+        """
+        players = mommy.make(Player, _quantity=5)
+
+        self.bracket._generate_matches(players=players)
+
+        self.assertEqual(Match.objects.filter(round__number=1).count(), 4)
+        self.assertEqual(Match.objects.filter(round__number=1, bye=True).count(), 3)
+        self.assertEqual(Match.objects.filter(round__number=2).count(), 2)
+        self.assertEqual(Match.objects.filter(round__number=3).count(), 1)
+
+        seeded = set()
+        for match in Match.objects.filter(round__number=1):
+            seeded.add(match.player_1_init_id)
+            if not match.bye:
+                seeded.add(match.player_2_init_id)
+        self.assertEqual(seeded, set(player.id for player in players))
+
+    def test__generate_matches_query_count(self):
+        """
+        Test that the number of queries grows with the number of rounds, not
+        the number of matches
+        """
+        players = mommy.make(Player, _quantity=64)
+
+        # 4 queries for the rounds, 2 per round for the matches, 2 to move the
+        # bracket version on, 1 to touch the tournament and a savepoint
+        with self.assertNumQueries(20):
+            self.bracket._generate_matches(players=players)
+
+        self.assertEqual(Match.objects.filter(round__bracket=self.bracket).count(), 63)
+
+    def test__generate_matches_reuses_rounds(self):
+        """
+        Test that we keep rounds that were already set up for the bracket
+        """
+        round_1 = mommy.make(Round, bracket=self.bracket, number=1)
+
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+        self.assertEqual(Match.objects.filter(round=round_1).count(), 2)
+        self.assertEqual(Round.objects.filter(bracket=self.bracket).count(), 2)
+
+    def test__generate_matches_only_once(self):
+        """
+        Test that we don't generate a second set of matches for a bracket
+        """
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+        with self.assertRaises(ValidationError):
+            self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+    def test__generate_matches_needs_two_players(self):
+        """
+        Test that we can't generate a bracket for a single player
+        """
+        with self.assertRaises(ValidationError):
+            self.bracket._generate_matches(players=[mommy.make(Player)])
+
     def test_to_json(self):
         """
         Test that we can generate the JSON required by jQuery bracket
@@ -86,7 +182,8 @@ class BracketTestCase(TestCase):
                              previous_match_1=match_5, previous_match_2=match_6,
                              player_1_score=2, player_2_score=0)
 
-        data = json.loads(self.bracket.to_json())
+        with self.assertNumQueries(1):
+            data = json.loads(self.bracket.to_json())
         self.assertEqual(data['teams'], [
             ['p1', 'p2'], ['p3', 'p4'], ['p5', 'p6'], ['p7', 'p8']
         ])
@@ -110,6 +207,169 @@ class BracketTestCase(TestCase):
             ]
         )
 
+    def test_delta_json(self):
+        """
+        Test that clients get only the matches changed since their version,
+        and a snapshot when they're from before the matches were generated
+        """
+        players = mommy.make(Player, _quantity=4)
+        self.bracket._generate_matches(players=players)
+        self.bracket.refresh_from_db()
+        self.assertEqual(self.bracket.version, 1)
+
+        snapshot = json.loads(self.bracket.delta_json(0))
+        self.assertEqual(snapshot['version'], 1)
+        self.assertEqual(len(snapshot['teams']), 2)
+        self.assertEqual(json.loads(self.bracket.delta_json(1)),
+                         {'version': 1, 'since': 1, 'teams': [], 'results': []})
+
+        match = Match.objects.get(round__bracket=self.bracket, round__number=1, round_index=1)
+        match.player_1_score = 2
+        match.player_2_score = 1
+        match.save()
+        self.bracket.refresh_from_db()
+
+        self.assertEqual(json.loads(self.bracket.delta_json(1)), {
+            'version': 2,
+            'since': 1,
+            'teams': [[1, match.player_1.name, match.player_2.name]],
+            'results': [[1, 1, [2, 1]], [2, 0, []]],
+        })
+        self.assertEqual(json.loads(self.bracket.delta_json(2))['results'], [])
+
+        with self.settings(BRACKET_DELTA_MAX_MATCHES=1):
+            self.assertIn('version', json.loads(self.bracket.delta_json(1)))
+            self.assertNotIn('since', json.loads(self.bracket.delta_json(1)))
+
+    def test_delta_json_player_rename(self):
+        """
+        Test that a renamed player's team names are sent as a change
+        """
+        players = mommy.make(Player, _quantity=4)
+        self.bracket._generate_matches(players=players)
+
+        players[0].name = 'Renamed'
+        players[0].save()
+        self.bracket.refresh_from_db()
+
+        data = json.loads(self.bracket.delta_json(1))
+        self.assertEqual(len(data['teams']), 1)
+        self.assertIn('Renamed', data['teams'][0])
+
+
+class DoubleEliminationTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+        self.bracket = mommy.make(Bracket, elimination=Bracket.DOUBLE_ELIMINATION)
+        self.players = mommy.make(Player, _quantity=8)
+
+    def play(self, scores=(1, 0), record_scores=False):
+        """
+        Score every match as it becomes playable until none are left, and
+        return how many were played
+        """
+        played = 0
+        while True:
+            ready = list(Match.objects.filter(
+                round__bracket=self.bracket, player_1_score__isnull=True,
+                player_1_resolved__isnull=False, player_2_resolved__isnull=False
+            ).select_related('round'))
+            if not ready:
+                return played
+
+            if record_scores:
+                for round in set(match.round for match in ready):
+                    round.record_scores({match.id: scores for match in ready if match.round == round})
+            else:
+                for match in ready:
+                    match.player_1_score, match.player_2_score = scores
+                    match.save()
+            played += len(ready)
+
+    def test__generate_matches(self):
+        """
+        Test that we build the winners bracket, the losers bracket and the
+        grand final with its rematch
+        """
+        # 5 queries for the rounds, 2 per round for the matches (none to read
+        # back the rematch), 2 to move the bracket version on, 1 to touch the
+        # tournament and a savepoint
+        with self.assertNumQueries(26):
+            self.bracket._generate_matches(players=self.players)
+
+        rounds = [(r.section, r.number, r.match_set.count())
+                  for r in Round.objects.filter(bracket=self.bracket).order_by('section', 'number')]
+        self.assertEqual(rounds, [
+            ('finals', 1, 1), ('finals', 2, 1),
+            ('losers', 1, 2), ('losers', 2, 2), ('losers', 3, 1), ('losers', 4, 1),
+            ('winners', 1, 4), ('winners', 2, 2), ('winners', 3, 1),
+        ])
+
+        data = json.loads(self.bracket.to_json())
+        self.assertEqual(len(data['teams']), 4)
+        self.assertEqual([len(results) for results in data['results']], [3, 4, 2])
+        self.assertEqual(data['results'][2], [[[]], [[]]])
+
+    def test__generate_matches_needs_power_of_two(self):
+        """
+        Test that double elimination brackets can't have byes
+        """
+        with self.assertRaises(ValidationError):
+            self.bracket._generate_matches(players=self.players[:6])
+
+    def test_losers_drop_down(self):
+        """
+        Test that every player but the champion plays until their second loss,
+        and that the rematch isn't needed when the winners bracket champion wins the grand
+        final
+        """
+        self.bracket._generate_matches(players=self.players)
+
+        self.assertEqual(self.play(), 14)
+
+        losses = dict.fromkeys(self.players, 0)
+        for match in Match.objects.filter(round__bracket=self.bracket).exclude(winning_player=None):
+            losses[match.player_2 if match.winner() == match.player_1 else match.player_1] += 1
+        self.assertEqual(sorted(losses.values()), [0, 2, 2, 2, 2, 2, 2, 2])
+
+        rematch = Match.objects.get(round__bracket=self.bracket, reset=True)
+        self.assertIsNone(rematch.player_1_resolved)
+        self.assertEqual(BracketResolver.for_bracket(self.bracket).stale_matches(), [])
+
+    def test_rematch(self):
+        """
+        Test that the rematch is played when the losers bracket champion wins
+        the grand final, and dropped again if the score is corrected
+        """
+        self.bracket._generate_matches(players=self.players)
+        self.play()
+
+        grand_final = Match.objects.get(round__bracket=self.bracket, round__section=Round.FINALS, round__number=1)
+        grand_final.player_1_score, grand_final.player_2_score = 0, 1
+        grand_final.save()
+
+        rematch = Match.objects.get(round__bracket=self.bracket, reset=True)
+        self.assertEqual((rematch.player_1_resolved, rematch.player_2_resolved),
+                         (grand_final.player_1_resolved, grand_final.player_2_resolved))
+        self.assertTrue(NotificationOutbox.objects.filter(match=rematch).exists())
+
+        grand_final.player_1_score, grand_final.player_2_score = 1, 0
+        grand_final.save()
+
+        rematch.refresh_from_db()
+        self.assertIsNone(rematch.player_1_resolved)
+
+    def test_record_scores(self):
+        """
+        Test that scoring whole rounds at once drops the losers down too
+        """
+        self.bracket._generate_matches(players=self.players)
+
+        self.assertEqual(self.play(scores=(0, 1), record_scores=True), 15)
+        self.assertEqual(BracketResolver.for_bracket(self.bracket).stale_matches(), [])
+
 
 class RoundTestCase(TestCase):
 
@@ -157,6 +417,57 @@ class RoundTestCase(TestCase):
         self.round.refresh_from_db()
         self.assertLess(self.round.start_datetime, self.round.end_datetime)
 
+    def test_record_scores_bracket(self):
+        """
+        Test that scoring a bracket round at once advances the winners and
+        queues notifications, as saving each match would
+        """
+        bracket = mommy.make(Bracket)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        first, second = Match.objects.filter(round__bracket=bracket, round__number=1).order_by('round_index')
+        final = Match.objects.get(round__bracket=bracket, round__number=2)
+
+        changed = first.round.record_scores({first.id: (2, 1), second.id: (0, 2)})
+
+        self.assertEqual(len(changed), 2)
+        final.refresh_from_db()
+        self.assertEqual(final.player_1_resolved_id, first.player_1_init_id)
+        self.assertEqual(final.player_2_resolved_id, second.player_2_init_id)
+        self.assertEqual(BracketResolver.for_bracket(bracket).stale_matches(), [])
+        self.assertTrue(NotificationOutbox.objects.filter(match=final).exists())
+        bracket.refresh_from_db()
+        self.assertEqual(bracket.version, 2)
+        self.assertEqual(TournamentChange.objects.count(), 1)
+
+        self.assertEqual(first.round.record_scores({first.id: (2, 1)}), [])
+
+    def test_record_scores_pool(self):
+        """
+        Test that scoring a pool round rebuilds the pool's standings
+        """
+        pool = mommy.make(Pool)
+        players = mommy.make(Player, _quantity=4)
+        pool.players.add(*players)
+        pool._generate_matches()
+        round = Round.objects.get(pool=pool, number=1)
+        matches = list(round.match_set.all())
+
+        round.record_scores({match.id: (3, 1) for match in matches})
+
+        standings = pool.get_player_standings()
+        self.assertEqual([standing['wins'] for standing in standings], [1, 1, 0, 0])
+        self.assertEqual(Match.objects.filter(round=round, winning_player=models.F('player_1_init')).count(), 2)
+
+    def test_record_scores_other_round(self):
+        """
+        Test that matches from other rounds can't be scored
+        """
+        match = mommy.make(Match, player_1_init=mommy.make(Player), player_2_init=mommy.make(Player),
+                           round=mommy.make(Round, bracket=mommy.make(Bracket)))
+
+        with self.assertRaises(ValidationError):
+            self.round.record_scores({match.id: (1, 0)})
+
 
 class MatchTestCase(TestCase):
 
@@ -381,6 +692,130 @@ class MatchTestCase(TestCase):
 
         self.assertEqual(match.player_2, self.player_1)
 
+    def test_bye(self):
+        """
+        Test that player 1 wins a bye without a score
+        """
+        self.match.player_2_init = None
+        self.match.bye = True
+        self.match.save()
+
+        self.assertIsNone(self.match.player_2)
+        self.assertEqual(self.match.winner(), self.player_1)
+        self.assertEqual(str(self.match), '{} (bye)'.format(self.player_1))
+
+    def test_bye_cannot_set_player_2_init(self):
+        """
+        Test that a bye cannot have a second player
+        """
+        self.match.bye = True
+
+        with self.assertRaises(ValidationError):
+            self.match.save()
+
+    def test_resolved_players_are_stored(self):
+        """
+        Test that saving a score stores the winner and advances them into the
+        next match
+        """
+        match = mommy.make(Match, previous_match_1=self.match,
+                           previous_match_2=mommy.make(Match, player_1_init=mommy.make(Player),
+                                                       player_2_init=mommy.make(Player)))
+        self.assertIsNone(match.player_1_resolved)
+
+        self.match.player_1_score = 1
+        self.match.player_2_score = 3
+        self.match.save()
+
+        self.assertEqual(self.match.winning_player, self.player_2)
+        match = Match.objects.select_related('player_1_resolved').get(id=match.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(match.player_1, self.player_2)
+
+    def test_corrected_score_propagates_to_the_final(self):
+        """
+        Test that correcting a score replaces the advanced player in every
+        match they went on to win, and that clearing it undoes the advance
+        """
+        bracket = mommy.make(Bracket)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=8))
+        for number in range(1, 4):
+            for match in Match.objects.filter(round__bracket=bracket, round__number=number):
+                match.player_1_score = 2
+                match.player_2_score = 1
+                match.save()
+
+        first_match = Match.objects.get(round__bracket=bracket, round__number=1, round_index=0)
+        first_match.player_1_score = 0
+        # Includes resetting and checking the outbox for the two matches with a
+        # new pairing, moving the bracket version on, and numbering and
+        # recording the change for live viewers
+        with self.assertNumQueries(23):
+            first_match.save()
+
+        final = Match.objects.get(round__bracket=bracket, round__number=3)
+        self.assertEqual(final.player_1, first_match.player_2_init)
+        self.assertEqual(final.winner(), first_match.player_2_init)
+
+        first_match.player_1_score = None
+        first_match.save()
+
+        final.refresh_from_db()
+        self.assertIsNone(final.player_1)
+        self.assertIsNone(final.winner())
+        self.assertIsNone(Match.objects.get(round__bracket=bracket, round__number=2, round_index=0).player_1)
+
+    def test_resolved_match_is_enqueued(self):
+        """
+        Test that a match is added to the notification outbox once both of
+        its players are known, and not before
+        """
+        bracket = mommy.make(Bracket)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        first, second = Match.objects.filter(round__bracket=bracket, round__number=1).order_by('round_index')
+        final = Match.objects.get(round__bracket=bracket, round__number=2)
+
+        first.player_1_score, first.player_2_score = 2, 1
+        first.save()
+        self.assertFalse(NotificationOutbox.objects.filter(match=final).exists())
+
+        second.player_1_score, second.player_2_score = 2, 1
+        second.save()
+        self.assertEqual(NotificationOutbox.objects.get(match=final).status, NotificationOutbox.PENDING)
+
+    def test_corrected_pairing_is_requeued(self):
+        """
+        Test that players are told again when a corrected result changes a
+        pairing they were already sent
+        """
+        bracket = mommy.make(Bracket)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        first, second = Match.objects.filter(round__bracket=bracket, round__number=1).order_by('round_index')
+        for match in (first, second):
+            match.player_1_score, match.player_2_score = 2, 1
+            match.save()
+        drain_outbox(NotificationDispatcher(rate=0))
+        mail.outbox = []
+
+        first.player_1_score = 0
+        first.save()
+
+        entry = NotificationOutbox.objects.get(match__round__bracket=bracket, match__round__number=2)
+        self.assertEqual((entry.status, entry.attempts), (NotificationOutbox.PENDING, 0))
+
+        summary = drain_outbox(NotificationDispatcher(rate=0))
+
+        self.assertEqual(summary.sent, 1)
+        self.assertEqual(mail.outbox[0].to, [first.player_2_init.email, second.player_1_init.email])
+
+    def test_notify_players_without_deadline(self):
+        """
+        Test that players in a round without an end are still notified
+        """
+        self.match.notify_players()
+
+        self.assertIn('Please complete your\nmatch and send the results', mail.outbox[0].body)
+
     def test_notify_players(self):
         """
         Test that we can send an email to the players informing them of their
@@ -408,7 +843,8 @@ class MatchTestCase(TestCase):
         """
         Test that we do not send an email if we've already sent one
         """
-        notification = mommy.make(MatchNotification, match=self.match)
+        notification = mommy.make(MatchNotification, match=self.match,
+                                  player_1=self.match.player_1, player_2=self.match.player_2)
 
         message = self.match.notify_players()
 
@@ -428,3 +864,72 @@ class MatchNotificationTestCase(TestCase):
 
         self.assertIsInstance(notification.match, Match)
         self.assertIsInstance(notification.sent, type(timezone.now()))
+
+
+class NotificationOutboxTestCase(TestCase):
+
+    def setUp(self):
+        self.matches = [
+            mommy.make(Match, player_1_init=mommy.make(Player), player_2_init=mommy.make(Player))
+            for i in range(3)
+        ]
+        self.match_ids = [match.id for match in self.matches]
+
+    def test_enqueue(self):
+        """
+        Test that each match is only added to the outbox once
+        """
+        self.assertEqual(NotificationOutbox.objects.enqueue(self.match_ids[:2]), 2)
+        self.assertEqual(NotificationOutbox.objects.enqueue(self.match_ids), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+
+    def test_requeue(self):
+        """
+        Test that requeued entries are pending again with fresh attempts, and
+        a worker holding the old claim can't mark them sent
+        """
+        NotificationOutbox.objects.enqueue(self.match_ids[:1])
+        entry = NotificationOutbox.objects.claim(1, 'worker')[0]
+
+        self.assertEqual(NotificationOutbox.objects.requeue(self.match_ids[:2]), 1)
+        NotificationOutbox.objects.mark_sent([entry])
+
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts, entry.claim_token), (NotificationOutbox.PENDING, 0, ''))
+        self.assertEqual(NotificationOutbox.objects.filter(status=NotificationOutbox.PENDING).count(), 2)
+
+    def test_claim(self):
+        """
+        Test that claimed entries aren't claimed again by another worker
+        """
+        NotificationOutbox.objects.enqueue(self.match_ids)
+
+        first = NotificationOutbox.objects.claim(2, 'first')
+        second = NotificationOutbox.objects.claim(2, 'second')
+
+        self.assertEqual([entry.match for entry in first], self.matches[:2])
+        self.assertEqual([entry.match for entry in second], self.matches[2:])
+        self.assertEqual(NotificationOutbox.objects.claim(2, 'third'), [])
+        self.assertEqual(first[0].attempts, 1)
+
+    def test_mark_failed(self):
+        """
+        Test that a failed entry is retried later, until it runs out of
+        attempts
+        """
+        NotificationOutbox.objects.enqueue(self.match_ids[:1])
+        entry = NotificationOutbox.objects.claim(1, 'worker')[0]
+
+        NotificationOutbox.objects.mark_failed(entry, Exception('Connection refused'))
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, NotificationOutbox.PENDING)
+        self.assertEqual(entry.last_error, 'Connection refused')
+        self.assertGreater(entry.next_attempt, timezone.now())
+        self.assertEqual(NotificationOutbox.objects.claim(1, 'worker'), [])
+
+        entry.attempts = settings.NOTIFICATION_MAX_ATTEMPTS
+        NotificationOutbox.objects.mark_failed(entry, Exception('Connection refused'))
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, NotificationOutbox.FAILED)
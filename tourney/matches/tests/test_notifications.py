@@ -0,0 +1,251 @@
+import asyncore
+import datetime
+import smtpd
+import smtplib
+import threading
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase
+from django.utils import timezone
+
+from model_mommy import mommy
+
+from matches.models import Bracket, Round, Match, MatchNotification
+from matches.notifications import NotificationDispatcher, RateLimiter, is_transient
+from players.models import Player
+
+
+class FlakyBackend(EmailBackend):
+    """
+    A locmem backend that fails the first `failures` sends with `error`
+    """
+    failures = 0
+    error = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+    def send_messages(self, messages):
+        if FlakyBackend.failures:
+            FlakyBackend.failures -= 1
+            raise self.error
+        return super().send_messages(messages)
+
+
+class OrganizerDownBackend(EmailBackend):
+    """
+    A locmem backend that can't deliver to the organizer
+    """
+
+    def send_messages(self, messages):
+        if any(settings.DEFAULT_ORGANIZER_EMAIL in message.to for message in messages):
+            raise smtplib.SMTPRecipientsRefused({settings.DEFAULT_ORGANIZER_EMAIL: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+class CollectingSMTPServer(smtpd.SMTPServer):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = []
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        self.messages.append((mailfrom, rcpttos, data))
+
+
+class NotificationDispatcherTestCase(TestCase):
+
+    def setUp(self):
+        round = mommy.make(Round, bracket=mommy.make(Bracket),
+                           end_datetime=timezone.now() + datetime.timedelta(days=1))
+        self.matches = [
+            mommy.make(Match, player_1_init=mommy.make(Player), player_2_init=mommy.make(Player), round=round)
+            for i in range(3)
+        ]
+        self.sleeps = []
+
+    def dispatcher(self, **kwargs):
+        kwargs.setdefault('rate', 0)
+        return NotificationDispatcher(sleep=self.sleeps.append, **kwargs)
+
+    def test_dispatch(self):
+        """
+        Test that every match is sent and recorded, and already notified ones
+        are skipped
+        """
+        mommy.make(MatchNotification, match=self.matches[0],
+                   player_1=self.matches[0].player_1, player_2=self.matches[0].player_2)
+
+        summary = self.dispatcher(workers=2).dispatch(self.matches)
+
+        self.assertEqual((summary.sent, summary.skipped, summary.failed), (2, 1, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(MatchNotification.objects.count(), 3)
+
+    def test_retries(self):
+        """
+        Test that transient failures are retried with exponential backoff
+        """
+        FlakyBackend.failures = 2
+        connection_factory = lambda **kwargs: FlakyBackend(**kwargs)
+
+        summary = self.dispatcher(workers=1, backoff=1, connection_factory=connection_factory).dispatch(
+            self.matches[:1]
+        )
+
+        self.assertEqual(summary.sent, 1)
+        self.assertEqual(self.sleeps, [1, 2])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failures(self):
+        """
+        Test that a send that keeps failing is reported and not recorded
+        """
+        FlakyBackend.failures = 10
+        connection_factory = lambda **kwargs: FlakyBackend(**kwargs)
+
+        summary = self.dispatcher(workers=1, retries=2, connection_factory=connection_factory).dispatch(
+            self.matches[:1]
+        )
+        FlakyBackend.failures = 0
+
+        self.assertEqual((summary.sent, summary.failed), (0, 1))
+        self.assertIsInstance(summary.failures[0][1], smtplib.SMTPServerDisconnected)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertFalse(MatchNotification.objects.exists())
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(smtplib.SMTPDataError(451, 'Try again later')))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertFalse(is_transient(smtplib.SMTPDataError(550, 'No such user')))
+        self.assertFalse(is_transient(ValueError()))
+
+    def test_rate_limiter(self):
+        """
+        Test that calls are spaced out to the rate
+        """
+        clock = iter([0, 0, 0, 1])
+        rate_limiter = RateLimiter(4, clock=lambda: next(clock), sleep=self.sleeps.append)
+
+        for i in range(4):
+            rate_limiter.wait()
+
+        self.assertEqual(self.sleeps, [0.25, 0.5])
+
+    def test_smtp_server(self):
+        """
+        Test sending to a local SMTP server
+        """
+        server = CollectingSMTPServer(('127.0.0.1', 0), None)
+        thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.05})
+        thread.start()
+
+        try:
+            port = server.socket.getsockname()[1]
+            connection_factory = lambda **kwargs: get_connection(
+                'django.core.mail.backends.smtp.EmailBackend', host='127.0.0.1', port=port, **kwargs
+            )
+
+            summary = self.dispatcher(workers=2, connection_factory=connection_factory).dispatch(self.matches)
+        finally:
+            server.close()
+            thread.join()
+
+        self.assertEqual(summary.sent, 3)
+        self.assertEqual(len(server.messages), 3)
+
+
+class DigestTestCase(TestCase):
+
+    def setUp(self):
+        round = mommy.make(Round, bracket=mommy.make(Bracket),
+                           end_datetime=timezone.now() + datetime.timedelta(days=1))
+        self.players = mommy.make(Player, _quantity=3)
+        player_1, player_2, player_3 = self.players
+        self.matches = [
+            mommy.make(Match, player_1_init=player_1, player_2_init=player_2, round=round),
+            mommy.make(Match, player_1_init=player_1, player_2_init=player_3, round=round),
+            mommy.make(Match, player_1_init=player_2, player_2_init=player_3, round=round),
+        ]
+
+    def test_digests(self):
+        """
+        Test that each player gets one email listing all of their opponents,
+        and the organizer gets one summary
+        """
+        summary = NotificationDispatcher(rate=0).dispatch_digests(self.matches)
+
+        self.assertEqual(summary.sent, 3)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertFalse(any(email.bcc for email in mail.outbox))
+
+        digests = {tuple(email.to): email for email in mail.outbox}
+        first = digests[(self.players[0].email,)]
+        self.assertIn(self.players[1].name, first.body)
+        self.assertIn(self.players[2].name, first.body)
+
+        organizer = digests[(settings.DEFAULT_ORGANIZER_EMAIL,)]
+        for player in self.players:
+            self.assertIn(player.name, organizer.body)
+
+        self.assertEqual(MatchNotification.objects.filter(player=None).count(), 3)
+        self.assertEqual(MatchNotification.objects.exclude(player=None).count(), 6)
+
+    def test_failed_digest(self):
+        """
+        Test that only the matches of a player whose digest failed are failed
+        """
+        self.addCleanup(setattr, FlakyBackend, 'error', FlakyBackend.error)
+        FlakyBackend.failures = 1
+        FlakyBackend.error = smtplib.SMTPDataError(550, 'No such user')
+        connection_factory = lambda **kwargs: FlakyBackend(**kwargs)
+
+        summary = NotificationDispatcher(workers=1, rate=0, retries=0, connection_factory=connection_factory
+                                         ).dispatch_digests(self.matches)
+
+        self.assertEqual(summary.sent_matches, self.matches[2:])
+        self.assertEqual([match for match, error in summary.failures], self.matches[:2])
+
+        self.assertEqual(len(mail.outbox), 3)
+        organizer = mail.outbox[-1]
+        self.assertEqual(organizer.to, [settings.DEFAULT_ORGANIZER_EMAIL])
+        self.assertNotIn(self.players[0].name, organizer.body)
+
+    def test_retried_digest(self):
+        """
+        Test that retrying a failed digest only emails the player who didn't
+        get it, and the organizer about the matches now sent
+        """
+        self.addCleanup(setattr, FlakyBackend, 'error', FlakyBackend.error)
+        FlakyBackend.failures = 1
+        FlakyBackend.error = smtplib.SMTPDataError(550, 'No such user')
+        connection_factory = lambda **kwargs: FlakyBackend(**kwargs)
+        NotificationDispatcher(workers=1, rate=0, retries=0, connection_factory=connection_factory
+                               ).dispatch_digests(self.matches)
+        mail.outbox = []
+
+        summary = NotificationDispatcher(rate=0).dispatch_digests(self.matches)
+
+        self.assertEqual(summary.sent_matches, self.matches[:2])
+        self.assertEqual(summary.skipped_matches, self.matches[2:])
+        self.assertEqual(sorted(tuple(email.to) for email in mail.outbox),
+                         sorted([(self.players[0].email,), (settings.DEFAULT_ORGANIZER_EMAIL,)]))
+        self.assertEqual(MatchNotification.objects.filter(player=None).count(), 3)
+
+    def test_failed_organizer_summary(self):
+        """
+        Test that matches are failed if the organizer summary can't be sent,
+        and retrying sends only the summary
+        """
+        summary = NotificationDispatcher(rate=0, retries=0, connection_factory=OrganizerDownBackend
+                                         ).dispatch_digests(self.matches)
+
+        self.assertEqual([match for match, error in summary.failures], self.matches)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(MatchNotification.objects.filter(player=None).exists())
+
+        summary = NotificationDispatcher(rate=0).dispatch_digests(self.matches)
+
+        self.assertEqual(summary.sent_matches, self.matches)
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(mail.outbox[-1].to, [settings.DEFAULT_ORGANIZER_EMAIL])
@@ -0,0 +1,198 @@
+import datetime
+import math
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import RequestFactory
+from django.utils import timezone
+
+from matches.models import Round, Match, NotificationOutbox
+from matches.tests.budgets import QueryBudgetTestCase, rounds
+from matches.views import TournamentDetailView, get_pools
+
+
+class GenerationBudgetTestCase(QueryBudgetTestCase):
+
+    def test_bracket_generation(self):
+        """
+        Test that generating a bracket takes a few queries per round
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size, generate=False)
+
+                with self.assertMaxQueries(12 + 2 * rounds(size)):
+                    bracket._generate_matches(players=players)
+
+    def test_pool_generation(self):
+        """
+        Test that generating a pool takes a fixed number of queries
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size, generate=False)
+
+                with self.assertMaxQueries(16 * len(pools)):
+                    for pool in pools:
+                        pool._generate_matches()
+
+
+class ScoringBudgetTestCase(QueryBudgetTestCase):
+
+    def test_record_scores(self):
+        """
+        Test that scoring a whole round takes the same number of queries
+        however many matches it has
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+                first_round = Round.objects.get(bracket=bracket, number=1)
+                scores = {match_id: (2, 1) for match_id in first_round.match_set.filter(
+                    bye=False
+                ).values_list('id', flat=True)}
+
+                with self.assertMaxQueries(20):
+                    first_round.record_scores(scores)
+
+
+class ReadBudgetTestCase(QueryBudgetTestCase):
+
+    def test_to_json(self):
+        """
+        Test that serializing a bracket takes one query, then none once cached
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+
+                with self.assertMaxQueries(1):
+                    bracket.to_json()
+                with self.assertMaxQueries(0):
+                    bracket.to_json()
+
+    def test_standings(self):
+        """
+        Test that a pool's standings take one query, and every pool's standings
+        two together
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+
+                with self.assertMaxQueries(len(pools)):
+                    for pool in pools:
+                        pool.get_player_standings()
+                with self.assertMaxQueries(2):
+                    get_pools(tournament.id)
+
+    def test_detail_view(self):
+        """
+        Test that the tournament page takes the same few queries at any size,
+        and one once cached
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+                request = RequestFactory().get('/{}/'.format(tournament.slug))
+
+                with self.assertMaxQueries(7):
+                    TournamentDetailView.as_view()(request, slug=tournament.slug).render()
+                with self.assertMaxQueries(1):
+                    self.client.get('/{}/'.format(tournament.slug))
+
+    def test_api(self):
+        """
+        Test that the JSON endpoints take a fixed number of queries
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+
+                with self.assertMaxQueries(3):
+                    self.client.get('/api/{}/bracket.json'.format(tournament.slug))
+                with self.assertMaxQueries(3):
+                    self.client.get('/api/{}/pools.json'.format(tournament.slug))
+
+
+class AdminBudgetTestCase(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+    def test_match_changelist(self):
+        """
+        Test that the match changelist takes the same number of queries at any
+        size
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                self.tournament(size)
+
+                with self.assertMaxQueries(12):
+                    response = self.client.get('/admin/matches/match/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_match_change_form(self):
+        """
+        Test that the match form's round and previous match choices don't
+        take a query each
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+                match = Match.objects.filter(round__bracket=bracket).order_by('-round__number').first()
+
+                with self.assertMaxQueries(12):
+                    response = self.client.get('/admin/matches/match/{}/change/'.format(match.id))
+                self.assertEqual(response.status_code, 200)
+
+    def test_round_changelist(self):
+        """
+        Test that the round changelist takes the same number of queries at any
+        size
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                self.tournament(size)
+
+                with self.assertMaxQueries(6):
+                    response = self.client.get('/admin/matches/round/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_outbox_changelist(self):
+        """
+        Test that the notification outbox changelist takes the same number of
+        queries at any size
+        """
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+                NotificationOutbox.objects.enqueue(pools[0].round_set.values_list('match', flat=True))
+
+                with self.assertMaxQueries(8):
+                    response = self.client.get('/admin/matches/notificationoutbox/')
+                self.assertEqual(response.status_code, 200)
+
+
+class NotificationBudgetTestCase(QueryBudgetTestCase):
+
+    def test_sendcurrentmatchups(self):
+        """
+        Test that sending takes a fixed number of queries per batch
+        """
+        now = timezone.now()
+        for size in self.sizes:
+            with self.subTest(players=size):
+                tournament, bracket, pools, players = self.tournament(size)
+                Round.objects.filter(number=1, pool__in=pools).update(
+                    start_datetime=now - datetime.timedelta(days=1), end_datetime=now + datetime.timedelta(days=1)
+                )
+                batches = math.ceil(len(pools) * self.pool_size / 2 / 10)
+
+                # Inserts can be split into more than one query on SQLite
+                with self.assertMaxQueries(8 + 6 * batches):
+                    call_command('sendcurrentmatchups', batch_size=10, rate=0, stdout=StringIO())
@@ -0,0 +1,70 @@
+from django.test import TestCase
+
+from model_mommy import mommy
+
+from matches.models import Bracket, Match
+from matches.resolvers import BracketResolver
+from players.models import Player
+
+
+class BracketResolverTestCase(TestCase):
+
+    def setUp(self):
+        self.bracket = mommy.make(Bracket)
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=8))
+
+        # player 1 wins every match
+        for number in range(1, 4):
+            for match in Match.objects.filter(round__bracket=self.bracket, round__number=number):
+                match.player_1_score = 2
+                match.player_2_score = 1
+                match.save()
+
+        self.final = Match.objects.get(round__bracket=self.bracket, round__number=3)
+        self.champion = Match.objects.get(round__bracket=self.bracket, round__number=1,
+                                          round_index=0).player_1_init
+
+    def test_for_bracket(self):
+        """
+        Test that we load the whole bracket in a single query and resolve the
+        final without any more
+        """
+        with self.assertNumQueries(1):
+            resolver = BracketResolver.for_bracket(self.bracket)
+            final = resolver.matches[self.final.id]
+
+            self.assertEqual(resolver.player_1(final), self.champion)
+            self.assertEqual(resolver.winner(final), self.champion)
+            self.assertEqual(len(resolver.matches), 7)
+
+    def test_unresolved_match(self):
+        """
+        Test that we return None for players of matches that haven't been
+        decided
+        """
+        Match.objects.filter(round__bracket=self.bracket, round__number=2).update(
+            player_1_score=None, player_2_score=None
+        )
+
+        resolver = BracketResolver.for_bracket(self.bracket)
+
+        self.assertIsNone(resolver.player_1(resolver.matches[self.final.id]))
+        self.assertIsNone(resolver.player_2(resolver.matches[self.final.id]))
+
+    def test_stale_matches(self):
+        """
+        Test that we find the matches whose stored players don't agree with
+        the scores
+        """
+        self.assertEqual(BracketResolver.for_bracket(self.bracket).stale_matches(), [])
+
+        Match.objects.filter(round__bracket=self.bracket, round__number=2).update(
+            player_1_score=0, player_2_score=3
+        )
+        resolver = BracketResolver.for_bracket(self.bracket)
+        stale = resolver.stale_matches()
+
+        self.assertEqual(len(stale), 3)
+        final = resolver.matches[self.final.id]
+        self.assertIn(final, stale)
+        self.assertEqual(final.player_1_resolved, resolver.player_2(resolver.matches[final.previous_match_1_id]))
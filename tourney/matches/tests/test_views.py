@@ -1,15 +1,21 @@
+import gzip
+import json
+
+from django.core.cache import cache
 from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 
 from model_mommy import mommy
 
-from matches.models import Tournament
-from players.models import Pool
+from matches.models import Tournament, Bracket, Round, Match, TournamentChange
+from players.models import Player, Pool
 from matches.views import TournamentDetailView
 
 
 class TournamentDetailViewTestCase(TestCase):
 
     def setUp(self, *args, **kwargs):
+        cache.clear()
         self.factory = RequestFactory()
 
         self.tournament = mommy.make(Tournament)
@@ -21,8 +27,268 @@ class TournamentDetailViewTestCase(TestCase):
         """
         request = self.factory.get('/{}/'.format(self.tournament.slug))
 
-        response = TournamentDetailView.as_view()(request, slug=self.tournament.slug)
+        # Includes finding the latest live change, for the page to follow on from
+        with self.assertNumQueries(6):
+            response = TournamentDetailView.as_view()(request, slug=self.tournament.slug)
+            response.render()
 
         self.assertEqual(response.context_data['object'], self.tournament)
-        with self.assertNumQueries(7):
-            response.render()
+
+    def test_bracket_and_standings(self):
+        """
+        Test that we show the bracket and each pool's standings
+        """
+        bracket = mommy.make(Bracket, tournament=self.tournament)
+        bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+        player_1, player_2 = mommy.make(Player, _quantity=2)
+        mommy.make(Match, player_1_init=player_1, player_2_init=player_2,
+                   player_1_score=2, player_2_score=1, round=mommy.make(Round, pool=self.pools[0]))
+
+        response = self.client.get('/{}/'.format(self.tournament.slug))
+
+        self.assertEqual(response.context['bracket_json'], bracket.to_json())
+        self.assertEqual(response.context['pools'][0].player_standings[0],
+                         {'name': player_1.name, 'wins': 1, 'losses': 0})
+        self.assertContains(response, 'var bracketData', count=1)
+
+    def test_not_modified(self):
+        """
+        Test that a client with the current ETag gets a 304 without a render
+        """
+        response = self.client.get('/{}/'.format(self.tournament.slug))
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/{}/'.format(self.tournament.slug), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_modified(self):
+        """
+        Test that a client can revalidate with If-Modified-Since
+        """
+        response = self.client.get('/{}/'.format(self.tournament.slug))
+
+        response = self.client.get('/{}/'.format(self.tournament.slug),
+                                   HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_cached_page(self):
+        """
+        Test that we serve the rendered page from the cache until the
+        tournament changes
+        """
+        first = self.client.get('/{}/'.format(self.tournament.slug))
+
+        with self.assertNumQueries(1):
+            second = self.client.get('/{}/'.format(self.tournament.slug))
+        self.assertEqual(first.content, second.content)
+
+        player_1, player_2 = mommy.make(Player, name='New Player', _quantity=2)
+        mommy.make(Match, player_1_init=player_1, player_2_init=player_2,
+                   round=mommy.make(Round, pool=self.pools[0]))
+
+        third = self.client.get('/{}/'.format(self.tournament.slug))
+        self.assertNotEqual(third['ETag'], first['ETag'])
+        self.assertContains(third, 'New Player')
+
+    def test_missing_tournament(self):
+        """
+        Test that an unknown slug is still a 404
+        """
+        response = self.client.get('/no-such-tournament/')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class APITestCase(TestCase):
+
+    def setUp(self, *args, **kwargs):
+        cache.clear()
+
+        self.tournament = mommy.make(Tournament)
+        self.bracket = mommy.make(Bracket, tournament=self.tournament)
+        self.bracket._generate_matches(players=mommy.make(Player, _quantity=4))
+
+        self.pool = mommy.make(Pool, tournament=self.tournament)
+        self.player_1, self.player_2 = mommy.make(Player, _quantity=2)
+        mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                   player_1_score=2, player_2_score=1, round=mommy.make(Round, pool=self.pool))
+
+    def test_bracket(self):
+        """
+        Test that the bracket endpoint returns the bracket's JSON
+        """
+        response = self.client.get('/api/{}/bracket.json'.format(self.tournament.slug))
+
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.content.decode('utf-8'), self.bracket.to_json())
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_pools(self):
+        """
+        Test that the pools endpoint returns each pool's standings
+        """
+        response = self.client.get('/api/{}/pools.json'.format(self.tournament.slug))
+
+        self.assertEqual(json.loads(response.content.decode('utf-8')), [{
+            'id': self.pool.id,
+            'name': str(self.pool),
+            'standings': [
+                {'name': self.player_1.name, 'wins': 1, 'losses': 0},
+                {'name': self.player_2.name, 'wins': 0, 'losses': 1},
+            ],
+        }])
+
+    def test_bracket_changes(self):
+        """
+        Test that the bracket changes endpoint returns a snapshot for new
+        clients and the changed matches for ones that have a version
+        """
+        response = self.client.get('/api/{}/bracket/changes.json'.format(self.tournament.slug))
+        snapshot = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(snapshot['teams'], json.loads(self.bracket.to_json())['teams'])
+
+        match = Match.objects.filter(round__bracket=self.bracket, round__number=1).first()
+        match.player_1_score = 2
+        match.player_2_score = 1
+        match.save()
+
+        response = self.client.get('/api/{}/bracket/changes.json'.format(self.tournament.slug),
+                                   {'since': snapshot['version']})
+        delta = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(delta['version'], snapshot['version'] + 1)
+        self.assertEqual(delta['results'][0], [1, match.round_index, [2, 1]])
+
+    def test_bracket_changes_bad_version(self):
+        """
+        Test that versions that aren't numbers, or that changes can't be sent
+        since, get the whole bracket from one cache entry
+        """
+        url = '/api/{}/bracket/changes.json'.format(self.tournament.slug)
+        snapshot = self.client.get(url, {'since': '0'})
+
+        for since in ('not a version', 'another\x01version', '-5', '9' * 400):
+            with self.subTest(since=since[:10]), self.assertNumQueries(1):
+                response = self.client.get(url, {'since': since})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, snapshot.content)
+
+    def test_gzip(self):
+        """
+        Test that clients which accept gzip get a compressed response with
+        its own ETag
+        """
+        plain = self.client.get('/api/{}/pools.json'.format(self.tournament.slug))
+        gzipped = self.client.get('/api/{}/pools.json'.format(self.tournament.slug),
+                                  HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(gzipped['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gzipped.content), plain.content)
+        self.assertNotEqual(gzipped['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', gzipped['Vary'])
+
+        response = self.client.get('/api/{}/pools.json'.format(self.tournament.slug),
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate', HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_modified(self):
+        """
+        Test that an unchanged tournament gets a 304, and a changed one doesn't
+        """
+        response = self.client.get('/api/{}/bracket.json'.format(self.tournament.slug))
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/{}/bracket.json'.format(self.tournament.slug),
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        match = Match.objects.filter(round__bracket=self.bracket, round__number=1).first()
+        match.player_1_score = 2
+        match.save()
+
+        response = self.client.get('/api/{}/bracket.json'.format(self.tournament.slug),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode('utf-8'), self.bracket.to_json())
+
+    def test_cached_response(self):
+        """
+        Test that a repeat request is served from the cache
+        """
+        first = self.client.get('/api/{}/pools.json'.format(self.tournament.slug))
+
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/{}/pools.json'.format(self.tournament.slug))
+        self.assertEqual(first.content, second.content)
+
+    def test_no_bracket(self):
+        """
+        Test that a tournament without a bracket returns null
+        """
+        tournament = mommy.make(Tournament)
+
+        response = self.client.get('/api/{}/bracket.json'.format(tournament.slug))
+
+        self.assertEqual(response.content, b'null')
+
+    def test_missing_tournament(self):
+        """
+        Test that an unknown slug is a 404
+        """
+        response = self.client.get('/api/no-such-tournament/pools.json')
+
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(LIVE_STREAM_TIMEOUT=0)
+class TournamentEventsTestCase(TestCase):
+
+    def setUp(self, *args, **kwargs):
+        cache.clear()
+
+        self.tournament = mommy.make(Tournament)
+        self.changes = [TournamentChange.objects.record(self.tournament.id, '{}') for n in range(2)]
+
+    def get_events(self, **kwargs):
+        response = self.client.get('/api/{}/events'.format(self.tournament.slug), **kwargs)
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_last_event_id(self):
+        """
+        Test that reconnecting browsers get the changes after the last one
+        they saw
+        """
+        content = self.get_events(HTTP_LAST_EVENT_ID=str(self.changes[0].number))
+
+        self.assertNotIn('id: {}\n'.format(self.changes[0].number), content)
+        self.assertIn('id: {}\n'.format(self.changes[1].number), content)
+
+    def test_last_event_id_parameter(self):
+        """
+        Test that the page can pass the change it was rendered at
+        """
+        content = self.get_events(data={'last_event_id': 0})
+
+        self.assertIn('id: {}\n'.format(self.changes[0].number), content)
+
+    def test_new_viewer(self):
+        """
+        Test that viewers without a cursor start from now
+        """
+        self.assertNotIn('id:', self.get_events())
+
+    def test_missing_tournament(self):
+        """
+        Test that we 404 for a tournament that doesn't exist
+        """
+        response = self.client.get('/api/missing/events')
+
+        self.assertEqual(response.status_code, 404)
@@ -1,13 +1,272 @@
+import json
+import re
+from calendar import timegm
+
+from django.conf import settings
+from django.http import HttpResponse, Http404, StreamingHttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.text import compress_string
+from django.views.decorators.http import condition, require_GET
 from django.views.generic import DetailView
 
+from matches.caching import get_cache
+from matches.live import event_stream, latest_change_number
 from matches.models import Tournament, Bracket
+from players.models import Pool, PoolStanding
+
+
+def get_tournament_modified(request, slug):
+    """
+    Return when data for the tournament last changed (or None if there's no
+    such tournament), looked up once per request
+    """
+    if not hasattr(request, '_tournament_modified'):
+        request._tournament_modified = Tournament.objects.filter(slug=slug).values_list(
+            'id', 'modified'
+        ).first()
+
+    return request._tournament_modified
+
+
+def get_tournament_version(request, slug):
+    """
+    Return a string that changes whenever the tournament's data does, for
+    ETags and cache keys
+    """
+    tournament = get_tournament_modified(request, slug)
+    if tournament:
+        tournament_id, modified = tournament
+        return '{}-{}{:06d}'.format(tournament_id, timegm(modified.utctimetuple()), modified.microsecond)
+
+
+def tournament_etag(request, slug, **kwargs):
+    return get_tournament_version(request, slug)
+
+
+def get_pools(tournament_id):
+    """
+    Return a tournament's pools, each with its standings in a player_standings
+    attribute, using one query for the pools and one for all of the standings
+    """
+    pools = list(Pool.objects.filter(tournament_id=tournament_id).select_related('tournament').order_by('id'))
+
+    standings = {}
+    for standing in PoolStanding.objects.filter(pool__in=pools).select_related('player').order_by('rank'):
+        standings.setdefault(standing.pool_id, []).append(standing.to_dict())
+
+    for pool in pools:
+        pool.player_standings = standings.get(pool.id, [])
+
+    return pools
+
 
+def tournament_last_modified(request, slug, **kwargs):
+    tournament = get_tournament_modified(request, slug)
+    if tournament:
+        return tournament[1]
 
+
+@method_decorator(condition(etag_func=tournament_etag, last_modified_func=tournament_last_modified),
+                  name='dispatch')
 class TournamentDetailView(DetailView):
+    """
+    Show a tournament's bracket and pool standings. Unchanged pages get a 304,
+    and rendered pages are cached until the tournament changes.
+    """
     model = Tournament
 
+    def get(self, request, *args, **kwargs):
+        version = get_tournament_version(request, kwargs['slug'])
+        if version is None:
+            return super().get(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = 'tourney:tournament-page:{}'.format(version)
+
+        content = cache.get(key)
+        if content is not None:
+            return HttpResponse(content)
+
+        response = super().get(request, *args, **kwargs)
+        response.add_post_render_callback(
+            lambda response: cache.set(key, response.content, settings.TOURNAMENT_PAGE_CACHE_TIMEOUT)
+        )
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['bracket_json'] = self.get_bracket_json()
+        context['pools'] = self.get_pools()
+        context['live_cursor'] = latest_change_number(self.object.id)
+        return context
+
     def get_bracket_json(self):
-        if Bracket.objects.filter(tournament=self.object):
-            return Bracket.objects.get(tournament=self.object).to_json()
+        bracket = Bracket.objects.filter(tournament=self.object).order_by('id').first()
+
+        if bracket:
+            return bracket.to_json()
 
         return None
+
+    def get_pools(self):
+        return get_pools(self.object.id)
+
+
+accepts_gzip = re.compile(r'\bgzip\b').search
+
+
+def api_etag(request, slug, **kwargs):
+    """
+    Tag gzipped and plain responses differently, since they're different
+    bytes
+    """
+    version = get_tournament_version(request, slug)
+    if version and accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        return version + '-gzip'
+    return version
+
+
+def get_bracket_versions(tournament_id, tournament_version):
+    """
+    Return the (snapshot_version, version) of the tournament's bracket, or
+    None if it has no bracket. Any change to the bracket touches the
+    tournament, so they're cached under the tournament's version.
+    """
+    cache = get_cache()
+    key = 'tourney:bracket-versions:{}'.format(tournament_version)
+
+    versions = cache.get(key)
+    if versions is None:
+        versions = Bracket.objects.filter(tournament_id=tournament_id).order_by('id').values_list(
+            'snapshot_version', 'version'
+        ).first() or ()
+        cache.set(key, versions, settings.API_CACHE_TIMEOUT)
+
+    return versions or None
+
+
+def parse_since(value, tournament_id, tournament_version):
+    """
+    Return the bracket version passed as a query parameter as an int, or -1
+    (for a snapshot) if it isn't one that changes can be sent since
+    """
+    try:
+        since = int(value)
+    except ValueError:
+        return -1
+
+    versions = get_bracket_versions(tournament_id, tournament_version)
+    if versions is None or not versions[0] <= since <= versions[1]:
+        return -1
+
+    return since
+
+
+def api_view(name, params=()):
+    """
+    Turn a function that builds a JSON string from a tournament id (and the
+    query parameters in params, given as (name, parser) pairs) into a view.
+    Responses can be revalidated with ETags, and the encoded (and, for
+    clients that accept it, gzipped) bytes are cached until the tournament
+    changes, so polling clients cost one query per request. Parameters are
+    parsed with the tournament's id and version before they're used in the
+    cache key, so parsers can map every value that gets the same response to
+    the same key.
+    """
+    def decorator(build):
+        @require_GET
+        @condition(etag_func=api_etag, last_modified_func=tournament_last_modified)
+        def view(request, slug):
+            tournament = get_tournament_modified(request, slug)
+            if tournament is None:
+                raise Http404('No tournament found matching the query')
+
+            gzipped = bool(accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+            version = get_tournament_version(request, slug)
+            args = [parser(request.GET.get(param, ''), tournament[0], version) for param, parser in params]
+
+            cache = get_cache()
+            key = 'tourney:api:{}:{}:{}'.format(name, version, 'gzip' if gzipped else 'plain')
+            if args:
+                key = '{}:{}'.format(key, ':'.join(str(arg) for arg in args))
+
+            content = cache.get(key)
+            if content is None:
+                content = build(tournament[0], *args).encode('utf-8')
+                if gzipped:
+                    content = compress_string(content)
+                cache.set(key, content, settings.API_CACHE_TIMEOUT)
+
+            response = HttpResponse(content, content_type='application/json')
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+            patch_vary_headers(response, ('Accept-Encoding',))
+            patch_cache_control(response, public=True, max_age=settings.API_CACHE_MAX_AGE)
+            return response
+
+        return view
+    return decorator
+
+
+@api_view('bracket')
+def bracket_json(tournament_id):
+    """
+    The tournament's bracket, in the format jQuery Bracket expects
+    """
+    bracket = Bracket.objects.filter(tournament_id=tournament_id).order_by('id').first()
+
+    if bracket:
+        return bracket.to_json()
+
+    return 'null'
+
+
+@api_view('bracket-changes', params=(('since', parse_since),))
+def bracket_changes_json(tournament_id, since):
+    """
+    What changed in the tournament's bracket since the version given, or the
+    whole bracket if it's missing or too old
+    """
+    bracket = Bracket.objects.filter(tournament_id=tournament_id).order_by('id').first()
+
+    if bracket:
+        return bracket.delta_json(since)
+
+    return 'null'
+
+
+@api_view('pools')
+def pools_json(tournament_id):
+    """
+    The tournament's pools with their standings
+    """
+    return json.dumps([
+        {'id': pool.id, 'name': str(pool), 'standings': pool.player_standings}
+        for pool in get_pools(tournament_id)
+    ])
+
+
+@require_GET
+def tournament_events(request, slug):
+    """
+    Stream changes to the tournament's matches and standings as server-sent
+    events, starting after the Last-Event-ID header (sent by browsers when
+    they reconnect) or the last_event_id parameter, or from now
+    """
+    tournament = get_tournament_modified(request, slug)
+    if tournament is None:
+        raise Http404('No tournament found matching the query')
+
+    last_number = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id')
+    try:
+        last_number = int(last_number)
+    except (TypeError, ValueError):
+        last_number = latest_change_number(tournament[0])
+
+    response = StreamingHttpResponse(event_stream(tournament[0], last_number), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx holding events back in its buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
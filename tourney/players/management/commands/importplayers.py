@@ -0,0 +1,187 @@
+import csv
+import itertools
+import json
+import os
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from matches.models import Tournament
+from players.models import Player, Pool
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        yield row
+
+
+def read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = ('Import players from a CSV file (with name and email columns, and optionally pool) or a JSON lines '
+            'file, adding them to a tournament and pools. Players are matched to existing ones by email.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The file to import, or - for standard input')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='The format of the file (by default, worked out from its extension)')
+        parser.add_argument('--tournament', help='The slug of the tournament to add the players to')
+        parser.add_argument('--pool', type=int,
+                            help='The pool to add players without a pool of their own to')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='How many rows to write at a time (at most 999 on SQLite)')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError('Unknown format {!r}; use --format'.format(file_format))
+
+        self.tournament = None
+        if options['tournament']:
+            self.tournament = Tournament.objects.filter(slug=options['tournament']).first()
+            if self.tournament is None:
+                raise CommandError('No tournament with the slug {!r}'.format(options['tournament']))
+
+        self.pools = {}
+        self.default_pool = options['pool']
+        if self.default_pool is not None and not self.check_pool(self.default_pool):
+            raise CommandError('No pool {} in the tournament'.format(self.default_pool))
+        self.counts = dict.fromkeys(('rows', 'created', 'existing', 'duplicates', 'invalid',
+                                     'tournament_added', 'pool_added'), 0)
+
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            stream = open(options['path'], encoding='utf-8', newline='')
+
+        try:
+            rows = enumerate(READERS[file_format](stream), start=1)
+            while True:
+                chunk = list(itertools.islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        if self.tournament is not None:
+            Tournament.objects.filter(id=self.tournament.id).touch()
+
+        self.stdout.write(
+            'Read {rows} rows: created {created} players, matched {existing} existing, skipped {duplicates} '
+            'duplicates and {invalid} invalid rows; added {tournament_added} to the tournament and {pool_added} '
+            'to pools'.format(**self.counts)
+        )
+
+    def check_pool(self, pool_id):
+        """
+        Return whether a pool exists (and is in the tournament), checking the
+        first time it's seen
+        """
+        if pool_id not in self.pools:
+            pools = Pool.objects.filter(id=pool_id)
+            if self.tournament is not None:
+                pools = pools.filter(tournament=self.tournament)
+            self.pools[pool_id] = pools.exists()
+
+        return self.pools[pool_id]
+
+    def parse(self, chunk):
+        """
+        Return a dict of email to (name, pool_id) for a chunk of rows, keeping
+        the first row for each email
+        """
+        players = {}
+        for line, row in chunk:
+            self.counts['rows'] += 1
+            name = (row.get('name') or '').strip()
+            email = (row.get('email') or '').strip().lower()
+
+            try:
+                validate_email(email)
+            except ValidationError:
+                self.stderr.write('Row {}: invalid email {!r}'.format(line, email))
+                self.counts['invalid'] += 1
+                continue
+            if not name:
+                self.stderr.write('Row {}: missing name'.format(line))
+                self.counts['invalid'] += 1
+                continue
+
+            if email in players:
+                self.counts['duplicates'] += 1
+                continue
+
+            pool_id = row.get('pool') or self.default_pool
+            if pool_id:
+                try:
+                    pool_id = int(pool_id)
+                except ValueError:
+                    self.stderr.write('Row {}: invalid pool {!r}'.format(line, pool_id))
+                    self.counts['invalid'] += 1
+                    continue
+                if not self.check_pool(pool_id):
+                    self.stderr.write('Row {}: no pool {} in the tournament'.format(line, pool_id))
+                    self.counts['invalid'] += 1
+                    continue
+
+            players[email] = (name, pool_id or None)
+
+        return players
+
+    @transaction.atomic
+    def import_chunk(self, chunk):
+        players = self.parse(chunk)
+        if not players:
+            return
+
+        ids = dict(Player.objects.filter(email__in=players).values_list('email', 'id'))
+        self.counts['existing'] += len(ids)
+
+        new = [Player(name=name, email=email) for email, (name, pool_id) in players.items() if email not in ids]
+        if new:
+            Player.objects.bulk_create(new)
+            # bulk_create doesn't set primary keys on every database
+            ids.update(Player.objects.filter(email__in=[player.email for player in new]).values_list('email', 'id'))
+            self.counts['created'] += len(new)
+
+        if self.tournament is not None:
+            self.counts['tournament_added'] += self.add_links(
+                Tournament.players.through, 'tournament_id', {self.tournament.id: set(ids.values())}
+            )
+
+        pool_players = {}
+        for email, (name, pool_id) in players.items():
+            if pool_id:
+                pool_players.setdefault(pool_id, set()).add(ids[email])
+        self.counts['pool_added'] += self.add_links(Pool.players.through, 'pool_id', pool_players)
+
+    def add_links(self, through, field, player_ids):
+        """
+        Add the M2M rows linking each of player_ids (a dict of object id to a
+        set of player ids) to its object, skipping the ones that exist, and
+        return how many were added
+        """
+        links = []
+        for object_id, object_player_ids in player_ids.items():
+            existing = set(through.objects.filter(**{field: object_id, 'player_id__in': object_player_ids})
+                           .values_list('player_id', flat=True))
+            links += [through(**{field: object_id, 'player_id': player_id})
+                      for player_id in sorted(object_player_ids - existing)]
+
+        through.objects.bulk_create(links)
+        return len(links)
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from matches.models import Tournament
+
+from players.models import Pool, PoolStanding, STANDING_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored pool standings from match results, or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', type=int, action='append', dest='pools',
+                            help='Only rebuild this pool (may be repeated)')
+        parser.add_argument('--check', action='store_true',
+                            help='Report standings that differ from the match results without rebuilding')
+
+    def handle(self, *args, **options):
+        pools = Pool.objects.all()
+        if options['pools']:
+            pools = pools.filter(id__in=options['pools'])
+
+        drifted = 0
+        rebuilt = []
+        for pool in pools:
+            if options['check']:
+                differences = self.compare(pool)
+                for difference in differences:
+                    self.stdout.write('Pool {}: {}'.format(pool.id, difference))
+                drifted += bool(differences)
+            else:
+                standings = PoolStanding.objects.rebuild(pool.id)
+                rebuilt.append(pool.id)
+                self.stdout.write('Rebuilt {} standings for pool {}'.format(len(standings), pool.id))
+
+        # The rewritten standings are shown on the tournament pages
+        if rebuilt:
+            Tournament.objects.filter(pool__id__in=rebuilt).touch()
+
+        if drifted:
+            raise CommandError('{} pool(s) have drifted from their match results'.format(drifted))
+
+    def compare(self, pool):
+        """
+        Return a list of descriptions of where the stored standings differ from
+        freshly calculated ones
+        """
+        fields = STANDING_FIELDS + ('rank',)
+        stored = {s.player_id: s for s in PoolStanding.objects.filter(pool=pool)}
+        expected = {s.player_id: s for s in PoolStanding.objects.calculate(pool.id)}
+
+        differences = []
+        for player_id in sorted(set(stored) | set(expected)):
+            if player_id not in stored:
+                differences.append('player {} is missing'.format(player_id))
+            elif player_id not in expected:
+                differences.append('player {} has no matches in the pool'.format(player_id))
+            else:
+                for field in fields:
+                    stored_value = getattr(stored[player_id], field)
+                    expected_value = getattr(expected[player_id], field)
+                    if stored_value != expected_value:
+                        differences.append('player {} has {} {}, expected {}'.format(
+                            player_id, field, stored_value, expected_value
+                        ))
+
+        return differences
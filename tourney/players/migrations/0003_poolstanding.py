@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def calculate_standings(apps, schema_editor):
+    """
+    Store standings for existing pools, worked out from their matches the same
+    way as PoolStandingManager.calculate
+    """
+    Match = apps.get_model('matches', 'Match')
+    PoolStanding = apps.get_model('players', 'PoolStanding')
+
+    def result_totals(player_1_id, player_2_id, player_1_score, player_2_score):
+        if player_2_id is None:
+            return {player_1_id: [1, 0, 0, 0]}
+        if player_1_score is None or player_2_score is None:
+            return {player_1_id: [0, 0, 0, 0], player_2_id: [0, 0, 0, 0]}
+        return {
+            player_1_id: [int(player_1_score > player_2_score), int(player_1_score < player_2_score),
+                          player_1_score, player_2_score],
+            player_2_id: [int(player_2_score > player_1_score), int(player_2_score < player_1_score),
+                          player_2_score, player_1_score],
+        }
+
+    totals = {}
+    names = {}
+    for pool_id, player_1_id, player_2_id, player_1_score, player_2_score, player_1_name, player_2_name in (
+        Match.objects.filter(round__pool__isnull=False).values_list(
+            'round__pool_id', 'player_1_init', 'player_2_init', 'player_1_score', 'player_2_score',
+            'player_1_init__name', 'player_2_init__name'
+        )
+    ):
+        names.update({player_1_id: player_1_name, player_2_id: player_2_name})
+
+        pool_totals = totals.setdefault(pool_id, {})
+        for player_id, values in result_totals(player_1_id, player_2_id, player_1_score, player_2_score).items():
+            current = pool_totals.setdefault(player_id, [0, 0, 0, 0])
+            pool_totals[player_id] = [a + b for a, b in zip(current, values)]
+
+    standings = []
+    for pool_id, pool_totals in totals.items():
+        ordered = sorted(pool_totals.items(),
+                         key=lambda item: (-item[1][0], item[1][1], names[item[0]], item[0]))
+        for rank, (player_id, (wins, losses, games_for, games_against)) in enumerate(ordered, start=1):
+            standings.append(PoolStanding(pool_id=pool_id, player_id=player_id, wins=wins, losses=losses,
+                                          games_for=games_for, games_against=games_against, rank=rank))
+
+    PoolStanding.objects.bulk_create(standings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0002_pool'),
+        ('matches', '0006_auto_20160328_0348'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoolStanding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('games_for', models.PositiveIntegerField(default=0)),
+                ('games_against', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='players.Player')),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to='players.Pool')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='poolstanding',
+            unique_together=set([('pool', 'player')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='poolstanding',
+            index_together=set([('pool', 'rank')]),
+        ),
+        migrations.RunPython(calculate_standings, migrations.RunPython.noop),
+    ]
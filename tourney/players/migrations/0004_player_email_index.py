@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-16 23:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('players', '0003_poolstanding'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='player',
+            name='email',
+            field=models.EmailField(db_index=True, max_length=254),
+        ),
+    ]
@@ -1,13 +1,25 @@
-from django.db import models
+from random import shuffle
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
+
+from players.scheduling import round_robin, swiss_pairings
 
 
 class Player(models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
 
     def __str__(self):
         return '{} ({})'.format(self.name, self.email)
 
+    def save(self, *args, **kwargs):
+        # Emails are stored lower case, so players can be matched by email
+        # with an exact lookup
+        self.email = self.email.lower()
+        super().save(*args, **kwargs)
+
 
 class Pool(models.Model):
     tournament = models.ForeignKey('matches.Tournament')
@@ -16,80 +28,266 @@ class Pool(models.Model):
     def __str__(self):
         return '{} - Pool {}'.format(self.tournament.name, self.id)
 
-    def _generate_matches(self):
+    def _generate_matches(self, double_round_robin=False, commit=True):
+        """
+        Create a match for each set of 2 players in the pool (twice for a
+        double round-robin), and rounds to hold them. Returns the schedule as a
+        list of rounds of (player_1, player_2) tuples; with commit=False
+        nothing is saved.
+        """
+        from matches.models import Tournament, Round, Match
+
+        schedule = round_robin(self.players.all(), double=double_round_robin)
+
+        if not commit:
+            return schedule
+
+        with transaction.atomic():
+            if Match.objects.filter(round__pool=self).exists():
+                raise ValidationError('Matches have already been generated for this pool')
+
+            existing_numbers = set(Round.objects.filter(pool=self).values_list('number', flat=True))
+            Round.objects.bulk_create([
+                Round(pool=self, number=number)
+                for number in range(1, len(schedule) + 1)
+                if number not in existing_numbers
+            ])
+            rounds = {r.number: r for r in Round.objects.filter(pool=self)}
+
+            Match.objects.bulk_create([
+                Match(player_1_init=player_1, player_2_init=player_2,
+                      player_1_resolved=player_1, player_2_resolved=player_2,
+                      round=rounds[number], round_index=index)
+                for number, pairs in enumerate(schedule, start=1)
+                for index, (player_1, player_2) in enumerate(pairs)
+            ])
+            PoolStanding.objects.rebuild(self.id)
+            Tournament.objects.filter(id=self.tournament_id).touch()
+
+        return schedule
+
+    def _generate_swiss_round(self, commit=True):
         """
-        Create a match for each set of 2 players in the pool, and rounds to hold
-        them
+        Pair the pool's players for the next round of a Swiss system, by wins
+        and then game difference so far, avoiding rematches. Results are read
+        with one query and the round's matches written with one bulk_create,
+        with a bye match for the odd player out. Returns the (player_1_id,
+        player_2_id) pairs and the id of the player given the bye, or None;
+        with commit=False nothing is saved.
         """
-        from matches.models import Match, Round
+        from matches.models import Tournament, Round, Match
 
-        rounds = {}
-        players = [player for player in self.players.all()]
+        player_ids = list(self.players.values_list('id', flat=True))
+        if len(player_ids) < 2:
+            raise ValidationError('A Swiss round needs at least two players')
 
-        if len(players) % 2 != 0: players.append(None)
+        results = Match.objects.filter(round__pool=self).values_list(
+            'round__number', 'player_1_init', 'player_2_init', 'player_1_score', 'player_2_score'
+        )
 
-        iterator = list(range(len(players)))
-        for x in iterator:
-            if x == 0: continue
-            round = Round(pool=self, number=x)
-            round.save()
-            rounds[round] = []
+        scores = {player_id: [0, 0] for player_id in player_ids}
+        played = set()
+        byes = set()
+        last_round = 0
+        for number, player_1_id, player_2_id, player_1_score, player_2_score in results:
+            last_round = max(last_round, number)
+            if player_2_id is None:
+                byes.add(player_1_id)
+            elif player_1_score is None or player_2_score is None:
+                raise ValidationError('Every match in round {} needs a score before the next round is '
+                                      'paired'.format(number))
+            else:
+                played.add(frozenset((player_1_id, player_2_id)))
 
-        for x in iterator:
-            if not players[x]: continue
+            for player_id, values in _result_totals(player_1_id, player_2_id, player_1_score, player_2_score).items():
+                if player_id in scores:
+                    scores[player_id][0] += values[0]
+                    scores[player_id][1] += values[2] - values[3]
 
-            others_iterator = iterator.copy()
-            others_iterator.remove(x)
+        # Shuffle first, so players level on both are drawn at random
+        shuffle(player_ids)
+        standings = sorted(player_ids, key=lambda player_id: (-scores[player_id][0], -scores[player_id][1]))
+        pairs, bye = swiss_pairings(standings, played, byes)
 
-            for y in others_iterator:
-                if not players[y]: continue
+        if not commit:
+            return pairs, bye
 
-                match_exists = Match.objects.filter(player_1_init=players[x], player_2_init=players[y]).exists()
-                inverse_match_exists = Match.objects.filter(player_1_init=players[y], player_2_init=players[x]).exists()
+        with transaction.atomic():
+            # The round may have been added (by hand, or by another pairing) already
+            round, created = Round.objects.get_or_create(pool=self, number=last_round + 1)
+            if not created and round.match_set.exists():
+                raise ValidationError('Round {} has already been paired'.format(round.number))
 
-                if match_exists or inverse_match_exists:
-                    continue
+            matches = [
+                Match(player_1_init_id=player_1_id, player_2_init_id=player_2_id,
+                      player_1_resolved_id=player_1_id, player_2_resolved_id=player_2_id,
+                      round=round, round_index=index)
+                for index, (player_1_id, player_2_id) in enumerate(pairs)
+            ]
+            if bye is not None:
+                matches.append(Match(player_1_init_id=bye, player_1_resolved_id=bye, winning_player_id=bye,
+                                     bye=True, round=round, round_index=len(pairs)))
+            Match.objects.bulk_create(matches)
 
-                for scheduled_round, players_in_round in rounds.items():
-                    if (players[x] not in players_in_round) and (players[y] not in players_in_round):
-                        break
+            PoolStanding.objects.rebuild(self.id)
+            Tournament.objects.filter(id=self.tournament_id).touch()
 
-                match = Match(
-                    player_1_init=players[x],
-                    player_2_init=players[y],
-                    round=scheduled_round,
-                    round_index=0
-                )
-                match.save()
-                rounds[scheduled_round] += [players[x], players[y]]
+        return pairs, bye
 
     def get_player_standings(self):
         """
         Return a list of dictionaries describing the standings (player name and
-        win/loss record)
+        win/loss record), read from the ranked PoolStanding table
+        """
+        standings = self.standings.select_related('player').order_by('rank')
+
+        return [standing.to_dict() for standing in standings]
+
+
+def _result_totals(player_1_id, player_2_id, player_1_score, player_2_score):
+    """
+    Return what a single match result adds to each player's standing, as
+    {player_id: [wins, losses, games_for, games_against]}. Unscored matches
+    add nothing, but still list both players. A bye counts as a win.
+    """
+    if player_2_id is None:
+        return {player_1_id: [1, 0, 0, 0]}
+
+    totals = {player_1_id: [0, 0, 0, 0], player_2_id: [0, 0, 0, 0]}
+
+    if player_1_score is None or player_2_score is None:
+        return totals
+
+    totals[player_1_id] = [int(player_1_score > player_2_score), int(player_1_score < player_2_score),
+                           player_1_score, player_2_score]
+    totals[player_2_id] = [int(player_2_score > player_1_score), int(player_2_score < player_1_score),
+                           player_2_score, player_1_score]
+
+    return totals
+
+
+STANDING_FIELDS = ('wins', 'losses', 'games_for', 'games_against')
+
+STANDING_ORDERING = ('-wins', 'losses', 'player__name', 'player_id')
+
+
+class PoolStandingManager(models.Manager):
+
+    def calculate(self, pool_id):
+        """
+        Return unsaved, ranked standings for a pool worked out from its matches
+        with a single query
         """
-        records = []
-        rounds = self.round_set.all()
+        from matches.models import Match
 
-        for round_object in rounds:
-            for match in round_object.match_set.all():
-                if not any(d['name'] == match.player_1.name for d in records):
-                    records.append({'name': match.player_1.name, 'wins': 0, 'losses': 0})
-                if not any(d['name'] == match.player_2.name for d in records):
-                    records.append({'name': match.player_2.name, 'wins': 0, 'losses': 0})
+        results = Match.objects.filter(round__pool_id=pool_id).values_list(
+            'player_1_init', 'player_2_init', 'player_1_score', 'player_2_score',
+            'player_1_init__name', 'player_2_init__name'
+        )
 
-                player_1_record = next((record for record in records if record['name'] == match.player_1.name), None)
-                player_2_record = next((record for record in records if record['name'] == match.player_2.name), None)
+        totals = {}
+        names = {}
+        for player_1_id, player_2_id, player_1_score, player_2_score, player_1_name, player_2_name in results:
+            names.update({player_1_id: player_1_name, player_2_id: player_2_name})
 
-                if match.winner() == match.player_1:
-                    player_1_record['wins'] += 1
-                    player_2_record['losses'] += 1
+            for player_id, values in _result_totals(player_1_id, player_2_id, player_1_score, player_2_score).items():
+                current = totals.setdefault(player_id, [0, 0, 0, 0])
+                totals[player_id] = [a + b for a, b in zip(current, values)]
 
-                if match.winner() == match.player_2:
-                    player_2_record['wins'] += 1
-                    player_1_record['losses'] += 1
+        standings = [PoolStanding(pool_id=pool_id, player_id=player_id, **dict(zip(STANDING_FIELDS, values)))
+                     for player_id, values in totals.items()]
+        standings.sort(key=lambda s: (-s.wins, s.losses, names[s.player_id], s.player_id))
+        for rank, standing in enumerate(standings, start=1):
+            standing.rank = rank
 
-        records_by_losses = sorted(records, key=lambda k: k['losses'])
-        records_by_wins = sorted(records, key=lambda k: k['wins'], reverse=True)
+        return standings
 
-        return records_by_wins
+    @transaction.atomic
+    def rebuild(self, pool_id):
+        """
+        Replace the stored standings for a pool with freshly calculated ones
+        """
+        standings = self.calculate(pool_id)
+
+        self.filter(pool_id=pool_id).delete()
+        self.bulk_create(standings)
+
+        return standings
+
+    def record_result_change(self, old_result, new_result):
+        """
+        Apply the difference between a match's old and new result to the
+        standings of the pools involved. Results are (round_id, player_1_id,
+        player_2_id, player_1_score, player_2_score) tuples, or None.
+        """
+        from matches.models import Round
+
+        results = [result for result in (old_result, new_result) if result is not None]
+        pool_ids = dict(Round.objects.filter(
+            id__in=[result[0] for result in results], pool__isnull=False
+        ).values_list('id', 'pool_id'))
+
+        deltas = {}
+        for sign, result in ((-1, old_result), (1, new_result)):
+            if result is None or result[0] not in pool_ids:
+                continue
+
+            for player_id, values in _result_totals(*result[1:]).items():
+                key = (pool_ids[result[0]], player_id)
+                current = deltas.setdefault(key, [0, 0, 0, 0])
+                deltas[key] = [a + sign * b for a, b in zip(current, values)]
+
+        for pool_id in set(pool_id for pool_id, player_id in deltas):
+            player_ids = [player_id for key_pool_id, player_id in deltas if key_pool_id == pool_id]
+            existing = set(self.filter(pool_id=pool_id, player_id__in=player_ids).values_list('player_id', flat=True))
+            self.bulk_create([PoolStanding(pool_id=pool_id, player_id=player_id)
+                              for player_id in player_ids if player_id not in existing])
+
+            for player_id in player_ids:
+                values = deltas[(pool_id, player_id)]
+                if any(values):
+                    self.filter(pool_id=pool_id, player_id=player_id).update(**{
+                        field: F(field) + value for field, value in zip(STANDING_FIELDS, values)
+                    })
+
+            self.rerank(pool_id)
+
+    def rerank(self, pool_id):
+        """
+        Renumber the standings in a pool, writing the ranks that moved with a
+        single UPDATE
+        """
+        standings = self.filter(pool_id=pool_id).order_by(*STANDING_ORDERING).values_list('id', 'rank')
+        moved = {standing_id: rank for rank, (standing_id, current_rank) in enumerate(standings, start=1)
+                 if rank != current_rank}
+
+        if moved:
+            self.filter(id__in=moved).update(rank=models.Case(
+                *[models.When(id=standing_id, then=models.Value(rank)) for standing_id, rank in moved.items()],
+                output_field=models.IntegerField()
+            ))
+
+
+class PoolStanding(models.Model):
+    pool = models.ForeignKey(Pool, related_name='standings')
+    player = models.ForeignKey(Player)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    games_for = models.PositiveIntegerField(default=0)
+    games_against = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(default=0)
+
+    objects = PoolStandingManager()
+
+    class Meta:
+        unique_together = ('pool', 'player')
+        index_together = [('pool', 'rank')]
+
+    def __str__(self):
+        return '{} - {}-{}'.format(self.player.name, self.wins, self.losses)
+
+    def to_dict(self):
+        """
+        Return the player name and win/loss record shown in standings tables
+        """
+        return {'name': self.player.name, 'wins': self.wins, 'losses': self.losses}
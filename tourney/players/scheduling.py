@@ -0,0 +1,226 @@
+def round_robin(players, double=False):
+    """
+    Schedule a round-robin with the circle (Berger) method. Returns a list of
+    rounds, each a list of (player_1, player_2) tuples, in which every player
+    plays at most once. With an odd number of players one player sits out
+    each round. A double round-robin plays every pairing again in a second
+    half with player_1 and player_2 swapped.
+    """
+    players = list(players)
+    if len(players) % 2 != 0:
+        players.append(None)
+
+    count = len(players)
+    rounds = []
+    for number in range(count - 1):
+        pairs = []
+        for index in range(count // 2):
+            player_1, player_2 = players[index], players[count - 1 - index]
+
+            # Alternate sides for the fixed player so it isn't always player 1
+            if index == 0 and number % 2 != 0:
+                player_1, player_2 = player_2, player_1
+
+            if player_1 is not None and player_2 is not None:
+                pairs.append((player_1, player_2))
+        rounds.append(pairs)
+
+        # Keep the first player fixed and rotate the rest one place
+        players = [players[0], players[-1]] + players[1:-1]
+
+    if double:
+        rounds += [[(player_2, player_1) for player_1, player_2 in pairs] for pairs in rounds]
+
+    return rounds
+
+
+def swiss_pairings(standings, played=(), byes=()):
+    """
+    Pair players for the next round of a Swiss system. standings lists the
+    players best first, played holds a frozenset for each pair that has
+    already met, and byes the players who've had a bye. Returns a list of
+    (player_1, player_2) tuples and the player given a bye (or None).
+
+    With an odd number of players, the lowest placed player who hasn't had a
+    bye sits out. Then each player, going down the standings, is paired with
+    the nearest player below who they haven't played. When everyone left has
+    played them, an earlier pair is split to make room. Each player is
+    usually paired within a few places, so large fields pair in close to
+    linear time.
+
+    If that still leaves a rematch, which happens in the late rounds of small
+    pools, the pairings are found again as a maximum matching of the players
+    who haven't met, starting from the pairs already made. A rematch is then
+    only made when every pairing (with any player who hasn't had one taking
+    the bye) has one.
+    """
+    remaining = list(standings)
+    played = set(played)
+
+    bye = None
+    if len(remaining) % 2 != 0:
+        fresh = [player for player in remaining if player not in byes]
+        bye = (fresh or remaining)[-1]
+        remaining.remove(bye)
+
+    def can_play(player_1, player_2):
+        return frozenset((player_1, player_2)) not in played
+
+    pairs = []
+    while remaining:
+        player = remaining.pop(0)
+
+        for index, opponent in enumerate(remaining):
+            if can_play(player, opponent):
+                pairs.append((player, remaining.pop(index)))
+                break
+        else:
+            pairs += _split_pair(player, remaining, pairs, can_play)
+
+    if all(can_play(*pair) for pair in pairs):
+        return pairs, bye
+
+    return _matched_pairings(list(standings), byes, pairs, bye, can_play)
+
+
+def _split_pair(player, remaining, pairs, can_play):
+    """
+    Make room for a player who has played everyone left, by taking one player
+    from the nearest earlier pair that can be split and pairing their old
+    partner with someone left instead. Returns the new pair or pairs to add;
+    the split pair is replaced in place and the partner found is removed from
+    remaining.
+    """
+    for index in range(len(pairs) - 1, -1, -1):
+        for partner, other in (pairs[index], pairs[index][::-1]):
+            if not can_play(partner, player):
+                continue
+
+            for remaining_index, opponent in enumerate(remaining):
+                if can_play(other, opponent):
+                    pairs[index] = (partner, player)
+                    return [(other, remaining.pop(remaining_index))]
+
+    # Every arrangement within reach is a rematch
+    return [(player, remaining.pop(0))]
+
+
+def _matched_pairings(standings, byes, pairs, bye, can_play):
+    """
+    Pair players as a maximum matching of the ones who haven't met, keeping
+    the rematch-free pairs already made where possible. With an odd number
+    of players, the bye is an extra place that players without one can be
+    matched to. Whoever is left unmatched is paired in standings order.
+    """
+    position = {player: index for index, player in enumerate(standings)}
+    count = len(standings)
+
+    # Nearest in the standings first, so new pairs stay close where they can
+    adjacent = [sorted((other for other in range(count) if other != index and
+                        can_play(standings[index], standings[other])), key=lambda other: abs(other - index))
+                for index in range(count)]
+    match = [None] * count
+
+    if bye is not None:
+        fresh = [index for index in range(count) if standings[index] not in byes] or list(range(count))
+        adjacent.append(fresh[::-1])
+        for index in fresh:
+            adjacent[index].append(count)
+        match.append(position[bye])
+        match[position[bye]] = count
+        count += 1
+
+    for player_1, player_2 in pairs:
+        if can_play(player_1, player_2):
+            match[position[player_1]] = position[player_2]
+            match[position[player_2]] = position[player_1]
+
+    for root in range(count):
+        if match[root] is None:
+            _augment(adjacent, match, root)
+
+    unmatched = [index for index in range(len(standings)) if match[index] is None]
+    if bye is not None:
+        if match[-1] is None:
+            fresh = [index for index in unmatched if standings[index] not in byes] or unmatched
+            unmatched.remove(fresh[-1])
+            bye = standings[fresh[-1]]
+        else:
+            bye = standings[match[-1]]
+
+    pairs = [(standings[index], standings[match[index]]) for index in range(len(standings))
+             if match[index] is not None and index < match[index] < len(standings)]
+    # Every pairing left has a rematch
+    pairs += [(standings[unmatched[index]], standings[unmatched[index + 1]])
+              for index in range(0, len(unmatched), 2)]
+
+    return sorted(pairs, key=lambda pair: position[pair[0]]), bye
+
+
+def _augment(adjacent, match, root):
+    """
+    Grow match (a list giving each vertex's partner, or None) by one pair if
+    there's an augmenting path from root, with Edmonds' blossom algorithm
+    """
+    count = len(adjacent)
+    base = list(range(count))
+    parent = [None] * count
+    used = [False] * count
+    used[root] = True
+    queue = [root]
+
+    def lowest_common_ancestor(a, b):
+        seen = [False] * count
+        while True:
+            a = base[a]
+            seen[a] = True
+            if match[a] is None:
+                break
+            a = parent[match[a]]
+        while True:
+            b = base[b]
+            if seen[b]:
+                return b
+            b = parent[match[b]]
+
+    def mark_path(vertex, ancestor, child, blossom):
+        while base[vertex] != ancestor:
+            blossom[base[vertex]] = blossom[base[match[vertex]]] = True
+            parent[vertex] = child
+            child = match[vertex]
+            vertex = parent[match[vertex]]
+
+    while queue:
+        vertex = queue.pop(0)
+        for other in adjacent[vertex]:
+            if base[vertex] == base[other] or match[vertex] == other:
+                continue
+
+            if other == root or match[other] is not None and parent[match[other]] is not None:
+                # An odd cycle: contract it into a blossom
+                ancestor = lowest_common_ancestor(vertex, other)
+                blossom = [False] * count
+                mark_path(vertex, ancestor, other, blossom)
+                mark_path(other, ancestor, vertex, blossom)
+                for index in range(count):
+                    if blossom[base[index]]:
+                        base[index] = ancestor
+                        if not used[index]:
+                            used[index] = True
+                            queue.append(index)
+            elif parent[other] is None:
+                parent[other] = vertex
+                if match[other] is None:
+                    # Flip the matched and unmatched edges along the path
+                    while other is not None:
+                        previous = parent[other]
+                        following = match[previous]
+                        match[other] = previous
+                        match[previous] = other
+                        other = following
+                    return True
+
+                used[match[other]] = True
+                queue.append(match[other])
+
+    return False
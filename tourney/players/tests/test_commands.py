@@ -0,0 +1,186 @@
+import datetime
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from model_mommy import mommy
+
+from matches.models import Tournament, Round, Match
+from players.models import Player, Pool, PoolStanding
+
+
+class RebuildPoolStandingsTestCase(TestCase):
+
+    def setUp(self):
+        self.pool = mommy.make(Pool)
+        self.player_1, self.player_2 = mommy.make(Player, _quantity=2)
+        mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                   player_1_score=3, player_2_score=1, round=mommy.make(Round, pool=self.pool))
+
+    def test_check_passes(self):
+        """
+        Test that --check is quiet when the standings are up to date
+        """
+        out = StringIO()
+
+        call_command('rebuildpoolstandings', check=True, stdout=out)
+
+        self.assertEqual(out.getvalue(), '')
+
+    def test_check_reports_drift(self):
+        """
+        Test that --check reports standings that don't match the results
+        """
+        PoolStanding.objects.filter(player=self.player_1).update(wins=5)
+        out = StringIO()
+
+        with self.assertRaises(CommandError):
+            call_command('rebuildpoolstandings', check=True, stdout=out)
+
+        self.assertIn('player {} has wins 5, expected 1'.format(self.player_1.id), out.getvalue())
+
+    def test_rebuild(self):
+        """
+        Test that we can rebuild the standings from scratch
+        """
+        PoolStanding.objects.all().delete()
+
+        call_command('rebuildpoolstandings', stdout=StringIO())
+
+        standing = PoolStanding.objects.get(player=self.player_1)
+        self.assertEqual((standing.wins, standing.games_for, standing.games_against, standing.rank), (1, 3, 1, 1))
+        self.assertEqual(PoolStanding.objects.get(player=self.player_2).rank, 2)
+
+    def test_rebuild_touches_tournament(self):
+        """
+        Test that rebuilding a pool's standings touches its tournament
+        """
+        Tournament.objects.filter(id=self.pool.tournament_id).update(modified=timezone.now() - datetime.timedelta(1))
+        modified = Tournament.objects.get(id=self.pool.tournament_id).modified
+
+        call_command('rebuildpoolstandings', stdout=StringIO())
+
+        self.assertGreater(Tournament.objects.get(id=self.pool.tournament_id).modified, modified)
+
+
+class ImportPlayersTestCase(TestCase):
+
+    def setUp(self):
+        self.tournament = mommy.make(Tournament)
+        self.pool = mommy.make(Pool, tournament=self.tournament)
+
+    def import_players(self, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('importplayers', f.name, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_csv(self):
+        """
+        Test that players are created and added to the tournament and their
+        pools
+        """
+        self.import_players(
+            'name,email,pool\n'
+            'Ann,ann@example.com,{}\n'
+            'Bob,Bob@Example.com,\n'.format(self.pool.id),
+            tournament=self.tournament.slug
+        )
+
+        ann = Player.objects.get(email='ann@example.com')
+        bob = Player.objects.get(email='bob@example.com')
+        self.assertEqual(set(self.tournament.players.all()), {ann, bob})
+        self.assertEqual(list(self.pool.players.all()), [ann])
+
+    def test_jsonl(self):
+        """
+        Test that JSON lines files can be imported, with a default pool
+        """
+        self.import_players(
+            '{"name": "Ann", "email": "ann@example.com"}\n'
+            '{"name": "Bob", "email": "bob@example.com"}\n',
+            suffix='.jsonl', pool=self.pool.id
+        )
+
+        self.assertEqual(self.pool.players.count(), 2)
+
+    def test_dedupe(self):
+        """
+        Test that players are matched to existing ones by email, including
+        ones earlier in the file, and links aren't added twice
+        """
+        existing = mommy.make(Player, email='ann@example.com')
+        self.tournament.players.add(existing)
+
+        out = self.import_players(
+            'name,email\n'
+            'Ann,ann@example.com\n'
+            'Bob,bob@example.com\n'
+            'Robert,bob@example.com\n'
+            'Carl,carl@example.com\n'
+            'Nobody,not-an-email\n',
+            tournament=self.tournament.slug, chunk_size=2
+        )
+
+        self.assertEqual(Player.objects.count(), 3)
+        self.assertEqual(self.tournament.players.count(), 3)
+        self.assertIn('created 2 players, matched 2 existing, skipped 0 duplicates and 1 invalid rows', out)
+
+    def test_queries_per_chunk(self):
+        """
+        Test that the number of queries depends on the number of chunks, not
+        the number of rows
+        """
+        rows = ''.join('Player {0},player{0}@example.com\n'.format(i) for i in range(200))
+
+        # The tournament, seven per chunk, then touching the tournament
+        with self.assertNumQueries(16):
+            self.import_players('name,email\n' + rows, tournament=self.tournament.slug, chunk_size=100)
+
+        self.assertEqual(self.tournament.players.count(), 200)
+
+    def test_unknown_pool(self):
+        """
+        Test that rows with a pool outside the tournament are skipped as
+        invalid without stopping the import
+        """
+        other_pool = mommy.make(Pool)
+
+        out = self.import_players(
+            'name,email,pool\n'
+            'Ann,ann@example.com,{}\n'
+            'Bob,bob@example.com,{}\n'.format(self.pool.id, other_pool.id),
+            tournament=self.tournament.slug, chunk_size=1
+        )
+
+        self.assertIn('created 1 players', out)
+        self.assertIn('1 invalid rows', out)
+        self.assertEqual(list(self.pool.players.values_list('email', flat=True)), ['ann@example.com'])
+
+    def test_unknown_default_pool(self):
+        """
+        Test that an unknown --pool is an error before anything is imported
+        """
+        with self.assertRaises(CommandError):
+            self.import_players('name,email\nAnn,ann@example.com\n', pool=self.pool.id + 100)
+
+        self.assertFalse(Player.objects.exists())
+
+    def test_mixed_case_existing_email(self):
+        """
+        Test that players entered with a mixed case email are matched
+        """
+        existing = Player.objects.create(name='Ann', email='Ann@Example.com')
+
+        self.import_players('name,email\nAnn,ANN@example.com\n', tournament=self.tournament.slug)
+
+        self.assertEqual(Player.objects.count(), 1)
+        self.assertEqual(list(self.tournament.players.all()), [existing])
@@ -1,11 +1,10 @@
-from unittest import skip
-
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
 from model_mommy import mommy
 
-from players.models import Player, Pool
-from matches.models import Tournament, Round, Match
+from players.models import Player, Pool, PoolStanding
+from matches.models import Tournament, Bracket, Round, Match
 
 
 class PlayerTestCase(TestCase):
@@ -67,7 +66,6 @@ class PoolTestCase(TestCase):
             for x in range(1,3):
                 self.assertEqual(Match.objects.filter(round__number=x).count(), 1)
 
-    @skip('_generate_matches does not efficiently schedule 5 players')
     def test__generate_matches_five_players(self):
         """
         Test that we can generate matches for an odd number over 3 in a Pool
@@ -84,6 +82,62 @@ class PoolTestCase(TestCase):
             for x in range(1,5):
                 self.assertEqual(Match.objects.filter(round__number=x).count(), 2)
 
+    def test__generate_matches_plays_once_per_round(self):
+        """
+        Test that every pair plays once and nobody plays twice in a round
+        """
+        players = mommy.make(Player, _quantity=7)
+        self.pool.players.add(*players)
+
+        self.pool._generate_matches()
+
+        pairs = set()
+        for round in Round.objects.filter(pool=self.pool):
+            in_round = []
+            for match in round.match_set.all():
+                in_round += [match.player_1_init_id, match.player_2_init_id]
+                pairs.add(frozenset([match.player_1_init_id, match.player_2_init_id]))
+            self.assertEqual(len(in_round), len(set(in_round)))
+        self.assertEqual(len(pairs), 21)
+
+    def test__generate_matches_double_round_robin(self):
+        """
+        Test that a double round-robin plays every pair twice with the sides
+        swapped
+        """
+        player_1, player_2 = mommy.make(Player, _quantity=2)
+        self.pool.players.add(player_1, player_2)
+
+        self.pool._generate_matches(double_round_robin=True)
+
+        self.assertEqual(Round.objects.filter(pool=self.pool).count(), 2)
+        self.assertEqual(set(Match.objects.values_list('player_1_init', 'player_2_init')),
+                         {(player_1.id, player_2.id), (player_2.id, player_1.id)})
+
+    def test__generate_matches_dry_run(self):
+        """
+        Test that we can preview the schedule without saving it
+        """
+        self.pool.players.add(*mommy.make(Player, _quantity=4))
+
+        schedule = self.pool._generate_matches(commit=False)
+
+        self.assertEqual([len(pairs) for pairs in schedule], [2, 2, 2])
+        self.assertEqual(Round.objects.count(), 0)
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test__generate_matches_query_count(self):
+        """
+        Test that we write the schedule and standings with a handful of bulk
+        queries (SQLite splits the 190 matches into 4 batches)
+        """
+        self.pool.players.add(*mommy.make(Player, _quantity=20))
+
+        with self.assertNumQueries(17):
+            self.pool._generate_matches()
+
+        self.assertEqual(Match.objects.count(), 190)
+
     def test_get_player_standings(self):
         """
         Test that we can get a list of standings for a pool
@@ -109,9 +163,256 @@ class PoolTestCase(TestCase):
         match_6 = mommy.make(Match, player_1_init=player_3, player_2_init=player_4,
                                     player_1_score=0, player_2_score=2, round=round_1)
 
-        standings_list = self.pool.get_player_standings()
+        with self.assertNumQueries(1):
+            standings_list = self.pool.get_player_standings()
 
         self.assertEqual(standings_list[0], {'name': 'player_2', 'wins': 3, 'losses': 0})
         self.assertEqual(standings_list[1], {'name': 'player_1', 'wins': 2, 'losses': 1})
         self.assertEqual(standings_list[2], {'name': 'player_4', 'wins': 1, 'losses': 2})
         self.assertEqual(standings_list[3], {'name': 'player_3', 'wins': 0, 'losses': 3})
+
+    def test_get_player_standings_keys_by_player(self):
+        """
+        Test that players who share a name keep separate records, and that
+        matches from other pools aren't counted
+        """
+        player_1 = mommy.make(Player, name='Sam')
+        player_2 = mommy.make(Player, name='Sam')
+        player_3 = mommy.make(Player, name='Alex')
+        round_1 = mommy.make(Round, pool=self.pool)
+        mommy.make(Match, player_1_init=player_1, player_2_init=player_3,
+                          player_1_score=2, player_2_score=0, round=round_1)
+        mommy.make(Match, player_1_init=player_3, player_2_init=player_2,
+                          player_1_score=2, player_2_score=1, round=round_1)
+        mommy.make(Match, player_1_init=player_2, player_2_init=player_3,
+                          player_1_score=2, player_2_score=0,
+                          round=mommy.make(Round, pool=mommy.make(Pool)))
+
+        standings_list = self.pool.get_player_standings()
+
+        self.assertEqual(standings_list, [
+            {'name': 'Sam', 'wins': 1, 'losses': 0},
+            {'name': 'Alex', 'wins': 1, 'losses': 1},
+            {'name': 'Sam', 'wins': 0, 'losses': 1},
+        ])
+
+
+class SwissRoundTestCase(TestCase):
+
+    def setUp(self):
+        self.pool = mommy.make(Pool)
+
+    def add_players(self, count):
+        Player.objects.bulk_create([Player(name='Player {}'.format(n), email='{}@example.com'.format(n))
+                                    for n in range(count)])
+        self.pool.players.add(*Player.objects.all())
+
+    def score_round(self, number):
+        for match in Match.objects.filter(round__pool=self.pool, round__number=number, bye=False):
+            match.player_1_score, match.player_2_score = 2, 1
+            match.save()
+
+    def test_first_round(self):
+        """
+        Test that everyone is paired, with a bye for the odd player out that
+        counts as a win
+        """
+        self.add_players(5)
+
+        pairs, bye = self.pool._generate_swiss_round()
+
+        self.assertEqual(len(pairs), 2)
+        self.assertEqual(Round.objects.get(pool=self.pool).number, 1)
+        self.assertEqual(Match.objects.filter(round__pool=self.pool).count(), 3)
+        self.assertEqual(Match.objects.get(round__pool=self.pool, bye=True).player_1_init_id, bye)
+        self.assertEqual(PoolStanding.objects.get(pool=self.pool, player_id=bye).wins, 1)
+        self.assertEqual(PoolStanding.objects.filter(pool=self.pool).count(), 5)
+
+    def test_later_rounds(self):
+        """
+        Test that players aren't paired twice and nobody gets a second bye
+        while others haven't had one
+        """
+        self.add_players(9)
+
+        for number in range(1, 6):
+            self.pool._generate_swiss_round()
+            self.score_round(number)
+
+        pairings = Match.objects.filter(round__pool=self.pool, bye=False).values_list('player_1_init', 'player_2_init')
+        self.assertEqual(len(pairings), 20)
+        self.assertEqual(len(set(frozenset(pair) for pair in pairings)), 20)
+        byes = Match.objects.filter(round__pool=self.pool, bye=True).values_list('player_1_init', flat=True)
+        self.assertEqual(len(set(byes)), 5)
+
+    def test_pairs_by_score(self):
+        """
+        Test that winners are paired with winners after the first round
+        """
+        self.add_players(8)
+        self.pool._generate_swiss_round()
+        self.score_round(1)
+        winners = set(Match.objects.filter(round__pool=self.pool).values_list('winning_player', flat=True))
+
+        pairs, bye = self.pool._generate_swiss_round(commit=False)
+
+        self.assertEqual([(player_1 in winners, player_2 in winners) for player_1, player_2 in pairs],
+                         [(True, True), (True, True), (False, False), (False, False)])
+        self.assertEqual(Round.objects.filter(pool=self.pool).count(), 1)
+
+    def test_unscored_round(self):
+        """
+        Test that the next round isn't paired until the last is scored
+        """
+        self.add_players(4)
+        self.pool._generate_swiss_round()
+
+        with self.assertRaises(ValidationError):
+            self.pool._generate_swiss_round()
+
+    def test_existing_round(self):
+        """
+        Test that an empty round that's already there is used for the pairing
+        """
+        self.add_players(4)
+        round = mommy.make(Round, pool=self.pool, number=1)
+
+        self.pool._generate_swiss_round()
+
+        self.assertEqual(list(Round.objects.filter(pool=self.pool)), [round])
+        self.assertEqual(round.match_set.count(), 2)
+
+    def test_query_count(self):
+        """
+        Test that pairing a round takes the same few queries for any number
+        of players
+        """
+        self.add_players(200)
+        self.pool._generate_swiss_round()
+        Match.objects.filter(round__pool=self.pool, bye=False).update(player_1_score=1, player_2_score=0)
+
+        # Reading players and results, looking up and creating the round (in a
+        # savepoint of its own), a savepoint each for the pairing and the
+        # standings rebuild, and the tournament touched by the round and again
+        # once everything is written; SQLite splits the inserts of matches and
+        # standings into batches
+        with self.assertNumQueries(18):
+            pairs, bye = self.pool._generate_swiss_round()
+
+        self.assertEqual(len(pairs), 100)
+
+
+class PoolStandingTestCase(TestCase):
+
+    def setUp(self):
+        self.pool = mommy.make(Pool)
+        self.player_1, self.player_2, self.player_3 = mommy.make(Player, _quantity=3)
+        self.round = mommy.make(Round, pool=self.pool)
+
+    def standing(self, player):
+        return PoolStanding.objects.get(pool=self.pool, player=player)
+
+    def test_result_is_recorded(self):
+        """
+        Test that saving a score updates both players' standings
+        """
+        match = mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2, round=self.round)
+        self.assertEqual(self.standing(self.player_1).wins, 0)
+
+        match.player_1_score = 2
+        match.player_2_score = 5
+        match.save()
+
+        standing_1 = self.standing(self.player_1)
+        standing_2 = self.standing(self.player_2)
+        self.assertEqual((standing_1.wins, standing_1.losses, standing_1.games_for, standing_1.games_against),
+                         (0, 1, 2, 5))
+        self.assertEqual((standing_2.wins, standing_2.losses, standing_2.games_for, standing_2.games_against),
+                         (1, 0, 5, 2))
+        self.assertEqual((standing_2.rank, standing_1.rank), (1, 2))
+
+    def test_corrected_result(self):
+        """
+        Test that correcting a score moves the win rather than adding another
+        """
+        match = mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                           player_1_score=2, player_2_score=0, round=self.round)
+        match = Match.objects.get(id=match.id)
+
+        match.player_1_score = 0
+        match.player_2_score = 2
+        match.save()
+
+        self.assertEqual((self.standing(self.player_1).wins, self.standing(self.player_1).losses), (0, 1))
+        self.assertEqual((self.standing(self.player_2).wins, self.standing(self.player_2).losses), (1, 0))
+
+    def test_deleted_match(self):
+        """
+        Test that deleting a match takes its result out of the standings
+        """
+        match = mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                           player_1_score=2, player_2_score=0, round=self.round)
+
+        match.delete()
+
+        self.assertEqual(self.standing(self.player_1).wins, 0)
+        self.assertEqual(self.standing(self.player_2).losses, 0)
+
+    def test_deleted_round(self):
+        """
+        Test that deleting a round takes the results of its matches out of the
+        standings
+        """
+        mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                   player_1_score=2, player_2_score=0, round=self.round)
+        other_round = mommy.make(Round, pool=self.pool, number=2)
+        mommy.make(Match, player_1_init=self.player_3, player_2_init=self.player_1,
+                   player_1_score=4, player_2_score=1, round=other_round)
+
+        self.round.delete()
+
+        self.assertEqual((self.standing(self.player_1).wins, self.standing(self.player_1).losses), (0, 1))
+        self.assertFalse(PoolStanding.objects.filter(pool=self.pool, player=self.player_2).exists())
+        self.assertEqual([s.player_id for s in PoolStanding.objects.filter(pool=self.pool).order_by('rank')],
+                         [self.player_3.id, self.player_1.id])
+
+    def test_bracket_matches_are_ignored(self):
+        """
+        Test that bracket results don't create standings
+        """
+        mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                   player_1_score=2, player_2_score=0, round=mommy.make(Round, bracket=mommy.make(Bracket)))
+
+        self.assertFalse(PoolStanding.objects.exists())
+
+    def test_calculate_matches_stored(self):
+        """
+        Test that the incrementally maintained standings match a full
+        calculation
+        """
+        mommy.make(Match, player_1_init=self.player_1, player_2_init=self.player_2,
+                   player_1_score=2, player_2_score=0, round=self.round)
+        mommy.make(Match, player_1_init=self.player_3, player_2_init=self.player_1,
+                   player_1_score=4, player_2_score=1, round=self.round)
+
+        stored = PoolStanding.objects.filter(pool=self.pool).order_by('rank')
+        calculated = PoolStanding.objects.calculate(self.pool.id)
+
+        fields = ('player_id', 'wins', 'losses', 'games_for', 'games_against', 'rank')
+        self.assertEqual([[getattr(s, f) for f in fields] for s in stored],
+                         [[getattr(s, f) for f in fields] for s in calculated])
+
+    def test_rerank_query_count(self):
+        """
+        Test that renumbering a pool writes every moved rank with one query
+        """
+        players = mommy.make(Player, _quantity=20)
+        PoolStanding.objects.bulk_create([PoolStanding(pool=self.pool, player=player, wins=n, rank=n + 1)
+                                          for n, player in enumerate(players)])
+
+        with self.assertNumQueries(2):
+            PoolStanding.objects.rerank(self.pool.id)
+
+        self.assertEqual(list(PoolStanding.objects.filter(pool=self.pool).order_by('rank').values_list(
+            'player_id', flat=True
+        )), [player.id for player in reversed(players)])
@@ -0,0 +1,68 @@
+from django.test import SimpleTestCase
+
+from players.scheduling import swiss_pairings
+
+
+class SwissPairingsTestCase(SimpleTestCase):
+
+    def test_pairs_down_the_standings(self):
+        """
+        Test that players are paired with the nearest player below them
+        """
+        self.assertEqual(swiss_pairings([1, 2, 3, 4]), ([(1, 2), (3, 4)], None))
+
+    def test_bye(self):
+        """
+        Test that the bye goes to the lowest placed player who hasn't had one
+        """
+        self.assertEqual(swiss_pairings([1, 2, 3, 4, 5], byes={5}), ([(1, 2), (3, 5)], 4))
+        self.assertEqual(swiss_pairings([1, 2, 3], byes={1, 2, 3}), ([(1, 2)], 3))
+
+    def test_skips_rematches(self):
+        """
+        Test that a player is paired further down rather than play someone
+        again
+        """
+        played = {frozenset((1, 2))}
+
+        self.assertEqual(swiss_pairings([1, 2, 3, 4], played), ([(1, 3), (2, 4)], None))
+
+    def test_splits_pair_to_avoid_rematch(self):
+        """
+        Test that an earlier pair is split when the players left have already
+        met
+        """
+        played = {frozenset((1, 3)), frozenset((2, 4)), frozenset((3, 4))}
+
+        pairs, bye = swiss_pairings([1, 2, 3, 4], played)
+
+        self.assertEqual(sorted(pairs), [(1, 4), (2, 3)])
+
+    def test_rematch_avoided_by_matching(self):
+        """
+        Test that pairings are found again when splitting one pair isn't
+        enough to avoid a rematch
+        """
+        played = {frozenset(pair) for pair in ((1, 4), (1, 6), (3, 4), (3, 6), (4, 6))}
+
+        pairs, bye = swiss_pairings([1, 2, 3, 4, 5, 6], played)
+
+        self.assertEqual(pairs, [(1, 3), (2, 6), (4, 5)])
+        self.assertFalse(played & set(frozenset(pair) for pair in pairs))
+
+    def test_bye_moved_to_avoid_rematch(self):
+        """
+        Test that the bye goes to a higher placed player without one when
+        that avoids a rematch
+        """
+        played = {frozenset(pair) for pair in ((1, 3), (1, 5), (3, 5))}
+
+        self.assertEqual(swiss_pairings([3, 5, 4, 1, 2], played, byes={3}), ([(3, 4), (5, 2)], 1))
+
+    def test_unavoidable_rematch(self):
+        """
+        Test that players who have met everyone are still paired
+        """
+        played = {frozenset((1, 2))}
+
+        self.assertEqual(swiss_pairings([1, 2], played), ([(1, 2)], None))
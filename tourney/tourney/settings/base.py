@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'matches.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -140,3 +141,86 @@ STATICFILES_DIRS = [
 DEFAULT_ORGANIZER_EMAIL = 'webmaster@localhost'
 
 DEFAULT_USER_TIME_ZONE = 'US/Central'
+
+# The cache (from CACHES) used for bracket JSON and rendered pages, and how
+# long in seconds to keep each
+TOURNEY_CACHE_ALIAS = 'default'
+
+BRACKET_CACHE_TIMEOUT = 60 * 60 * 24
+
+TOURNAMENT_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How long in seconds to keep encoded API responses, and how long clients may
+# reuse one before revalidating it with its ETag
+API_CACHE_TIMEOUT = 60 * 60 * 24
+
+API_CACHE_MAX_AGE = 15
+
+# Clients asking for bracket changes get a full snapshot rather than a delta
+# once more than this many matches have changed
+BRACKET_DELTA_MAX_MATCHES = 64
+
+# Live viewers poll for changes every LIVE_POLL_INTERVAL seconds, get a
+# keep-alive comment every LIVE_HEARTBEAT_INTERVAL seconds, and reconnect
+# (after LIVE_RETRY_DELAY seconds) once a stream has been open for
+# LIVE_STREAM_TIMEOUT seconds. The latest LIVE_BACKLOG changes of each
+# tournament are cached for viewers to share.
+LIVE_POLL_INTERVAL = 2
+
+LIVE_HEARTBEAT_INTERVAL = 15
+
+LIVE_RETRY_DELAY = 3
+
+LIVE_STREAM_TIMEOUT = 60 * 5
+
+LIVE_BACKLOG = 100
+
+# Notification emails are sent from NOTIFICATION_WORKERS threads, no faster
+# than NOTIFICATION_RATE_LIMIT a second (None for no limit). Transient
+# failures are retried NOTIFICATION_RETRIES times, waiting
+# NOTIFICATION_RETRY_BACKOFF seconds and doubling each time. Sent
+# notifications are recorded NOTIFICATION_BATCH_SIZE at a time.
+NOTIFICATION_WORKERS = 4
+
+NOTIFICATION_RATE_LIMIT = 10
+
+NOTIFICATION_RETRIES = 3
+
+NOTIFICATION_RETRY_BACKOFF = 1
+
+NOTIFICATION_BATCH_SIZE = 100
+
+# Outbox entries claimed by a worker that hasn't finished with them after
+# NOTIFICATION_CLAIM_TIMEOUT seconds are claimed again. Failed entries are
+# retried after NOTIFICATION_OUTBOX_RETRY_DELAY seconds, doubling each time,
+# up to NOTIFICATION_MAX_ATTEMPTS attempts.
+NOTIFICATION_CLAIM_TIMEOUT = 60 * 10
+
+NOTIFICATION_OUTBOX_RETRY_DELAY = 60
+
+NOTIFICATION_MAX_ATTEMPTS = 5
+
+# The share of requests and command runs (0 to 1) to log wall time, SQL
+# queries and template time for, and whether to send the figures back in a
+# Server-Timing header
+PERFORMANCE_SAMPLE_RATE = 0
+
+PERFORMANCE_HEADER = False
+
+# Send the sampled performance figures (a line of JSON each) to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'performance': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'tourney.performance': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -16,12 +16,18 @@ Including another URLconf
 from django.conf.urls import url
 from django.contrib import admin
 
-from matches.views import TournamentDetailView
+from matches.views import TournamentDetailView, bracket_json, bracket_changes_json, pools_json, tournament_events
 
 urlpatterns = [
     # Admin
     url(r'^admin/', admin.site.urls),
 
+    # API
+    url(r'^api/(?P<slug>[-\w]+)/bracket\.json$', bracket_json, name='api-bracket'),
+    url(r'^api/(?P<slug>[-\w]+)/bracket/changes\.json$', bracket_changes_json, name='api-bracket-changes'),
+    url(r'^api/(?P<slug>[-\w]+)/pools\.json$', pools_json, name='api-pools'),
+    url(r'^api/(?P<slug>[-\w]+)/events$', tournament_events, name='api-events'),
+
     # Tournaments
     url(r'^(?P<slug>[-\w]+)/$', TournamentDetailView.as_view(),
         name='tournament-detail'),